@@ -0,0 +1,192 @@
+"""
+场景批量生成命令行工具
+
+使用进程池并行调用generate_scenario, 场景生成完成后立即写入CSV文件,
+格式与专业版界面的"保存"相同, 可以直接用界面打开. 输出文件以.npz结尾时
+保存为列式场景库(见scenario_store), 以.db结尾时加入SQLite场景库(见scenario_library).
+
+每个场景的随机种子由主种子(--seed)和场景序号得到, 因此结果与进程数无关,
+也可以用 --id 单独重新生成某个场景.
+
+示例:
+    python batch_generate.py -n 3 -c 10000 -o scenarios.csv
+    python batch_generate.py -n 4 -c 500 --meeting 1=1 --meeting 2=2 -o crossing.csv
+    python batch_generate.py -n 3 --seed 42 --id 1234 -o one.csv
+    python batch_generate.py -n 3 --seed 42 -c 10000 --start 10000 --append -o scenarios.csv
+    python batch_generate.py -n 3 -c 100000 -o library.db
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import scenario_generator_pro_new as pro
+from scenario_io import save_pro_csv
+from scenario_library import ScenarioLibrary
+from scenario_store import save_store
+
+
+def _init_worker(data_dir):
+    # 进程池的初始化函数. fork出来的子进程继承了父进程的随机数状态, 没有指定
+    # 种子时需要重新播种, 否则各进程会生成相同的场景
+    random.seed()
+    pro.load_config(data_dir)
+
+
+def _generate_one(task):
+    index, seed, kwargs = task
+    scenario = pro.generate_scenario(seed=seed, **kwargs)
+    if scenario:
+        scenario['id'] = index + 1
+    return index, scenario
+
+
+def iter_scenarios(count, workers=None, chunksize=1, data_dir='./data',
+                   master_seed=None, indices=None, context=None, **kwargs):
+    """
+    并行生成count个场景, 按完成顺序产出(index, scenario), 生成失败时scenario为None
+
+    kwargs直接传给generate_scenario. 指定master_seed时第index个场景的种子为
+    scenario_seed(master_seed, index), 结果可复现. indices指定只生成其中的部分场景.
+    workers为1时在当前进程中串行生成. 关闭生成器(或提前退出循环)时会终止进程池.
+    context为进程池的启动方式('fork', 'spawn'等), None时使用默认方式; 在多线程的
+    进程(例如界面的后台线程)中应当使用'spawn', fork可能使子进程在其他线程持有的锁上死锁.
+    """
+    if indices is None:
+        indices = range(count)
+    tasks = ((i, None if master_seed is None else pro.scenario_seed(master_seed, i),
+              kwargs) for i in indices)
+    if workers == 1:
+        # 在当前进程中生成, 不改变调用者的全局随机数状态, 配置只读取一次
+        if not pro.meeting_situations:
+            pro.load_config(data_dir)
+        for task in tasks:
+            yield _generate_one(task)
+        return
+
+    with multiprocessing.get_context(context).Pool(
+            workers, initializer=_init_worker, initargs=(data_dir,)) as pool:
+        for result in pool.imap_unordered(_generate_one, tasks, chunksize):
+            yield result
+
+
+def parse_meeting_counts(items):
+    """解析 --meeting ID=COUNT 参数"""
+    if not items:
+        return None
+    counts = {}
+    for item in items:
+        meeting_id, _, count = item.partition('=')
+        counts[int(meeting_id)] = int(count) if count else 1
+    return counts
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='批量生成船舶会遇场景')
+    parser.add_argument('-n', '--ships', type=int, default=3,
+                        help='船舶数量(含本船), 默认3')
+    parser.add_argument('-c', '--count', type=int, default=100,
+                        help='场景数量, 默认100')
+    parser.add_argument('-o', '--output', required=True,
+                        help='输出CSV文件, 以.npz结尾时保存为场景库, '
+                             '以.db结尾时加入SQLite场景库(总是追加)')
+    parser.add_argument('--osog', type=float, nargs=2, default=(10.0, 20.0),
+                        metavar=('MIN', 'MAX'), help='本船速度范围(节)')
+    parser.add_argument('--tsog', type=float, nargs=2, default=(10.0, 20.0),
+                        metavar=('MIN', 'MAX'), help='目标船速度范围(节)')
+    parser.add_argument('--lat', type=float, default=31.0, help='本船纬度')
+    parser.add_argument('--lon', type=float, default=123.0, help='本船经度')
+    parser.add_argument('--meeting', action='append', metavar='ID=COUNT',
+                        help='指定会遇类型数量, 可重复')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+                        help='进程数, 默认为CPU核数')
+    parser.add_argument('--chunksize', type=int, default=4,
+                        help='每次分发给进程的场景数')
+    parser.add_argument('--data-dir', default='./data', help='配置文件目录')
+    parser.add_argument('--seed', type=int,
+                        help='主随机种子, 不指定时随机选择并打印出来')
+    parser.add_argument('--id', type=int, action='append', dest='ids',
+                        help='只生成指定ID的场景(从1开始), 可重复')
+    parser.add_argument('--start', type=int, default=0,
+                        help='从第几个场景开始生成(ID为START+1起), 与--append配合分批导出')
+    parser.add_argument('--append', action='store_true',
+                        help='追加到已有的输出文件, 不重写表头')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    to_store = args.output.lower().endswith('.npz')
+    to_library = args.output.lower().endswith('.db')
+    if to_store and args.append:
+        print('场景库文件不支持--append', file=sys.stderr)
+        return 2
+
+    meeting_type_counts = parse_meeting_counts(args.meeting)
+    if meeting_type_counts and sum(meeting_type_counts.values()) > args.ships - 1:
+        print('指定的会遇类型总数(%d)超过了目标船数量(%d)' %
+              (sum(meeting_type_counts.values()), args.ships - 1), file=sys.stderr)
+        return 2
+
+    kwargs = {
+        'target_num': args.ships - 1,
+        'osog_min': args.osog[0],
+        'osog_max': args.osog[1],
+        'tsog_min': args.tsog[0],
+        'tsog_max': args.tsog[1],
+        'lat': args.lat,
+        'lon': args.lon,
+        'meeting_type_counts': meeting_type_counts,
+    }
+
+    master_seed = args.seed
+    if master_seed is None:
+        master_seed = random.SystemRandom().getrandbits(32)
+        print('主随机种子: %d' % master_seed, file=sys.stderr)
+
+    count = args.count
+    indices = range(args.start, args.start + count)
+    if args.ids:
+        indices = [i - 1 for i in args.ids]
+        count = len(indices)
+
+    start = time.time()
+    done = 0
+    success = 0
+
+    def generated():
+        nonlocal done, success
+        for index, scenario in iter_scenarios(
+                count, args.workers, args.chunksize, args.data_dir,
+                master_seed, indices, **kwargs):
+            done += 1
+            if scenario:
+                success += 1
+                yield scenario
+            if done % 1000 == 0:
+                print('%d/%d' % (done, count), file=sys.stderr)
+
+    try:
+        if to_store:
+            save_store(args.output, generated())
+        elif to_library:
+            with ScenarioLibrary(args.output) as lib:
+                lib.add(generated())
+        else:
+            save_pro_csv(args.output, generated(), args.append)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    elapsed = time.time() - start
+    print('成功生成 %d/%d 个场景, 用时 %.1f 秒' % (success, count, elapsed),
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
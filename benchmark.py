@@ -0,0 +1,303 @@
+"""
+热点路径的基准测试
+
+- georef.ll_gc_ll, DistGreatCircle, DistanceBearingMercator和calc_CPA: 每次调用的时间(微秒)
+- gen_situation2, gen_situation3, make_tship, make_tship_detail和专业版generate_scenario:
+  按目标船数量(1到--max-targets)和ot/tt组合, 每秒生成(尝试)的场景数及成功比例
+
+输入都由固定的随机种子得到, 不同版本的代码处理相同的场景. 每一项的第一轮
+至少运行--min-time秒, 之后以相同的输入再运行到--repeat轮, 取最快的一轮.
+结果连同当前git提交保存为JSON, --compare与之前保存的结果对比.
+
+示例:
+    python benchmark.py -o bench.json
+    python benchmark.py --filter make_tship --min-time 2 -o new.json --compare bench.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+import georef
+import scenario_core
+import scenario_generator_pro_new as pro
+from scenario_core import SearchBudget, gen_oship, make_rng, tship_conditions
+
+BENCH_VERSION = 1
+# 每一项的最短运行时间(秒)
+MIN_TIME = 0.3
+# 每一项运行的轮数, 取最快的一轮
+REPEAT = 3
+# 单次调用计时的输入组数
+CALL_INPUTS = 1000
+# 生成一个场景的搜索时间限制(秒), 固定下来使不可行的条件在各版本中耗时相同
+SEARCH_TIMEOUT = 1.0
+MAX_TARGETS = 4
+# 本船位置和速度范围, 与界面新建场景的默认值相同
+OWNSHIP = {'lat': 31.0, 'lon': 123.0, 'osog_min': 10.0, 'osog_max': 20.0,
+           'tsog_min': 10.0, 'tsog_max': 20.0}
+
+UNIT_CALL = 'us/call'
+UNIT_RATE = 'scenarios/s'
+
+
+def git_commit():
+    """当前的git提交和工作区是否有改动, 不在git仓库中时为(None, None)"""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=cwd, check=True,
+                                capture_output=True, text=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                cwd=cwd, check=True, capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def time_calls(fn, inputs, min_time, repeat=REPEAT):
+    """
+    对inputs逐组调用fn, 返回(每次调用的微秒数, 每轮调用次数)
+
+    第一轮至少运行min_time秒, 之后以相同的次数再运行repeat-1轮, 取最快的一轮.
+    """
+    best = None
+    loops = 0
+    for round_ in range(repeat):
+        start = time.perf_counter()
+        n = 0
+        while n < loops or (round_ == 0 and time.perf_counter() - start < min_time):
+            for args in inputs:
+                fn(*args)
+            n += 1
+        elapsed = time.perf_counter() - start
+        loops = n
+        best = elapsed if best is None else min(best, elapsed)
+    calls = loops * len(inputs)
+    return best / calls * 1e6, calls
+
+
+def time_scenarios(fn, min_time, repeat=REPEAT):
+    """
+    依次以种子0, 1, 2...调用fn(seed), 返回(每秒场景数, 每轮场景数, 成功数)
+
+    fn返回生成的结果, 为空(None, []或GenFailure)时算作失败. 第一轮至少运行
+    min_time秒, 之后以相同的种子再运行repeat-1轮, 取最快的一轮.
+    """
+    best = None
+    count = 0
+    # gen_situation2/3会打印结果, 计时时丢弃输出
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        for round_ in range(repeat):
+            start = time.perf_counter()
+            seed = ok = 0
+            while seed < count or (round_ == 0 and time.perf_counter() - start < min_time):
+                ok += bool(fn(seed))
+                seed += 1
+            elapsed = time.perf_counter() - start
+            count = seed
+            best = elapsed if best is None else min(best, elapsed)
+    return count / best, count, ok
+
+
+def call_inputs(seed=0):
+    """单次调用计时的输入: 本船附近的位置、方位、距离和航速航向"""
+    rng = random.Random(seed)
+    inputs = []
+    for _ in range(CALL_INPUTS):
+        lat = OWNSHIP['lat'] + rng.uniform(-1.0, 1.0)
+        lon = OWNSHIP['lon'] + rng.uniform(-1.0, 1.0)
+        inputs.append((lat, lon, rng.uniform(0.0, 360.0), rng.uniform(0.5, 20.0),
+                       lat + rng.uniform(-0.3, 0.3), lon + rng.uniform(-0.3, 0.3),
+                       rng.uniform(0.0, 20.0), rng.uniform(0.0, 20.0),
+                       rng.uniform(0.0, 360.0), rng.uniform(0.0, 360.0)))
+    return inputs
+
+
+def call_cases():
+    """(名称, 函数, 取出参数的函数)"""
+    return [
+        ('georef.ll_gc_ll', georef.ll_gc_ll, lambda a: a[0:4]),
+        ('georef.DistGreatCircle', georef.DistGreatCircle, lambda a: a[0:2] + a[4:6]),
+        ('georef.DistanceBearingMercator', georef.DistanceBearingMercator,
+         lambda a: a[0:2] + a[4:6]),
+        ('scenario_core.calc_CPA', scenario_core.calc_CPA, lambda a: a[0:2] + a[4:]),
+    ]
+
+
+def scene_args(target_num):
+    """
+    target_num条目标船的场景参数, 与在界面中依次添加目标船相同
+
+    第i条目标船的会遇类型为meeting_situation_list的第i项(循环), 阶段为stage_list的第一项.
+    """
+    args = dict(OWNSHIP, target_num=target_num, S=[], M=[], dist=[], rel_brg=[])
+    stage = scenario_core.stage_list[0]
+    for i in range(target_num):
+        meeting = scenario_core.meeting_situation_list[i % len(scenario_core.meeting_situation_list)]
+        args['S'].append(stage)
+        args['M'].append(meeting)
+        if stage[2] > meeting[3][0]:
+            args['dist'].append(meeting[3])
+        else:
+            args['dist'].append((stage[2], stage[3]))
+        args['rel_brg'].append(meeting[2])
+    return args
+
+
+def scenario_cases(max_targets, timeout):
+    """(名称, fn(seed))"""
+    cases = []
+    for target_num in range(1, max_targets + 1):
+        args = scene_args(target_num)
+        conds = tship_conditions(args)
+        tag = 'targets=%d' % target_num
+
+        cases.append(('gen_situation2/%s' % tag,
+                      lambda seed, args=args: scenario_core.gen_situation2(args, make_rng(seed))))
+        for ot in range(1, 5):
+            for tt in range(1, 5):
+                mode = '%s/ot=%d/tt=%d' % (tag, ot, tt)
+                situation = dict(args, ot=ot, tt=tt)
+
+                def make(seed, fn, args=args, conds=conds, ot=ot, tt=tt):
+                    rng = make_rng(seed)
+                    oship = gen_oship(args['lat'], args['lon'], args['osog_min'],
+                                      args['osog_max'], rng)
+                    return fn(oship, conds, ot, tt, rng, SearchBudget(timeout))
+
+                cases.append(('make_tship/%s' % mode,
+                              lambda seed, make=make: make(seed, scenario_core.make_tship)))
+                cases.append(('make_tship_detail/%s' % mode,
+                              lambda seed, make=make: make(seed, scenario_core.make_tship_detail)))
+                cases.append(('gen_situation3/%s' % mode,
+                              lambda seed, situation=situation: scenario_core.gen_situation3(
+                                  situation, make_rng(seed), SearchBudget(timeout))))
+        cases.append(('pro.generate_scenario/%s' % tag,
+                      lambda seed, target_num=target_num: pro.generate_scenario(
+                          target_num, seed=seed)))
+    return cases
+
+
+def run(min_time=MIN_TIME, max_targets=MAX_TARGETS, timeout=SEARCH_TIMEOUT,
+        name_filter=None, data_dir='./data', repeat=REPEAT, log=None):
+    """运行基准测试, 返回{名称: 结果}; log为每完成一项时调用的函数log(名称, 结果)"""
+    scenario_core.init_csv_data(data_dir)
+    pro.load_config(data_dir)
+    results = OrderedDict()
+
+    def selected(name):
+        return name_filter is None or any(text in name for text in name_filter)
+
+    inputs = call_inputs()
+    for name, fn, pick in call_cases():
+        if not selected(name):
+            continue
+        value, calls = time_calls(fn, [pick(a) for a in inputs], min_time, repeat)
+        results[name] = {'unit': UNIT_CALL, 'value': value, 'calls': calls}
+        if log:
+            log(name, results[name])
+
+    for name, fn in scenario_cases(max_targets, timeout):
+        if not selected(name):
+            continue
+        value, count, ok = time_scenarios(fn, min_time, repeat)
+        results[name] = {'unit': UNIT_RATE, 'value': value, 'scenarios': count,
+                         'success': ok / count}
+        if log:
+            log(name, results[name])
+    return results
+
+
+def format_result(name, result):
+    if result['unit'] == UNIT_CALL:
+        return '%-48s %10.2f %s' % (name, result['value'], result['unit'])
+    return '%-48s %10.1f %s  成功 %3.0f%%' % (name, result['value'], result['unit'],
+                                             result['success'] * 100)
+
+
+def compare(base, results):
+    """与之前的结果对比, 返回打印的行; 比值大于1表示变快"""
+    lines = ['%-48s %12s %12s %8s' % ('', '原结果', '新结果', '加速比')]
+    for name, result in results.items():
+        old = base.get(name)
+        if old is None or old['unit'] != result['unit'] or not old['value'] or not result['value']:
+            continue
+        if result['unit'] == UNIT_CALL:
+            speedup = old['value'] / result['value']
+        else:
+            speedup = result['value'] / old['value']
+        lines.append('%-48s %12.2f %12.2f %7.2fx' % (name, old['value'], result['value'], speedup))
+    return lines
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='georef、CPA计算和场景生成的基准测试')
+    parser.add_argument('-o', '--output', help='结果保存为JSON文件')
+    parser.add_argument('--compare', metavar='JSON', help='与之前保存的结果对比')
+    parser.add_argument('--min-time', type=float, default=MIN_TIME,
+                        help='每一项的最短运行时间(秒), 默认%g' % MIN_TIME)
+    parser.add_argument('--max-targets', type=int, default=MAX_TARGETS,
+                        help='目标船数量从1到MAX, 默认%d' % MAX_TARGETS)
+    parser.add_argument('--repeat', type=int, default=REPEAT,
+                        help='每一项运行的轮数, 取最快的一轮, 默认%d' % REPEAT)
+    parser.add_argument('--timeout', type=float, default=SEARCH_TIMEOUT,
+                        help='生成一个场景的搜索时间限制(秒), 默认%g' % SEARCH_TIMEOUT)
+    parser.add_argument('--filter', action='append',
+                        help='只运行名称中包含该文字的项, 可重复')
+    parser.add_argument('--data-dir', default='./data', help='配置文件目录')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    base = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+        if base.get('version') != BENCH_VERSION:
+            print('%s: 不支持的结果版本' % args.compare, file=sys.stderr)
+            return 2
+
+    commit, dirty = git_commit()
+    print('提交: %s%s' % (commit, ' (有未提交的改动)' if dirty else ''), file=sys.stderr)
+    results = run(args.min_time, args.max_targets, args.timeout, args.filter, args.data_dir,
+                  args.repeat, log=lambda name, result: print(format_result(name, result)))
+
+    if args.output:
+        report = OrderedDict([
+            ('version', BENCH_VERSION),
+            ('commit', commit),
+            ('dirty', dirty),
+            ('timestamp', datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+            ('python', platform.python_version()),
+            ('numpy', np.__version__),
+            ('platform', platform.platform()),
+            ('min_time', args.min_time),
+            ('repeat', args.repeat),
+            ('timeout', args.timeout),
+            ('results', results),
+        ])
+        tmp_path = args.output + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, args.output)
+
+    if base is not None:
+        print('对比 %s (提交 %s)' % (args.compare, base.get('commit')))
+        for line in compare(base['results'], results):
+            print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+目标船参数的危险可行性表
+
+make_tship在ot为2, 3时要求目标船可能有危险(calc_delta_windows的danger不为空),
+原来在0.1的网格上随机取(relbrg, dist, tsog), 计算后不满足再重试. danger不为空等价于
+
+    dist^2 <= (rel_spd * tcpa_max / 60)^2 + dcpa_max^2
+    rel_spd^2 = osog^2 + tsog^2 + 2 * osog * tsog * cos(relbrg)
+
+即每个(relbrg, tsog)可行的距离是网格上不超过某个上限的一段. DangerTable用numpy
+一次算出整个网格上各(relbrg, tsog)可行的距离个数, 直接在可行的参数中均匀取值,
+不需要三角函数计算和重试, 取值的分布与原来的重试相同. 本船速度也在0.1的网格上,
+同一本船速度和条件的表只计算一次.
+"""
+
+import functools
+
+import numpy as np
+
+# 缓存的表的个数(本船速度 x 条件)
+TABLE_CACHE_SIZE = 1024
+# 与calc_rel_spd_cog的浮点误差, 边界上的参数宁可多取, 由调用者检查后重试
+_EPS = 1e-9
+
+
+class DangerTable:
+    """
+    本船速度osog, 条件cond下可能有危险的(relbrg, dist, tsog)网格点
+
+    网格与make_tship_arg相同: 三个参数都是0.1的整数倍. 表为空(bool为False)时
+    在条件范围内不可能有危险.
+    """
+
+    __slots__ = ('relbrg_lo', 'dist_lo', 'sog_lo', 'sog_count', 'cumcount', 'total')
+
+    def __init__(self, osog, relbrg_lo, relbrg_hi, dist_lo, dist_hi, sog_lo, sog_hi,
+                 tcpa_max, dcpa_max):
+        # 参数为网格上的整数(0.1的倍数)
+        self.relbrg_lo = relbrg_lo
+        self.dist_lo = dist_lo
+        self.sog_lo = sog_lo
+        relbrg = np.radians(np.arange(relbrg_lo, relbrg_hi + 1) * 0.1)
+        tsog = np.arange(sog_lo, sog_hi + 1) * 0.1
+        dist = np.arange(dist_lo, dist_hi + 1) * 0.1
+        self.sog_count = len(tsog)
+
+        rel_spd2 = (osog * osog + tsog * tsog
+                    + 2.0 * osog * tsog * np.cos(relbrg)[:, None])
+        rel_spd = np.sqrt(np.maximum(rel_spd2, 0.0))
+        dist_limit = np.sqrt((rel_spd * tcpa_max / 60.0) ** 2 + dcpa_max * dcpa_max)
+        # 可行的距离是dist的前count个
+        counts = np.searchsorted(dist, dist_limit.ravel() * (1.0 + _EPS) + _EPS, side='right')
+        self.cumcount = np.cumsum(counts)
+        self.total = int(self.cumcount[-1]) if len(self.cumcount) else 0
+
+    def __bool__(self):
+        return self.total > 0
+
+    def __len__(self):
+        return self.total
+
+    def sample(self, rng):
+        """均匀取一个网格点, 返回(relbrg, dist, tsog), 与make_tship_arg的取值相同"""
+        x = rng.randrange(self.total)
+        cell = int(np.searchsorted(self.cumcount, x, side='right'))
+        prev = int(self.cumcount[cell - 1]) if cell else 0
+        i, j = divmod(cell, self.sog_count)
+        return ((self.relbrg_lo + i) * 0.1,
+                (self.dist_lo + x - prev) * 0.1,
+                (self.sog_lo + j) * 0.1)
+
+
+@functools.lru_cache(maxsize=TABLE_CACHE_SIZE)
+def _danger_table(osog10, key, tcpa_max, dcpa_max):
+    return DangerTable(osog10 * 0.1, *key, tcpa_max, dcpa_max)
+
+
+def danger_table(osog, cond, tcpa_max, dcpa_max):
+    """
+    条件cond(make_tship的tships_condition中的一项)的DangerTable, 结果会被缓存
+
+    osog不在0.1的网格上时不缓存.
+    """
+    relbrg_min = cond['relbrg_min']
+    relbrg_max = cond['relbrg_max']
+    if relbrg_max < relbrg_min:
+        relbrg_max += 360
+    key = (round(relbrg_min * 10), round(relbrg_max * 10),
+           round(cond['dist_min'] * 10), round(cond['dist_max'] * 10),
+           round(cond['sog_min'] * 10), round(cond['sog_max'] * 10))
+    osog10 = round(osog * 10)
+    if osog10 * 0.1 != osog:
+        return DangerTable(osog, *key, tcpa_max, dcpa_max)
+    return _danger_table(osog10, key, tcpa_max, dcpa_max)
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 WGS84_semimajor_axis_meters = 6378137.0
 mercator_k0 = 0.9996
 WGSinvf = 298.257223563
@@ -239,6 +241,106 @@ def ll_gc_ll(lat, lon, brg, dist):
     return dlat, dlon
 
 
+def adjlon_array(lon):
+    lon = np.asarray(lon, dtype=float)
+    wrapped = lon + ONEPI
+    wrapped = wrapped - TWOPI * np.floor(wrapped / TWOPI)
+    wrapped = wrapped - ONEPI
+    return np.where(np.abs(lon) <= SPI, lon, wrapped)
+
+
+def ll_gc_ll_array(lat, lon, brg, dist):
+    # ll_gc_ll的批量版本, 参数可以是数组(按numpy规则广播),
+    # 逐元素结果与ll_gc_ll一致, 包括子午线和adjlon的特殊处理.
+    # 参数不预先广播, 只与起点和方位有关的部分按它们的形状计算,
+    # 同一起点推算多个距离(例如轨迹)时只计算一次
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    brg = np.asarray(brg, dtype=float)
+    dist = np.asarray(dist, dtype=float)
+    phi1 = lat * DEGREE
+    lam1 = lon * DEGREE
+    al12 = brg * DEGREE
+    geod_S = dist * 1852.0
+
+    f = 1.0 / WGSinvf
+    geod_a = WGS84_semimajor_axis_meters
+
+    es = 2 * f - f * f
+    onef = sqrt(1. - es)
+    geod_f = 1 - onef
+    f4 = geod_f/4
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        al12 = adjlon_array(al12)
+        signS = np.abs(al12) > HALFPI
+        th1 = np.arctan(onef * np.tan(phi1))
+        costh1 = np.cos(th1)
+        sinth1 = np.sin(th1)
+        sina12 = np.sin(al12)
+        merid = np.abs(sina12) < MERI_TOL
+        sina12 = np.where(merid, 0., sina12)
+        cosa12 = np.where(merid, np.where(np.abs(al12) < HALFPI, 1., -1.),
+                          np.cos(al12))
+        # 子午线上M=0, 此时c1/c2/D/P的通用公式与ll_gc_ll中的特殊分支数值相同
+        M = costh1 * sina12
+
+        N = costh1 * cosa12
+        c1 = geod_f * M
+        c2 = f4 * (1. - M * M)
+        D = (1. - c2)*(1. - c2 - c1 * M)
+        P = (1. + .5 * c1 * M) * c2 / D
+
+        s1 = np.where(np.abs(M) >= 1., 0., np.arccos(np.clip(M, -1., 1.)))
+        s1 = sinth1 / np.sin(s1)
+        # 除零得到inf/nan时按0处理
+        s1 = np.where(np.abs(s1) < 1., np.arccos(np.clip(s1, -1., 1.)), 0.)
+        s1 = np.where(merid, HALFPI - th1, s1)
+
+        d = geod_S / (D * geod_a)
+        d = np.where(signS, -d, d)
+        u = 2. * (s1 - d)
+        V = np.cos(u + d)
+        sind = np.sin(d)
+        X = c2 * c2 * (sind) * np.cos(d) * (2. * V * V - 1.)
+        ds = d + X - 2. * P * V * (1. - 2. * P * np.cos(u)) * sind
+        ss = s1 + s1 - ds
+
+        cosds = np.cos(ds)
+        sinds = np.sin(ds)
+        sinds = np.where(signS, -sinds, sinds)
+
+        al21 = N * cosds - sinth1 * sinds
+
+        # 子午线
+        same = (al21 > 0.) == signS
+        phi2_m = np.arctan(np.tan(HALFPI + s1 - ds) / onef)
+        phi2_m = np.where(same, phi2_m, -phi2_m)
+        de_m = np.where(same, PI, 0.)
+
+        # 非子午线
+        al21_n = np.arctan(M / al21)
+        al21_n = np.where(al21_n > 0, al21_n + PI, al21_n)
+        al21_n = np.where(al12 < 0., al21_n - PI, al21_n)
+        al21_n = adjlon_array(al21_n)
+        phi2_n = np.arctan(-(sinth1 * cosds + N * sinds) * np.sin(al21_n) /
+                           (onef*M))
+        de_n = np.arctan2(sinds * sina12,
+                          (costh1 * cosds - sinth1 * sinds * cosa12))
+        de_n = np.where(
+            signS,
+            de_n + c1 * ((1. - c2) * ds + c2 * sinds * np.cos(ss)),
+            de_n - c1 * ((1. - c2) * ds - c2 * sinds * np.cos(ss)))
+
+        phi2 = np.where(merid, phi2_m, phi2_n)
+        de = np.where(merid, de_m, de_n)
+        lam2 = adjlon_array(lam1 + de)
+
+    dlat = phi2 / DEGREE
+    dlon = lam2 / DEGREE
+    return dlat, dlon
+
+
 def DistGreatCircle(slat, slon, dlat, dlon):
     phi1 = slat * DEGREE
     lam1 = slon * DEGREE
@@ -284,6 +386,10 @@ def DistGreatCircle(slat, slon, dlat, dlon):
         sindlamm * sindlamm
     cosd = 1 - L - L
     d = acos(cosd)
+    if d == 0.0:
+        # 两点非常接近但超出DTOL时cosd会舍入为1, 下面的d / sind会除以0
+        geod_S = 0.
+        return 0.0
     if ellipse != 0:
         E = cosd + cosd
         sind = sin(d)
@@ -357,5 +463,147 @@ def DistanceBearingMercator(lat0, lon0, lat1, lon1):
     return dist, brg
 
 
+# 椭球偏心率常数, 供数组版本的函数使用, 避免每次调用重复计算
+ECC_F = 1.0 / WGSinvf
+ECC_ES = 2 * ECC_F - ECC_F * ECC_F
+ECC_E = sqrt(ECC_ES)
+ECC_Z = WGS84_semimajor_axis_meters * mercator_k0
+
+
+def mercator_y_array(lat):
+    # toSM_ECC中纬度对应的y值(未减去参考纬度部分)
+    lat = np.asarray(lat, dtype=float)
+    s = np.sin(lat * DEGREE)
+    return ECC_Z*np.log(np.tan(PI/4 + lat * DEGREE / 2)*np.power(
+        (1. - ECC_E * s)/(1. + ECC_E * s), ECC_E/2.))
+
+
+def toSM_ECC_array(lat, lon, lat0, lon0):
+    lon = np.asarray(lon, dtype=float)
+    x = (lon - lon0) * DEGREE * ECC_Z
+    y = mercator_y_array(lat) - mercator_y_array(lat0)
+    return x, y
+
+
+def DistGreatCircle_array(slat, slon, dlat, dlon):
+    phi1 = np.asarray(slat, dtype=float) * DEGREE
+    lam1 = np.asarray(slon, dtype=float) * DEGREE
+    phi2 = np.asarray(dlat, dtype=float) * DEGREE
+    lam2 = np.asarray(dlon, dtype=float) * DEGREE
+
+    onef = sqrt(1. - ECC_ES)
+    geod_f = 1 - onef
+    f4 = geod_f/4
+    f64 = geod_f*geod_f/64
+    geod_a = WGS84_semimajor_axis_meters
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        th1 = np.arctan(onef * np.tan(phi1))
+        th2 = np.arctan(onef * np.tan(phi2))
+
+        thm = .5 * (th1 + th2)
+        dthm = .5 * (th2 - th1)
+        dlam = adjlon_array(lam2-lam1)
+        dlamm = .5 * (dlam)
+        same = (np.abs(dlam) < DTOL) & (np.abs(dthm) < DTOL)
+
+        sindlamm = np.sin(dlamm)
+        costhm = np.cos(thm)
+        sinthm = np.sin(thm)
+        cosdthm = np.cos(dthm)
+        sindthm = np.sin(dthm)
+
+        L = sindthm * sindthm + (cosdthm * cosdthm - sinthm * sinthm) *\
+            sindlamm * sindlamm
+        cosd = 1 - L - L
+        d = np.arccos(cosd)
+        E = cosd + cosd
+        sind = np.sin(d)
+        Y = sinthm * cosdthm
+        Y = Y * (Y + Y) / (1. - L)
+        T = sindthm * costhm
+        T = T * (T + T) / L
+        X = Y + T
+        Y = Y - T
+        T = d / sind
+        D = 4. * T * T
+        A = D * E
+        B = D + D
+        geod_S = geod_a * sind * (T - f4 * (T * X - Y) +
+                                  f64 * (X * (A + (T - .5 * (A - E)) * X) -
+                                         Y * (B + E * Y) + D * X * Y))
+
+    return np.where(same | (d == 0.0), 0.0, geod_S / 1852.0)
+
+
+def DistanceBearingMercator_array(lat0, lon0, lat1, lon1):
+    # DistanceBearingMercator的逐元素数组版本, 参数按numpy规则广播
+    lat0, lon0, lat1, lon1 = np.broadcast_arrays(
+        np.asarray(lat0, dtype=float), np.asarray(lon0, dtype=float),
+        np.asarray(lat1, dtype=float), np.asarray(lon1, dtype=float))
+    y0 = mercator_y_array(lat0)
+    y1 = mercator_y_array(lat1)
+    return _distance_bearing_mercator(lat0, lon0, lat1, lon1, y0, y1)
+
+
+def DistanceBearingMercator_y(lat0, lon0, lat1, lon1, y0, y1):
+    # 与DistanceBearingMercator_array相同, y0, y1为预先算出的mercator_y_array(lat0/lat1),
+    # 同一位置参与多次计算时(例如多条船两两之间)避免重复计算
+    return _distance_bearing_mercator(lat0, lon0, lat1, lon1, y0, y1)
+
+
+def DistanceBearingMercatorMatrix(lats, lons):
+    # 计算N个位置两两之间的距离和方位
+    # 结果[i, j]等于DistanceBearingMercator(lats[i], lons[i], lats[j], lons[j])
+    lats = np.asarray(lats, dtype=float).ravel()
+    lons = np.asarray(lons, dtype=float).ravel()
+    # 每个位置的墨卡托y值只计算一次
+    y = mercator_y_array(lats)
+    return _distance_bearing_mercator(
+        lats[:, None], lons[:, None], lats[None, :], lons[None, :],
+        y[:, None], y[None, :])
+
+
+def _distance_bearing_mercator(lat0, lon0, lat1, lon1, y0, y1):
+    lat0, lon0, lat1, lon1, y0, y1 = np.broadcast_arrays(
+        lat0, lon0, lat1, lon1, y0, y1)
+
+    # 跨越180度经线的处理, 与DistanceBearingMercator相同
+    cross = (lon0 * lon1) < 0.
+    lon0x = np.where(cross & (lon0 < 0.0), lon0 + 360.0, lon0)
+    lon1x = np.where(cross & ~(lon0 < 0.0), lon1 + 360.0, lon1)
+    wrap = cross & (np.abs(lon0x - lon1x) > 180.)
+    greater = lon0x > lon1x
+    lon0x = np.where(wrap & greater, lon0x - 360.0, lon0x)
+    lon1x = np.where(wrap & ~greater, lon1x - 360.0, lon1x)
+    lon1x = np.where(cross, lon1x + 360., lon1x)
+    lon0x = np.where(cross, lon0x + 360., lon0x)
+
+    east = (lon1x - lon0x) * DEGREE * ECC_Z
+    north = y1 - y0
+
+    near = np.abs(lat1-lat0) < 1e-9
+    mlat0 = np.where(near, lat0 + 1e-9, lat0)
+    north_m = north
+    if near.any():
+        north_m = np.where(near, y1 - mercator_y_array(mlat0), north)
+
+    C = np.arctan2(east, north_m)
+    cosC = np.cos(C)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dist = np.where(cosC != 0.0, (lat1 - mlat0) * 60. / cosC, 0.0)
+    zero = cosC == 0.0
+    if zero.any():
+        dist = np.where(zero, DistGreatCircle_array(lat0, lon0, lat1, lon1),
+                        dist)
+
+    C = np.arctan2(east, north)
+    brgt = 180. + (C * 180. / PI)
+    brg = np.where(brgt < 0, brgt + 360.,
+                   np.where(brgt >= 360., brgt - 360., brgt))
+
+    return dist, brg
+
+
 # ll_gc_ll(24, 118, 90, 1)
 # DistanceBearingMercator(14, -11, 12, 118)
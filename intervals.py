@@ -0,0 +1,128 @@
+"""
+连续取值范围
+
+make_tship_arg等函数计算出的危险/非危险delta范围用IntervalSet表示,
+可以直接在浮点范围内均匀取值, 不需要把范围展开成整数列表再打乱.
+"""
+
+import bisect
+import random
+
+
+class IntervalSet:
+    """
+    若干闭区间的并集, 区间按起点排序且互不重叠
+
+    长度为0的区间(单点)也是有效的, 例如[0, 0]表示只能取0.
+    """
+
+    __slots__ = ('_intervals', '_starts', '_cumlen', 'length')
+
+    def __init__(self, intervals=()):
+        merged = []
+        for lo, hi in sorted((float(lo), float(hi)) for lo, hi in intervals):
+            if lo > hi:
+                continue
+            if merged and lo <= merged[-1][1]:
+                if hi > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], hi)
+            else:
+                merged.append((lo, hi))
+        self._intervals = tuple(merged)
+        self._starts = [lo for lo, hi in merged]
+        cumlen = []
+        length = 0.0
+        for lo, hi in merged:
+            length += hi - lo
+            cumlen.append(length)
+        self._cumlen = cumlen
+        self.length = length
+
+    @classmethod
+    def point(cls, x):
+        return cls([(x, x)])
+
+    def __bool__(self):
+        return bool(self._intervals)
+
+    def __iter__(self):
+        return iter(self._intervals)
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def __eq__(self, other):
+        if not isinstance(other, IntervalSet):
+            return NotImplemented
+        return self._intervals == other._intervals
+
+    def __repr__(self):
+        return 'IntervalSet(%s)' % ', '.join('[%g, %g]' % iv for iv in self._intervals)
+
+    def __contains__(self, x):
+        i = bisect.bisect_right(self._starts, x) - 1
+        return i >= 0 and x <= self._intervals[i][1]
+
+    def __or__(self, other):
+        return IntervalSet(self._intervals + other._intervals)
+
+    def __and__(self, other):
+        result = []
+        i = j = 0
+        a, b = self._intervals, other._intervals
+        while i < len(a) and j < len(b):
+            lo = max(a[i][0], b[j][0])
+            hi = min(a[i][1], b[j][1])
+            if lo <= hi:
+                result.append((lo, hi))
+            if a[i][1] < b[j][1]:
+                i += 1
+            else:
+                j += 1
+        return IntervalSet(result)
+
+    def complement(self, lo, hi):
+        """[lo, hi]中不属于本集合的部分, 边界点仍然包含在结果中"""
+        result = []
+        start = lo
+        for a, b in self._intervals:
+            if b < lo or a > hi:
+                continue
+            if a > start:
+                result.append((start, a))
+            start = max(start, b)
+        if start < hi:
+            result.append((start, hi))
+        return IntervalSet(result)
+
+    def sample(self, rng=random):
+        """均匀取一个值, 总长度为0时在各个单点中随机选择"""
+        if not self._intervals:
+            raise ValueError('sample from empty IntervalSet')
+        if self.length <= 0.0:
+            return rng.choice(self._intervals)[0]
+        x = rng.uniform(0.0, self.length)
+        i = min(bisect.bisect_left(self._cumlen, x), len(self._intervals) - 1)
+        lo, hi = self._intervals[i]
+        prev = self._cumlen[i-1] if i > 0 else 0.0
+        return min(lo + (x - prev), hi)
+
+    def count(self, step=1.0):
+        """按step取整数网格时的取值个数, 作为candidates的默认数量"""
+        return sum(int((hi - lo) / step) + 1 for lo, hi in self._intervals)
+
+    def candidates(self, rng=random, step=1.0):
+        """
+        依次产出候选值, 数量与count(step)相同
+
+        每个区间按step分格, 打乱格的顺序后在每格中均匀取一个值, 每格只取一次,
+        候选用完时整个范围都已按原来的1度网格搜索过, 同时保留了格内的小数取值.
+        """
+        cells = []
+        for lo, hi in self._intervals:
+            for k in range(int((hi - lo) / step) + 1):
+                a = min(lo + k * step, hi)
+                cells.append((a, min(a + step, hi)))
+        rng.shuffle(cells)
+        for a, b in cells:
+            yield rng.uniform(a, b) if a < b else a
@@ -4,1197 +4,39 @@ from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 
 import math
-import random
 
 import logging
 import sys
 import traceback
-import xml.dom.minidom
-import json
-import georef
-
-SAFE_TCPA = 30.0
-SAFE_DCPA = 2.0
-TT_DCPA = 1.0
-
-with open('config.json', 'r') as f:
-    conf = json.load(f)
-    TT_DCPA = conf.get('tt_DCPA', 1.0)
-
-speed_list = [
-    (1, '海上全速', 16.6, 17.6),
-    (2, '全速', 13.2, 14.5),
-    (3, '半速', 10.9, 12.2),
-    (4, '慢速', 8.9, 10),
-    (5, '微速', 5.7, 6.4),
-]
-
-visibility_list = [
-    (1, '不良'),
-    (2, '良好'),
-]
-
-stage_list = [
-    # 8,14海里
-    (1, '碰撞危险', 8, 14),
-    # 2-3海里
-    (2, '紧迫局面', 2, 3),
-    # 1-2海里
-    (3, '紧迫危险', 1, 2),
-    (4, '没有危险', 1, 14),
-]
-
-ownship_behavior_list = [
-    (1, '直航船'),
-    (2, '让路船'),
-]
-
-meeting_situation_list = [
-    (1, '对遇', (356, 6), (8, 14), 1),
-    (2, '右舷小角度交叉会遇', (6, 67.5), (8, 14), 1),
-    (3, '右舷大角度交叉会遇', (67.5, 112.5), (8, 14), 1),
-    (4, '左舷追越', (180, 247.5), (4, 7), 1),
-    (5, '右舷追越', (112.5, 180), (4, 7), 1),
-    (6, '左舷小角度交叉会遇', (247.5, 292.5), (8, 14), 2),
-    (7, '左舷大角度交叉会遇', (292.5, 354), (8, 14), 2),
-    (8, '左舷被追越', (112.5, 180), (4, 7), 2),  # 原始方位为 Bt，需改为 Bo
-    (9, '右舷被追越', (180, 247.5), (4, 7), 2),  # 原始方位为 Bt，需改为 Bo
-    (10, '正后被追越', (180, 180), (4, 7), 2),   # 原始方位为 Bt，需改为 Bo
-]
-
-target_behavior_list = [
-    (1, '协调避让'),
-    (2, '不协调避让'),
-]
-
-meeting_situation_table = [
-    {
-        'name': '对遇',
-        'id': 1,
-        'deg': (354, 6),
-        'dist': (8, 14),
-        'plan': '向右转向',
-    },
-    {
-        'name': '右舷小角度交叉会遇',
-        'id': 2,
-        'deg': (6, 67.5),
-        'dist': (8, 14),
-        'plan': '向右转向',
-    },
-    {
-        'name': '右舷大角度交叉会遇',
-        'id': 3,
-        'deg': (67.5, 112.5),
-        'dist': (8, 14),
-        'plan': '向右转向',
-    },
-    {
-        'name': '左舷追越',
-        'id': 4,
-        'deg': (180, 247.5),
-        'dist': (4, 7),
-        'plan': '左/右让',
-    },
-    {
-        'name': '右舷追越',
-        'id': 5,
-        'deg': (112.5, 180),
-        'dist': (4, 7),
-        'plan': '左/右让',
-    },
-    {
-        'name': '左舷小角度交叉会遇',
-        'id': 6,
-        'deg': (247.5, 292.5),
-        'dist': (8, 14),
-        'plan': '直航',
-    },
-    {
-        'name': '左舷大角度交叉会遇',
-        'id': 7,
-        'deg': (292.5, 354),
-        'dist': (8, 14),
-        'plan': '直航',
-    },
-    {
-        'name': '左舷被追越',
-        'id': 8,
-        'deg': (112.5, 180),
-        'dist': (4, 7),
-        'plan': '左/右让',
-    },
-    {
-        'name': '右舷被追越',
-        'id': 9,
-        'deg': (180, 247.5),
-        'dist': (4, 7),
-        'plan': '左/右让',
-},
-]
-
-
-def get_rel_course_north(v_x_o, v_y_o, v_x_t, v_y_t):
-    dvx = v_x_t - v_x_o
-    dvy = v_y_t - v_y_o
-    course = math.degrees(math.atan2(dvx, dvy))
-    if course < 0.0:
-        course += 360.0
-
-    return course
-
-
-def calc_rel_spd_cog(osog, ocog, tsog, tcog):
-    # 正北分解速度的x和y
-    v_x_o = osog * math.sin(math.radians(ocog))
-    v_y_o = osog * math.cos(math.radians(ocog))
-    v_x_t = tsog * math.sin(math.radians(tcog))
-    v_y_t = tsog * math.cos(math.radians(tcog))
-
-    # 计算相对本船的速度
-    v_x_rel = v_x_t - v_x_o
-    v_y_rel = v_y_t - v_y_o
-    rel_spd = math.sqrt(v_x_rel*v_x_rel + v_y_rel*v_y_rel)
-
-    # 得到相对本船的相对速度方向
-    rel_course = get_rel_course_north(v_x_o, v_y_o, v_x_t, v_y_t)
-    return rel_spd, rel_course
-
-def calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog):
-    # 计算2个位置的相对距离和相对方位
-    # 得到的结果是(tlat, tlon)点在(olat, olon)的brg方位上
-    dist, brg = georef.DistanceBearingMercator(tlat, tlon, olat, olon)
-
-    # 正北分解速度的x和y
-    v_x_o = osog * math.sin(math.radians(ocog))
-    v_y_o = osog * math.cos(math.radians(ocog))
-    v_x_t = tsog * math.sin(math.radians(tcog))
-    v_y_t = tsog * math.cos(math.radians(tcog))
-
-    # 计算相对本船的速度
-    v_x_rel = v_x_t - v_x_o
-    v_y_rel = v_y_t - v_y_o
-    rel_spd = math.sqrt(v_x_rel*v_x_rel + v_y_rel*v_y_rel)
-
-    # 得到相对本船的相对速度方向
-    rel_course = get_rel_course_north(v_x_o, v_y_o, v_x_t, v_y_t)
-
-    # ???
-    delta = rel_course - brg - 180.0
-    # if delta < 0.0:
-    #     delta = delta + 360.0
-    # if delta > 180.0:
-    #     delta = delta - 180.0
-    TCPA = 99999.0
-    if rel_spd > 0.001:
-        TCPA = dist * math.cos(math.radians(delta)) / rel_spd * 60.0
-
-    DCPA = abs(dist * math.sin(math.radians(delta)))
-
-    return TCPA, DCPA
-
-
-def mod360(d):
-    v = math.fmod(d, 360)
-    if v < 0.0:
-        v += 360.0
-    return v
-
-
-def fmt2f(*v):
-    for i in v:
-        print('%.2f' % i)
-
-
-OSOG_MIN = 10.0
-OSOG_MAX = 20.0
-TSOG_MIN = 10.0
-TSOG_MAX = 20.0
-
-
-def gen_oship(lat, lon, sog_min, sog_max):
-    sog = random.randint(round(sog_min*10), round(sog_max*10))*0.1
-    cog = random.randint(0, 3599)*0.1
-    return {
-        'lat': lat,
-        'lon': lon,
-        'sog': sog,
-        'cog': cog,
-    }
-
-
-def gen_tship(oship, relbrgMin, relbrgMax, distMin, distMax, sogMin, sogMax):
-    if relbrgMax < relbrgMin:
-        relbrgMax += 360
-    olat = oship['lat']
-    olon = oship['lon']
-    osog = oship['sog']
-    ocog = oship['cog']
-
-    dist = random.randint(round(distMin*10), round(distMax*10))*0.1
-    relbrg = random.randint(round(relbrgMin*10), round(relbrgMax*10))*0.1
-    relbrg = mod360(relbrg)
-    tsog = random.randint(round(sogMin*10), round(sogMax*10))*0.1
-    tcog = mod360(ocog + relbrg + 180.0)
-
-    rel_spd, rel_cog = calc_rel_spd_cog(tsog, tcog, osog, ocog)
-
-    brg = rel_cog
-    tlat, tlon = georef.ll_gc_ll(olat, olon, brg, dist)
-    TCPA, DCPA = calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog)
-
-    rel_spd, rel_cog = calc_rel_spd_cog(osog, ocog, tsog, tcog)
-
-    return {
-        'olat': olat,
-        'olon': olon,
-        'tlat': tlat,
-        'tlon': tlon,
-        'osog': osog,
-        'ocog': ocog,
-        'tsog': tsog,
-        'tcog': tcog,
-        'dist': dist,
-        'brg': brg,
-        'relbrg': relbrg,
-        'rel_cog': rel_cog,
-        'rel_spd': rel_spd,
-        'TCPA': TCPA,
-        'DCPA': DCPA,
-    }
-
-
-def gen_tship_no_danger(oship, relbrgMin, relbrgMax,
-                        distMin, distMax, sogMin, sogMax):
-    if relbrgMax < relbrgMin:
-        relbrgMax += 360
-    olat = oship['lat']
-    olon = oship['lon']
-    osog = oship['sog']
-    ocog = oship['cog']
-
-    dist = random.randint(round(distMin*10), round(distMax*10))*0.1
-    relbrg = random.randint(round(relbrgMin*10), round(relbrgMax*10))*0.1
-    relbrg = mod360(relbrg)
-    tsog = random.randint(round(sogMin*10), round(sogMax*10))*0.1
-    tcog = mod360(ocog + relbrg + 180.0)
-
-    rel_spd, rel_cog = calc_rel_spd_cog(tsog, tcog, osog, ocog)
-
-    brg = mod360(rel_cog + random.randint(150, 3450) * 0.1)
-    # brg = mod360(rel_cog + random.randint(135, 225))
-    tlat, tlon = georef.ll_gc_ll(olat, olon, brg, dist)
-    TCPA, DCPA = calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog)
-
-    if TCPA >= 0.0 and DCPA <= 2.0:
-        # 还有危险
-        # 直接使TCPA小于0
-        brg = mod360(rel_cog + 180)
-        tlat, tlon = georef.ll_gc_ll(olat, olon, brg, dist)
-        TCPA, DCPA = calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog)
-
-    rel_spd, rel_cog = calc_rel_spd_cog(osog, ocog, tsog, tcog)
-
-    return {
-        'olat': olat,
-        'olon': olon,
-        'tlat': tlat,
-        'tlon': tlon,
-        'osog': osog,
-        'ocog': ocog,
-        'tsog': tsog,
-        'tcog': tcog,
-        'dist': dist,
-        'brg': brg,
-        'relbrg': relbrg,
-        'rel_cog': rel_cog,
-        'rel_spd': rel_spd,
-        'TCPA': TCPA,
-        'DCPA': DCPA,
-    }
-
-
-def gen_tship_check(oship, tships, rel_brg_min, rel_brg_max,
-                    dist_min, dist_max, sog_min, sog_max):
-    tship = gen_tship(oship, rel_brg_min, rel_brg_max,
-                      dist_min, dist_max, sog_min, sog_max)
-    for t in tships:
-        TCPA, DCPA = calc_CPA(
-            tship['tlat'], tship['tlon'], t['tlat'], t['tlon'],
-            tship['tsog'], t['tsog'], tship['tcog'], t['tcog'])
-        if TCPA >= 0.0 and DCPA <= 2.0:
-            return None
-    return tship
-
-
-def gen_tship_check_no_danger(oship, tships, rel_brg_min, rel_brg_max,
-                              dist_min, dist_max, sog_min, sog_max):
-    tship = gen_tship_no_danger(oship, rel_brg_min, rel_brg_max,
-                                dist_min, dist_max, sog_min, sog_max)
-    for t in tships:
-        TCPA, DCPA = calc_CPA(
-            tship['tlat'], tship['tlon'], t['tlat'], t['tlon'],
-            tship['tsog'], t['tsog'], tship['tcog'], t['tcog'])
-        if TCPA >= 0.0 and DCPA <= 2.0:
-            return None
-    return tship
-
-
-def make_tship_arg_detail(oship, relbrg, dist, tsog):
-    olat = oship['lat']
-    olon = oship['lon']
-    osog = oship['sog']
-    ocog = oship['cog']
-
-    tcog = mod360(ocog + relbrg + 180.0)
-
-    rel_spd, rel_cog = calc_rel_spd_cog(tsog, tcog, osog, ocog)
-
-    # 修正：正确计算相对方位（Bt）
-    # Bt = 目标船真方位 - 本船船首向
-    # 目标船真方位就是rel_cog（相对航向）
-    relbrg_corrected = mod360(rel_cog - ocog)
-
-    # TCPA的计算公式:
-    # delta = rel_course - brg - 180.0
-    # TCPA = dist * math.cos(math.radians(delta)) / rel_spd * 60.0
-    # delta = acos(TCPA/dist*rel_spd/60.0)
-    # 根据以上公式,计算让TCPA=0,(0,30], TCPA>30, TCPA<0等几个数值
-    # acos函数的参数要求[-1,1],需要进行处理
-    # DCPA的计算公式:
-    # DCPA = dist * math.sin(math.radians(delta))
-    # delta = asin(DCPA / dist)
-
-    # acos参数范围[-1,1], 值范围[180, 0], 单调递减
-    # 必定有cosdeg0 < cosdeg1
-
-    cosdeg0 = math.degrees(math.acos(min(30.0 / dist * rel_spd / 60.0, 1.0)))
-    cosdeg1 = math.degrees(math.acos(0.0 / dist * rel_spd / 60.0))
-
-    # danger_cos = [cosdeg0, cosdeg1]
-    # nodanger_cos = [min(math.floor(cosdeg1+1), 179), 180]
-
-    # 对于danger_delta还需要处理,如果dist大于2时,识别为nodanger
-
-    # asin参数范围[-1,1], 值范围[-90, 90], 单调递增
-    # 必定有sindeg在[0, 90]
-    # 必定有sindeg0<sindeg1
-    sindeg0 = math.degrees(math.asin(0))
-    sindeg1 = math.degrees(math.asin(min(2.0/dist, 1.0)))
-
-    # danger_sin = [sindeg0, sindeg1]
-    # nodanger_sin = [min(math.floor(sindeg1+1), 89), 90]
-
-    danger_rngs = []
-    nodanger_rngs = []
-    # 没有相交
-    if cosdeg1 < sindeg0 or sindeg1 < cosdeg0:
-        pass
-    # sin被cos包容
-    elif cosdeg0 <= sindeg0 and cosdeg1 >= sindeg1:
-        danger_rngs.append([round(sindeg0), round(sindeg1)])
-    # cos被sin包容
-    elif sindeg0 <= cosdeg0 and sindeg1 >= cosdeg1:
-        danger_rngs.append([round(cosdeg0), round(cosdeg1)])
-    # 相交
-    elif cosdeg1 >= sindeg0:
-        danger_rngs.append([round(sindeg0), round(cosdeg0)])
-    else:
-        danger_rngs.append([round(cosdeg0), round(sindeg0)])
-
-    if danger_rngs:
-        val0 = danger_rngs[0][0]
-        val1 = danger_rngs[0][1]
-        if val0 > 0:
-            nodanger_rngs.append([0, val0-1])
-        if val1 < 180:
-            nodanger_rngs.append([val1+1, 180])
-    else:
-        nodanger_rngs.append([0, 180])
-
-    danger_rngs = [[0, 0]]
-    rel_spd, rel_cog = calc_rel_spd_cog(osog, ocog, tsog, tcog)
-
-    return {
-        'olat': olat,
-        'olon': olon,
-        # 'tlat': tlat,
-        # 'tlon': tlon,
-        'osog': osog,
-        'ocog': ocog,
-        'tsog': tsog,
-        'tcog': tcog,
-        'dist': dist,
-        # 'brg': brg,
-        'relbrg': relbrg_corrected,  # 使用修正后的相对方位
-        'rel_cog': rel_cog,
-        'rel_spd': rel_spd,
-        'danger': danger_rngs,
-        'nodanger': nodanger_rngs
-    }
-
-
-def make_tship_arg(oship, relbrgMin, relbrgMax,
-                   distMin, distMax, sogMin, sogMax):
-    if relbrgMax < relbrgMin:
-        relbrgMax += 360
-    olat = oship['lat']
-    olon = oship['lon']
-    osog = oship['sog']
-    ocog = oship['cog']
-
-    dist = random.randint(round(distMin*10), round(distMax*10))*0.1
-    relbrg = random.randint(round(relbrgMin*10), round(relbrgMax*10))*0.1
-    relbrg = mod360(relbrg)
-    tsog = random.randint(round(sogMin*10), round(sogMax*10))*0.1
-    tcog = mod360(ocog + relbrg + 180.0)
-
-    rel_spd, rel_cog = calc_rel_spd_cog(tsog, tcog, osog, ocog)
-
-    # 修正：正确计算相对方位（Bt）
-    # Bt = 目标船真方位 - 本船船首向
-    # 目标船真方位就是rel_cog（相对航向）
-    relbrg_corrected = mod360(rel_cog - ocog)
-
-    # TCPA的计算公式:
-    # delta = rel_course - brg - 180.0
-    # TCPA = dist * math.cos(math.radians(delta)) / rel_spd * 60.0
-    # delta = acos(TCPA/dist*rel_spd/60.0)
-    # 根据以上公式,计算让TCPA=0,(0,30], TCPA>30, TCPA<0等几个数值
-    # acos函数的参数要求[-1,1],需要进行处理
-    # DCPA的计算公式:
-    # DCPA = dist * math.sin(math.radians(delta))
-    # delta = asin(DCPA / dist)
-
-    # acos参数范围[-1,1], 值范围[180, 0], 单调递减
-    # 必定有cosdeg0 < cosdeg1
-
-    cosdeg0 = math.degrees(math.acos(min(SAFE_TCPA / dist * rel_spd / 60.0, 1.0)))
-    cosdeg1 = math.degrees(math.acos(0.0 / dist * rel_spd / 60.0))
-
-    # danger_cos = [cosdeg0, cosdeg1]
-    # nodanger_cos = [min(math.floor(cosdeg1+1), 179), 180]
-
-    # 对于danger_delta还需要处理,如果dist大于2时,识别为nodanger
-
-    # asin参数范围[-1,1], 值范围[-90, 90], 单调递增
-    # 必定有sindeg在[0, 90]
-    # 必定有sindeg0<sindeg1
-    sindeg0 = math.degrees(math.asin(0))
-    sindeg1 = math.degrees(math.asin(min(SAFE_DCPA/dist, 1.0)))
-
-    # danger_sin = [sindeg0, sindeg1]
-    # nodanger_sin = [min(math.floor(sindeg1+1), 89), 90]
-
-    danger_rngs = []
-    nodanger_rngs = []
-    # 没有相交
-    if cosdeg1 < sindeg0 or sindeg1 < cosdeg0:
-        pass
-    # sin被cos包容
-    elif cosdeg0 <= sindeg0 and cosdeg1 >= sindeg1:
-        danger_rngs.append([round(sindeg0), round(sindeg1)])
-    # cos被sin包容
-    elif sindeg0 <= cosdeg0 and sindeg1 >= cosdeg1:
-        danger_rngs.append([round(cosdeg0), round(cosdeg1)])
-    # 相交
-    elif cosdeg1 >= sindeg0:
-        danger_rngs.append([round(sindeg0), round(cosdeg0)])
-    else:
-        danger_rngs.append([round(cosdeg0), round(sindeg0)])
-
-    if danger_rngs:
-        val0 = danger_rngs[0][0]
-        val1 = danger_rngs[0][1]
-        if val0 > 0:
-            nodanger_rngs.append([0, val0-1])
-        if val1 < 180:
-            nodanger_rngs.append([val1+1, 180])
-    else:
-        nodanger_rngs.append([0, 180])
-
-    rel_spd, rel_cog = calc_rel_spd_cog(osog, ocog, tsog, tcog)
-
-    return {
-        'olat': olat,
-        'olon': olon,
-        # 'tlat': tlat,
-        # 'tlon': tlon,
-        'osog': osog,
-        'ocog': ocog,
-        'tsog': tsog,
-        'tcog': tcog,
-        'dist': dist,
-        # 'brg': brg,
-        'relbrg': relbrg_corrected,  # 使用修正后的相对方位
-        'rel_cog': rel_cog,
-        'rel_spd': rel_spd,
-        'danger': danger_rngs,
-        'nodanger': nodanger_rngs
-    }
-
-
-def make_tship_by_arg(tship_arg, delta):
-    olat = tship_arg['olat']
-    olon = tship_arg['olon']
-    osog = tship_arg['osog']
-    ocog = tship_arg['ocog']
-    tsog = tship_arg['tsog']
-    tcog = tship_arg['tcog']
-    dist = tship_arg['dist']
-    rel_cog = tship_arg['rel_cog']
-    brg = (rel_cog-180.0) + delta
-    brg = mod360(brg)
-    tlat, tlon = georef.ll_gc_ll(olat, olon, brg, dist)
-    TCPA, DCPA = calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog)
-    tship = {k: v for k, v in tship_arg.items()}
-    tship['tlat'] = tlat
-    tship['tlon'] = tlon
-    tship['brg'] = brg
-    tship['TCPA'] = TCPA
-    tship['DCPA'] = DCPA
-    return tship
-
-
-def make_tship_dist_is_ok(tship0, tship1):
-    lat0 = tship0['tlat']
-    lon0 = tship0['tlon']
-    lat1 = tship1['tlat']
-    lon1 = tship1['tlon']
-    dist, brg = georef.DistanceBearingMercator(lat0, lon0, lat1, lon1)
-    if dist < 0.5:
-        return False
-    return True
-
-
-def make_tship_is_safe_tt(tship0, tship1):
-    lat0 = tship0['tlat']
-    lon0 = tship0['tlon']
-    sog0 = tship0['tsog']
-    cog0 = tship0['tsog']
-    lat1 = tship1['tlat']
-    lon1 = tship1['tlon']
-    sog1 = tship1['tsog']
-    cog1 = tship1['tsog']
-    TCPA, DCPA = calc_CPA(lat0, lon0, lat1, lon1, sog0, sog1, cog0, cog1)
-    if TCPA < 0.0:
-        return True
-    # if TCPA > 30.0 or DCPA > 2.0:
-    # if TCPA > SAFE_TCPA or DCPA > SAFE_DCPA:
-    # if TCPA > SAFE_TCPA:
-    if DCPA > TT_DCPA:
-        return True
-    return False
-
-
-def make_tship_check_tt(tships, tt):
-    size = len(tships)
-    if size <= 1:
-        return True
-    danger_list = []
-    for i in range(size):
-        tship0 = tships[i]
-        for j in range(i+1, size):
-            tship1 = tships[j]
-            # 距离太近
-            if not make_tship_dist_is_ok(tship0, tship1):
-                return False
-            is_safe = make_tship_is_safe_tt(tship0, tship1)
-            if tt == 2 and is_safe:
-                return False
-            if tt == 1 and not is_safe:
-                return False
-            danger_list.append(1 if not is_safe else 0)
-    sum_danger = sum(danger_list)
-    if tt == 1 and sum_danger == 0:
-        return True
-    if tt == 2 and sum_danger == len(danger_list):
-        return True
-    if tt == 3 and sum_danger > 0:
-        return True
-    if tt == 4:
-        return True
-    return False
-
-
-# ot:
-# 1:本船和所有目标船没有危险
-# 2:本船和所有目标船有危险
-# 3:本船至少和1条目标船有危险
-# 4: 随机
-# tt:
-# 1:所有目标船之间都没有危险
-# 2:所有目标船之间都有危险
-# 3:所有目标船之间,至少1对有危险
-# 4: 随机
-def make_tship(oship, tships_condition, ot, tt):
-    tship_args = []
-    tship_deltas = []
-    for idx, cond in enumerate(tships_condition):
-        relbrg_min = cond['relbrg_min']
-        relbrg_max = cond['relbrg_max']
-        dist_min = cond['dist_min']
-        dist_max = cond['dist_max']
-        sog_min = cond['sog_min']
-        sog_max = cond['sog_max']
-        targ = None
-        while True:
-            targ = make_tship_arg(oship, relbrg_min, relbrg_max,
-                                  dist_min, dist_max, sog_min, sog_max)
-            if targ['danger'] and targ['nodanger']:
-                break
-            elif not targ['danger'] and ot == 1:
-                break
-            elif not targ['nodanger'] and ot == 2:
-                break
-            elif ot == 4:
-                break
 
-        tship_args.append(targ)
-        dangers = targ['danger']
-        nodangers = targ['nodanger']
-        delta_list = []
-        # 至少一条危险目标船时,ot==3
-        # 第一条目标船必定时危险,(ot==2 and idx==0)
-        if ot == 1:
-            for nodanger in nodangers:
-                delta_list.extend(range(nodanger[0], nodanger[1]+1))
-        elif ot == 2 or (ot == 3 and idx == 0):
-            for danger in dangers:
-                delta_list.extend(range(danger[0], danger[1]+1))
-        else:
-            for danger in dangers:
-                delta_list.extend(range(danger[0], danger[1]+1))
-            for nodanger in nodangers:
-                delta_list.extend(range(nodanger[0], nodanger[1]+1))
-        random.shuffle(delta_list)
-        tship_deltas.append(delta_list)
-
-    tships = []
-    tships_delta_i = {}
-    idx = 0
-    while True:
-        targ = tship_args[idx]
-        delta_start = tships_delta_i.get(idx, 0)
-        for delta_i in range(delta_start, len(tship_deltas[idx])):
-            delta = tship_deltas[idx][delta_i]
-            tship = make_tship_by_arg(targ, delta)
-            check_list = tships[:]
-            check_list.append(tship)
-            if make_tship_check_tt(check_list, tt):
-                tships.append(tship)
-                tships_delta_i[idx] = delta_i + 1
-                idx = idx + 1
-                break
-        else:
-            # 没有满足条件的delta
-            tships = tships[:-1]
-            idx = idx - 1
-        if idx >= len(tship_args):
-            break
-        if idx < 0:
-            print('fail')
-            break
-
-    return tships
-
-
-def make_tship_one_detail(oship, idx, relbrg, dist, sog, ot, tt):
-    tship_args = []
-    tship_deltas = []
-    targ = None
-    while True:
-        targ = make_tship_arg_detail(oship, relbrg, dist, sog)
-        if targ['danger'] and targ['nodanger']:
-            break
-        elif not targ['danger'] and ot == 1:
-            break
-        elif not targ['nodanger'] and ot == 2:
-            break
-        elif ot == 4:
-            break
-
-    tship_args.append(targ)
-    dangers = targ['danger']
-    nodangers = targ['nodanger']
-    delta_list = []
-    # 至少一条危险目标船时,ot==3
-    # 第一条目标船必定时危险,(ot==2 and idx==0)
-    if ot == 1:
-        for nodanger in nodangers:
-            delta_list.extend(range(nodanger[0], nodanger[1]+1))
-    elif ot == 2 or (ot == 3 and idx == 0):
-        for danger in dangers:
-            delta_list.extend(range(danger[0], danger[1]+1))
-    else:
-        for danger in dangers:
-            delta_list.extend(range(danger[0], danger[1]+1))
-        for nodanger in nodangers:
-            delta_list.extend(range(nodanger[0], nodanger[1]+1))
-    random.shuffle(delta_list)
-    tship_deltas.append(delta_list)
-
-    tships = []
-    tships_delta_i = {}
-    idx = 0
-    while True:
-        targ = tship_args[idx]
-        delta_start = tships_delta_i.get(idx, 0)
-        for delta_i in range(delta_start, len(tship_deltas[idx])):
-            delta = tship_deltas[idx][delta_i]
-            tship = make_tship_by_arg(targ, delta)
-            check_list = tships[:]
-            check_list.append(tship)
-            if make_tship_check_tt(check_list, tt):
-                tships.append(tship)
-                tships_delta_i[idx] = delta_i + 1
-                idx = idx + 1
-                break
-        else:
-            # 没有满足条件的delta
-            tships = tships[:-1]
-            idx = idx - 1
-        if idx >= len(tship_args):
-            break
-        if idx < 0:
-            print('fail')
-            break
-
-
-class Ship:
+from scenario_core import *
+from scenario_io import (SCENE_FORMATS, export_scenes, nto_text, save_main_csv,
+                         save_main_xml, sce_text, to_dmm)
 
-    def __init__(self):
-        self.lat = None
-        self.lon = None
-        self.sog = 0.0
-        self.cog = 0.0
-
-    def calc_CPA(self, other):
-        TCPA, DCPA = calc_CPA(self.lat, self.lon, other.lat, other.lon, self.sog, other.sog, self.cog, other.cog)
-        self.TCPA = TCPA
-        self.DCPA = DCPA
-        return TCPA, DCPA
-
-
-class MakeTShip:
-    def __init__(self, oship, cond): # relbrg_min, relbrg_max, dist_min, dist_max, sog_min, sog_max):
-        self.oship = oship
-        relbrg_min = cond['relbrg_min']
-        relbrg_max = cond['relbrg_max']
-        dist_min = cond['dist_min']
-        dist_max = cond['dist_max']
-        sog_min = cond['sog_min']
-        sog_max = cond['sog_max']
-        self.relbrg_min = relbrg_min
-        self.relbrg_max = relbrg_max
-        self.dist_min = dist_min
-        self.dist_max = dist_max
-        self.sog_min = sog_min
-        self.sog_max = sog_max
-        step = round((relbrg_max*10 - relbrg_min*10) // 10)
-        # 处理step为0的情况
-        if step == 0:
-            step = 1
-        self.relbrg_list = [val*0.1 for val in range(round(relbrg_min*10), round(relbrg_max*10)+step, step)]
-        step = round((dist_max*10 - dist_min*10) // 10)
-        # 处理step为0的情况
-        if step == 0:
-            step = 1
-        self.dist_list = [val*0.1 for val in range(round(dist_min*10), round(dist_max*10)+step, step)]
-        step = round((sog_max*10 - sog_min*10) // 10)
-        # 处理step为0的情况
-        if step == 0:
-            step = 1
-        self.sog_list = [val*0.1 for val in range(round(sog_min*10), round(sog_max*10)+step, step)]
-
-        # self.relbrg_list = [val*0.5 for val in range(round(relbrg_min*10)//5, round(relbrg_max*10)//5+1)]
-        # self.dist_list = [val*0.5 for val in range(round(dist_min*10)//5, round(dist_max*10)//5+1)]
-        # self.sog_list = [val*0.5 for val in range(round(sog_min*10)//5, round(sog_max*10)//5+1)]
-        random.shuffle(self.relbrg_list)
-        random.shuffle(self.dist_list)
-        random.shuffle(self.sog_list)
-        self.relbrg_list = self.relbrg_list[:3]
-        self.dist_list = self.dist_list[:3]
-        self.sog_list = self.sog_list[:3]
-        # self.relbrg_list = self.relbrg_list[:min(len(self.relbrg_list)//2, 20)]
-        # self.dist_list = self.dist_list[:len(self.dist_list)//2]
-        # self.sog_list = self.sog_list[:len(self.sog_list)//2]
-
-    def get(self):
-        for relbrg in self.relbrg_list:
-            for dist in self.dist_list:
-                for sog in self.sog_list:
-                    yield relbrg, dist, sog
-
-    def get_arg(self, ot, is_first):
-        for relbrg, dist, sog in self.get():
-            targ = make_tship_arg_detail(self.oship, relbrg, dist, sog)
-            if not targ['danger'] and ot == 2:
-                continue
-            if not targ['danger'] and ot == 3 and is_first == True:
-                continue
-            if not targ['nodanger'] and ot == 1:
-                continue
-            dangers = targ['danger']
-            nodangers = targ['nodanger']
-            delta_list = []
-            # 至少一条危险目标船时,ot==3
-            # 第一条目标船必定时危险,(ot==2 and idx==0)
-            if ot == 1:
-                for nodanger in nodangers:
-                    delta_list.extend(range(nodanger[0], nodanger[1]+1))
-            elif ot == 2 or (ot == 3 and is_first == True):
-                for danger in dangers:
-                    delta_list.extend(range(danger[0], danger[1]+1))
-            else:
-                for danger in dangers:
-                    delta_list.extend(range(danger[0], danger[1]+1))
-                for nodanger in nodangers:
-                    delta_list.extend(range(nodanger[0], nodanger[1]+1))
-            random.shuffle(delta_list)
-            self.arg = targ
-            self.delta_list = delta_list
-            for delta in delta_list:
-                yield targ, delta
-
-
-def make_tship_detail(oship, tships_condition, ot, tt):
-    mtship_list = [MakeTShip(oship, cond) for cond in tships_condition]
-    mtship_dict = {i: mtship for i, mtship in enumerate(mtship_list)}
-    mtship0 = mtship_dict[0]
-    mtship1 = mtship_dict.get(1, None)
-    mtship2 = mtship_dict.get(2, None)
-    mtship3 = mtship_dict.get(3, None)
-    for targ0, delta0 in mtship0.get_arg(ot, True):
-        tship0 = make_tship_by_arg(targ0, delta0)
-        if not mtship1:
-            tships = [tship0]
-            return tships
-        for targ1, delta1 in mtship1.get_arg(ot, False):
-            tship1 = make_tship_by_arg(targ1, delta1)
-            if not mtship2:
-                tships = [tship0, tship1]
-                if make_tship_check_tt(tships, tt):
-                    return tships
-                continue
-            for targ2, delta2 in mtship2.get_arg(ot, False):
-                tship2 = make_tship_by_arg(targ2, delta2)
-                if not mtship3:
-                    tships = [tship0, tship1, tship2]
-                    if make_tship_check_tt(tships, tt):
-                        return tships
-                    continue
-                for targ3, delta3 in mtship3.get_arg(ot, False):
-                    tship3 = make_tship_by_arg(targ3, delta3)
-                    tships = [tship0, tship1, tship2, tship3]
-                    if make_tship_check_tt(tships, tt):
-                        return tships
-    return []
-
-
-def gen_situation2(args):
-    lat = args['lat']
-    lon = args['lon']
-    target_num = args['target_num']
-    osog_min = args['osog_min']
-    osog_max = args['osog_max']
-    tsog_min = args['tsog_min']
-    tsog_max = args['tsog_max']
-    dists = args['dist']
-    rel_brgs = args['rel_brg']
-    Slist = args['S']
-
-    oship = gen_oship(lat, lon, osog_min, osog_max)
-    d_tsog = (tsog_max-tsog_min)/target_num
-
-    tships = []
-    for i in range(target_num):
-        dist_min = dists[i][0]
-        dist_max = dists[i][1]
-        rel_brg_min = rel_brgs[i][0]
-        rel_brg_max = rel_brgs[i][1]
-        if rel_brg_max < rel_brg_min:
-            rel_brg_max += 360
-        now_tsog_min = tsog_max-d_tsog*(i+1)
-        now_tsog_max = tsog_max-d_tsog*i
-        count = 0
-        cnt = True
-        S = Slist[i]
-        while cnt:
-            count += 1
-            if count >= 10:
-                # 随机次数太多次了
-                # print('STEP')
-                return None
-            else:
-                if S[0] != 4:
-                    tship = gen_tship_check(
-                        oship, tships, rel_brg_min, rel_brg_max,
-                        dist_min, dist_max, now_tsog_min, now_tsog_max)
-                else:
-                    tship = gen_tship_check_no_danger(
-                        oship, tships, rel_brg_min, rel_brg_max,
-                        dist_min, dist_max, now_tsog_min, now_tsog_max)
-            if tship:
-                tships.append(tship)
-                break
-    print(tships)
-    return tships
-
-
-def gen_situation3(args):
-    lat = args['lat']
-    lon = args['lon']
-    target_num = args['target_num']
-    osog_min = args['osog_min']
-    osog_max = args['osog_max']
-    tsog_min = args['tsog_min']
-    tsog_max = args['tsog_max']
-    dists = args['dist']
-    rel_brgs = args['rel_brg']
-    ot = args.get('ot', 2)
-    tt = args.get('tt', 4)
-    # Slist = args['S']
-
-    oship = gen_oship(lat, lon, osog_min, osog_max)
-    d_tsog = (tsog_max-tsog_min)/target_num
-
-    cond_list = []
-    for i in range(target_num):
-        dist_min = dists[i][0]
-        dist_max = dists[i][1]
-        rel_brg_min = rel_brgs[i][0]
-        rel_brg_max = rel_brgs[i][1]
-        if rel_brg_max < rel_brg_min:
-            rel_brg_max += 360
-        now_tsog_min = tsog_max-d_tsog*(i+1)
-        now_tsog_max = tsog_max-d_tsog*i
-        cond_list.append({
-            'relbrg_min': rel_brg_min,
-            'relbrg_max': rel_brg_max,
-            'dist_min': dist_min,
-            'dist_max': dist_max,
-            'sog_min': now_tsog_min,
-            'sog_max': now_tsog_max
-        })
-    tships = make_tship_detail(oship, cond_list, ot, tt)
-    print(tships)
-    return tships
-
-
-def find_m(id):
-    for obj in meeting_situation_table:
-        if obj['id'] == id:
-            return obj
-    return None
+init_config('config.json')
 
 
 def save_to_csv(filepath, scene):
-    headers = [
-        'VSOMT',
-        'visibility',
-        'stage',
-        'ownship_behavior',
-        'meeting_situation',
-        'target_behavior',
-        'ownship_lat(dmm)',
-        'ownship_lon(dmm)',
-        'ownship_lat(ddd)',
-        'ownship_lon(ddd)',
-        'target_lat(dmm)',
-        'target_lon(dmm)',
-        'target_lat(ddd)',
-        'target_lon(ddd)',
-        'ownship_sog(KN)',
-        'ownship_cog(deg)',
-        'target_sog(KN)',
-        'target_cog(deg)',
-        'distance(NM)',
-        'relative_bearing(deg)',
-        'DCPA(KN)',
-        'TCPA(min)',
-    ]
-
-    lines = []
-    for i, tgt in enumerate(scene['target']):
-        field_list = []
-        # VSOMT = '%d%d%d%d%d' % (
-        #     scene['V'][0], scene['S'][i][0], scene['O'][i][0],
-        #     scene['M'][i][0], scene['T'][i][0])
-        VSOMT = ''.join(
-            [str(c) for c in
-             [scene['V'][0], scene['S'][i][0], scene['O'][i][0],
-              scene['M'][i][0], scene['T'][i][0]]])
-        field_list.append(VSOMT)
-        field_list.append(str(scene['V'][1]))
-        field_list.append(str(scene['S'][i][1]))
-        field_list.append(str(scene['O'][i][1]))
-        field_list.append(str(scene['M'][i][1]))
-        field_list.append(str(scene['T'][i][1]))
-        field_list.append(str(to_dmm(tgt['olat'])))
-        field_list.append(str(to_dmm(tgt['olon'])))
-        field_list.append(str(tgt['olat']))
-        field_list.append(str(tgt['olon']))
-        field_list.append(str(to_dmm(tgt['tlat'])))
-        field_list.append(str(to_dmm(tgt['tlon'])))
-        field_list.append(str(tgt['tlat']))
-        field_list.append(str(tgt['tlon']))
-        field_list.append(str(tgt['osog']))
-        field_list.append(str(tgt['ocog']))
-        field_list.append(str(tgt['tsog']))
-        field_list.append(str(tgt['tcog']))
-        field_list.append(str(tgt['dist']))
-
-        # 提取相对方位的纯数值部分，移除括号内的注释
-        rel_brg_str = str(tgt['relbrg'])
-        # 使用正则表达式提取数字部分
-        import re
-        rel_brg_clean = re.search(r'(\d+\.?\d*)', rel_brg_str).group(1)
-        field_list.append(rel_brg_clean)
-
-        field_list.append(str(tgt['DCPA']))
-        field_list.append(str(tgt['TCPA']))
-        lines.append(','.join(field_list))
-
-    # 修改：使用UTF-8编码并添加BOM头
-    with open(filepath, 'w', encoding='utf-8-sig') as f:
-        f.write(','.join(headers))
-        f.write('\n')
-        for line in lines:
-            f.write(line)
-            f.write('\n')
+    save_main_csv(filepath, [scene])
 
 
 def save_to_sce(filepath, scene, envinfo):
     with open(filepath, 'w') as f:
-        f.write('env,%s,%.1f,%03d,%.1f,%03d,%.1f,%03d,%d,\n' %
-                (scene['name'], envinfo['wind_speed'], envinfo['wind_dir'],
-                 envinfo['current_speed'], envinfo['current_dir'],
-                 envinfo['wave_height'], envinfo['wave_dir'],
-                 envinfo['rain_snow']))
-
-        tgt_list = scene['target']
-        tgt0 = tgt_list[0]
-        f.write("AIS,111111111,-2,%.8f,%.8f,%.1f,%.1f,0,\n" %
-                (tgt0['olon'], tgt0['olat'], tgt0['ocog'], tgt0['osog']))
-
-        for i, tgt in enumerate(tgt_list):
-            mmsi = 0
-            for j in range(9):
-                mmsi += pow(10.0, j) * (i + 2)
-            f.write("AIS,%d,-1,%.8f,%.8f,%.1f,%.1f,0,\n" %
-                    (mmsi, tgt['tlon'], tgt['tlat'], tgt['tcog'], tgt['tsog']))
+        f.write(sce_text(scene, envinfo))
 
 
 def save_to_xml(filepath, scene):
-    doc = xml.dom.minidom.Document()
-    root = doc.createElement('autocollison')
-
-    def create_text(pnode, name, value):
-        node = doc.createElement(name)
-        node.appendChild(doc.createTextNode(str(value)))
-        pnode.appendChild(node)
-
-    def fmt2d(d):
-        return '%.2f' % d
-
-    for i, tgt in enumerate(scene['target']):
-        tgtnode = doc.createElement('target')
-        # VSOMT = '%d%d%d%d%d' % (
-        #     scene['V'][0], scene['S'][i][0], scene['O'][i][0],
-        #     scene['M'][i][0], scene['T'][i][0])
-        VSOMT = ''.join(
-            [str(c) for c in
-             [scene['V'][0], scene['S'][i][0], scene['O'][i][0],
-              scene['M'][i][0], scene['T'][i][0]]])
-        create_text(tgtnode, 'VSOMT', VSOMT)
-        create_text(tgtnode, 'visibility', scene['V'][1])
-        create_text(tgtnode, 'stage', scene['S'][i][1])
-        create_text(tgtnode, 'ownship_behavior', scene['O'][i][1])
-        create_text(tgtnode, 'meeting_situation', scene['M'][i][1])
-        create_text(tgtnode, 'target_behavior', scene['T'][i][1])
-
-        create_text(tgtnode, 'ownship_lat', tgt['olat'])
-        create_text(tgtnode, 'ownship_lon', tgt['olon'])
-        create_text(tgtnode, 'ownship_lat_raw', to_dmm(tgt['olat']))
-        create_text(tgtnode, 'ownship_lon_raw', to_dmm(tgt['olon']))
-        create_text(tgtnode, 'target_lat', tgt['tlat'])
-        create_text(tgtnode, 'target_lon', tgt['tlon'])
-        create_text(tgtnode, 'target_lat_raw', to_dmm(tgt['tlat']))
-        create_text(tgtnode, 'target_lon_raw', to_dmm(tgt['tlon']))
-
-        create_text(tgtnode, 'ownship_sog', fmt2d(tgt['osog']))
-        create_text(tgtnode, 'ownship_cog', fmt2d(tgt['ocog']))
-        create_text(tgtnode, 'target_sog', fmt2d(tgt['tsog']))
-        create_text(tgtnode, 'target_cog', fmt2d(tgt['tcog']))
-
-        create_text(tgtnode, 'distance', fmt2d(tgt['dist']))
-        create_text(tgtnode, 'relative_bearing', fmt2d(tgt['relbrg']))
-
-        create_text(tgtnode, 'DCPA', fmt2d(tgt['DCPA']))
-        create_text(tgtnode, 'TCPA', fmt2d(tgt['TCPA']))
-        root.appendChild(tgtnode)
-
-    doc.appendChild(root)
-
-    with open(filepath, 'w', encoding='utf8') as f:
-        doc.writexml(f, addindent='\t', newl='\n', encoding='utf8')
+    save_main_xml(filepath, [scene])
 
 def save_to_nto(filepath, scene):
-    nto = {}
-    nto['general'] = {'area': 'Open Sea'}
-
-    ship_name = 'Bulk carrier 2 (Dis.76800t) bl.'
-    tgt_list = scene['target']
-    tgt0 = tgt_list[0]
-    obj_list = []
-    own_obj = {
-        'key': ship_name,
-        'name': 'OS 1',
-        'pos': {
-            'lat': tgt0['olat'],
-            'lon': tgt0['olon'],
-            'heading': tgt0['ocog']
-        },
-        'initial_speed': {
-            'longitudinal': tgt0['osog'] * 1852 / 3600,
-            'lateral': 0.0
-        },
-        'mode': 'own'
-    }
-    obj_list.append(own_obj)
-
-    for i, tgt in enumerate(tgt_list):
-        tgt_obj = {
-            'key': ship_name,
-            'name': 'Tgt %d' % (i+1),
-            'pos': {
-                'lat': tgt['tlat'],
-                'lon': tgt['tlon'],
-                'heading': tgt['tcog']
-            },
-            'initial_speed': {
-                'longitudinal': tgt['tsog'] * 1852 / 3600,
-                'lateral': 0.0
-            },
-            'mode': '3dof'
-        }
-        obj_list.append(tgt_obj)
-
-    nto['objects'] = obj_list
-    json.dump(nto, open(filepath, 'w', encoding='utf8'), indent='\t')
+    with open(filepath, 'w', encoding='utf8') as f:
+        f.write(nto_text(scene))
 
 
 def deg_to_screen(v):
     return mod360(v+270)
 
 
-def to_dmm(ddd):
-    d = int(ddd)
-    m = (ddd-d)*60.0
-    return '%d°%.3f′' % (d, m)
-
-
 def init_VSOMT_table(tb, headers, datas):
     tb.clear()
     tb.setColumnCount(len(headers))
@@ -1903,6 +745,7 @@ class MainWindow(QMainWindow):
         self.pushButtonExportCSV.clicked.connect(self.on_export_csv)
         self.pushButtonExportSCE.clicked.connect(self.on_export_sce)
         self.pushButtonExportNTO.clicked.connect(self.on_export_nto)
+        self.pushButtonExportAll.clicked.connect(self.on_export_all)
         self.pushButtonViewScene.clicked.connect(self.on_view)
         self.pushButtonCreateScene.clicked.connect(self.on_create)
         self.pushButtonGenScene.clicked.connect(self.on_gen)
@@ -1923,6 +766,7 @@ class MainWindow(QMainWindow):
         self.comboBoxTT.setCurrentIndex(3)
 
         self.scenes = []
+        self.export_worker = None
         # test
         test_scene = {
             'name': 'unname_001',
@@ -2089,7 +933,10 @@ class MainWindow(QMainWindow):
         tgt_list = gen_situation3(scene)
         if not tgt_list:
             scene['ok'] = False
-            QMessageBox.information(self, '提示', '生成失败')
+            msg = '生成失败'
+            if isinstance(tgt_list, GenFailure):
+                msg += ': %s' % tgt_list
+            QMessageBox.information(self, '提示', msg)
             return
 
         # while True:
@@ -2116,8 +963,8 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, '提示', '请先选择一种场景')
             return
 
-        if scene['target_num'] >= 4:
-            QMessageBox.warning(self, '提示', '目标船数量已达到4!')
+        if scene['target_num'] >= MAX_TARGET_NUM:
+            QMessageBox.warning(self, '提示', '目标船数量已达到%d!' % MAX_TARGET_NUM)
             return
 
         dlg = TargetDialog(scene, self)
@@ -2282,6 +1129,62 @@ class MainWindow(QMainWindow):
             self, '输入文件名', '.', 'NTO File(*.nto)')
         save_to_nto(filename[0], scene)
 
+    def on_export_all(self):
+        # on_gen会把已在列表中的场景再添加一次, 同一个场景只导出一次
+        scenes = []
+        for scene in self.scenes:
+            if scene['ok'] and scene['target_num'] > 0 and \
+                    not any(s is scene for s in scenes):
+                scenes.append(scene)
+        if not scenes:
+            QMessageBox.warning(self, '提示', '没有已生成的场景')
+            return
+
+        dlg = BatchExportDlg(self)
+        rcode = dlg.exec()
+        if rcode != QDialog.Accepted:
+            return
+
+        # 环境信息只输入一次, 用于全部SCE文件
+        envinfo = None
+        if 'sce' in dlg.formats:
+            env_dlg = SCEEnvInfoDlg(self)
+            rcode = env_dlg.exec()
+            if rcode != QDialog.Accepted:
+                return
+            envinfo = env_dlg.info
+
+        self.pushButtonExportAll.setEnabled(False)
+        self.export_progress = QProgressDialog(
+            '正在导出场景...', '取消', 0, len(scenes), self)
+        self.export_progress.setWindowModality(Qt.WindowModal)
+        self.export_progress.setMinimumDuration(0)
+
+        self.export_worker = ExportWorker(
+            dlg.path, scenes, dlg.formats, envinfo, dlg.as_zip, self)
+        self.export_progress.canceled.connect(self.export_worker.cancel)
+        self.export_worker.progress.connect(self.on_export_progress)
+        self.export_worker.error.connect(
+            lambda msg: QMessageBox.critical(self, '错误', msg))
+        self.export_worker.finished.connect(self.on_export_finished)
+        self.export_worker.start()
+
+    def on_export_progress(self, done, total):
+        if self.export_worker is None:
+            return
+        self.export_progress.setValue(done)
+
+    def on_export_finished(self):
+        worker = self.export_worker
+        self.export_worker = None
+        worker.deleteLater()
+        self.export_progress.canceled.disconnect(worker.cancel)
+        self.export_progress.close()
+        self.pushButtonExportAll.setEnabled(True)
+        if not worker.canceled and not worker.failed:
+            QMessageBox.information(
+                self, '提示', '已导出%d个场景到%s' % (worker.done, worker.target))
+
     def on_view(self):
         scene = self.get_selected_scene()
         if not scene:
@@ -2296,71 +1199,50 @@ class MainWindow(QMainWindow):
         view.show()
 
 
-def unhandler_hook(t, val, tb):
-    logging.warning(traceback.print_exception(t, val, tb))
+class ExportWorker(QThread):
+    """
+    后台批量导出场景的线程, 见scenario_io.export_scenes
+
+    cancel()后在导出完当前场景时停止, 导出zip时不会留下不完整的文件
+    """
 
+    progress = pyqtSignal(int, int)
+    error = pyqtSignal(str)
+
+    def __init__(self, target, scenes, formats, envinfo=None, as_zip=False, parent=None):
+        super().__init__(parent)
+        self.target = target
+        self.scenes = scenes
+        self.formats = formats
+        self.envinfo = envinfo
+        self.as_zip = as_zip
+        self.done = 0
+        self.canceled = False
+        self.failed = False
+
+    def cancel(self):
+        self.canceled = True
+        self.requestInterruption()
+
+    def run(self):
+        results = export_scenes(self.target, self.scenes, self.formats,
+                                self.envinfo, self.as_zip)
+        try:
+            for done in results:
+                self.done = done
+                self.progress.emit(done, len(self.scenes))
+                if self.isInterruptionRequested():
+                    break
+        except Exception as e:
+            self.failed = True
+            logging.exception('batch export failed')
+            self.error.emit('导出失败: %s' % e)
+        finally:
+            results.close()
 
-def read_csv(filename):
-    title = []
-    datas = []
-    try:
-        f = open(filename, 'r')
-        text = f.read()
-        f.close()
-        lines = text.split('\n')
-        title = lines[0].split(',')
-        lines = lines[1:]
-        for line in lines:
-            if line:
-                datas.append(line.split(','))
-    except:
-        pass
-
-    return title, datas
-
-
-def init_csv_data():
-    global visibility_list
-    global stage_list
-    global ownship_behavior_list
-    global meeting_situation_list
-    global target_behavior_list
-    global speed_list
-
-    filename = './data/visibility.csv'
-    title, datas = read_csv(filename)
-    if datas:
-        visibility_list = [(int(d[0]), d[1]) for d in datas]
-
-    filename = './data/stage.csv'
-    title, datas = read_csv(filename)
-    if datas:
-        stage_list = [(int(d[0]), d[1], float(d[2]), float(d[3]))
-                      for d in datas]
-
-    filename = './data/ownship_behavior.csv'
-    title, datas = read_csv(filename)
-    if datas:
-        ownship_behavior_list = [(int(d[0]), d[1]) for d in datas]
-
-    filename = './data/meeting_situation.csv'
-    title, datas = read_csv(filename)
-    if datas:
-        meeting_situation_list = [(int(d[0]), d[1],
-                                   (float(d[2]), float(d[3])),
-                                   (float(d[4]), float(d[5])), int(d[6]))
-                                  for d in datas]
-
-    filename = './data/target_behavior.csv'
-    title, datas = read_csv(filename)
-    if datas:
-        target_behavior_list = [(int(d[0]), d[1])for d in datas]
-
-    filename = './data/speed.csv'
-    title, datas = read_csv(filename)
-    if datas:
-        speed_list = [(int(d[0]), d[1], float(d[2]), float(d[3])) for d in datas]
 
+def unhandler_hook(t, val, tb):
+    logging.warning(traceback.print_exception(t, val, tb))
 
 class SCEEnvInfoDlg(QDialog):
 
@@ -2393,6 +1275,50 @@ class SCEEnvInfoDlg(QDialog):
         self.reject()
 
 
+class BatchExportDlg(QDialog):
+
+    def __init__(self, parent=None):
+        super().__init__()
+        loadUi("./data/ui/batchexportdlg.ui", self)
+        self.pushButtonBrowse.clicked.connect(self.on_browse)
+        self.pushButtonOK.clicked.connect(self.on_ok)
+        self.pushButtonCancel.clicked.connect(self.on_cancel)
+
+    def on_browse(self):
+        if self.checkBoxZip.isChecked():
+            filename = QFileDialog.getSaveFileName(
+                self, '输入文件名', '.', 'ZIP File(*.zip)')[0]
+        else:
+            filename = QFileDialog.getExistingDirectory(self, '选择目录', '.')
+        if filename:
+            self.lineEditPath.setText(filename)
+
+    def on_ok(self):
+        checks = {
+            'csv': self.checkBoxCSV,
+            'xml': self.checkBoxXML,
+            'sce': self.checkBoxSCE,
+            'nto': self.checkBoxNTO,
+        }
+        formats = [fmt for fmt in SCENE_FORMATS if checks[fmt].isChecked()]
+        if not formats:
+            QMessageBox.warning(self, '提示', '请至少选择一种格式')
+            return
+        path = self.lineEditPath.text().strip()
+        if not path:
+            QMessageBox.warning(self, '提示', '请选择保存位置')
+            return
+        self.as_zip = self.checkBoxZip.isChecked()
+        if self.as_zip and not path.lower().endswith('.zip'):
+            path += '.zip'
+        self.formats = formats
+        self.path = path
+        self.accept()
+
+    def on_cancel(self):
+        self.reject()
+
+
 t, d = calc_CPA(30.89484334577408, 122.90946683827808, 30.960132311570135, 122.94083760311402, 18, 10.5, 38.2, 199.5)
 
 
@@ -0,0 +1,1239 @@
+"""
+船舶会遇场景生成核心算法
+
+包含CPA/相对运动计算、gen_*/make_tship*生成函数和会遇类型表,
+不依赖PyQt5, 导入时不读取任何文件, 可以在没有显示环境的批处理服务器上使用.
+需要配置文件时调用 init_config() / init_csv_data().
+"""
+
+import hashlib
+import json
+import math
+import random
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+import georef
+from feasibility import danger_table
+from intervals import IntervalSet
+
+SAFE_TCPA = 30.0
+SAFE_DCPA = 2.0
+TT_DCPA = 1.0
+# 一个场景中目标船的最大数量
+MAX_TARGET_NUM = 15
+# 目标船搜索的时间(秒)和尝试次数限制
+SEARCH_TIMEOUT = 10.0
+SEARCH_MAX_ATTEMPTS = 200000
+
+
+def init_config(filename='config.json'):
+    global TT_DCPA, SEARCH_TIMEOUT, SEARCH_MAX_ATTEMPTS
+    with open(filename, 'r') as f:
+        conf = json.load(f)
+        TT_DCPA = conf.get('tt_DCPA', 1.0)
+        SEARCH_TIMEOUT = conf.get('search_timeout', SEARCH_TIMEOUT)
+        SEARCH_MAX_ATTEMPTS = conf.get('search_max_attempts', SEARCH_MAX_ATTEMPTS)
+
+
+class SearchBudget:
+    """
+    目标船搜索的时间和次数限制, timeout为秒数, max_attempts为尝试次数, None表示不限制
+    make_tship等函数不指定budget时使用SEARCH_TIMEOUT和SEARCH_MAX_ATTEMPTS
+    """
+
+    def __init__(self, timeout=None, max_attempts=None):
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self.max_attempts = max_attempts
+        self.attempts = 0
+        self.reason = None
+
+    def spend(self):
+        """记录一次尝试, 超出限制时返回False"""
+        self.attempts += 1
+        if self.max_attempts is not None and self.attempts > self.max_attempts:
+            self.reason = 'max_attempts'
+            return False
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.reason = 'timeout'
+            return False
+        return True
+
+    def failure(self, constraint=None, index=None):
+        return GenFailure(self.reason, constraint, index)
+
+
+def default_budget(budget=None):
+    if budget is None:
+        budget = SearchBudget(SEARCH_TIMEOUT, SEARCH_MAX_ATTEMPTS)
+    return budget
+
+
+class GenFailure(list):
+    """
+    生成失败的结果, 是一个空列表, 与原来返回[]时的用法兼容
+
+    reason: 'infeasible'(条件不可能满足),
+            'exhausted'(抽取的目标船参数下delta的每个1度候选格都已尝试,
+                        不表示整个条件范围内都没有解),
+            'timeout'或'max_attempts'(超出SearchBudget的限制)
+    constraint: 不能满足的条件, 'ot', 'tt'或'dist'(目标船之间距离太近)
+    index: 不能满足条件的目标船序号(从0开始)
+    """
+
+    REASON_TEXT = {
+        'infeasible': '条件不可能满足',
+        'exhausted': '在抽取的候选中没有找到满足条件的组合',
+        'timeout': '超过时间限制',
+        'max_attempts': '超过尝试次数限制',
+    }
+    CONSTRAINT_TEXT = {
+        'ot': '本船与目标船的危险关系',
+        'tt': '目标船之间的危险关系',
+        'dist': '目标船之间的距离',
+    }
+
+    def __init__(self, reason, constraint=None, index=None):
+        super().__init__()
+        self.reason = reason
+        self.constraint = constraint
+        self.index = index
+
+    def __repr__(self):
+        return 'GenFailure(%r, %r, %r)' % (self.reason, self.constraint, self.index)
+
+    def __str__(self):
+        text = self.REASON_TEXT.get(self.reason, str(self.reason))
+        if self.constraint:
+            text += ': ' + self.CONSTRAINT_TEXT.get(self.constraint, self.constraint)
+        if self.index is not None:
+            text += ' (第%d条目标船)' % (self.index + 1)
+        return text
+
+
+speed_list = [
+    (1, '海上全速', 16.6, 17.6),
+    (2, '全速', 13.2, 14.5),
+    (3, '半速', 10.9, 12.2),
+    (4, '慢速', 8.9, 10),
+    (5, '微速', 5.7, 6.4),
+]
+
+visibility_list = [
+    (1, '不良'),
+    (2, '良好'),
+]
+
+stage_list = [
+    # 8,14海里
+    (1, '碰撞危险', 8, 14),
+    # 2-3海里
+    (2, '紧迫局面', 2, 3),
+    # 1-2海里
+    (3, '紧迫危险', 1, 2),
+    (4, '没有危险', 1, 14),
+]
+
+ownship_behavior_list = [
+    (1, '直航船'),
+    (2, '让路船'),
+]
+
+meeting_situation_list = [
+    (1, '对遇', (356, 6), (8, 14), 1),
+    (2, '右舷小角度交叉会遇', (6, 67.5), (8, 14), 1),
+    (3, '右舷大角度交叉会遇', (67.5, 112.5), (8, 14), 1),
+    (4, '左舷追越', (180, 247.5), (4, 7), 1),
+    (5, '右舷追越', (112.5, 180), (4, 7), 1),
+    (6, '左舷小角度交叉会遇', (247.5, 292.5), (8, 14), 2),
+    (7, '左舷大角度交叉会遇', (292.5, 354), (8, 14), 2),
+    (8, '左舷被追越', (112.5, 180), (4, 7), 2),  # 原始方位为 Bt，需改为 Bo
+    (9, '右舷被追越', (180, 247.5), (4, 7), 2),  # 原始方位为 Bt，需改为 Bo
+    (10, '正后被追越', (180, 180), (4, 7), 2),   # 原始方位为 Bt，需改为 Bo
+]
+
+target_behavior_list = [
+    (1, '协调避让'),
+    (2, '不协调避让'),
+]
+
+meeting_situation_table = [
+    {
+        'name': '对遇',
+        'id': 1,
+        'deg': (354, 6),
+        'dist': (8, 14),
+        'plan': '向右转向',
+    },
+    {
+        'name': '右舷小角度交叉会遇',
+        'id': 2,
+        'deg': (6, 67.5),
+        'dist': (8, 14),
+        'plan': '向右转向',
+    },
+    {
+        'name': '右舷大角度交叉会遇',
+        'id': 3,
+        'deg': (67.5, 112.5),
+        'dist': (8, 14),
+        'plan': '向右转向',
+    },
+    {
+        'name': '左舷追越',
+        'id': 4,
+        'deg': (180, 247.5),
+        'dist': (4, 7),
+        'plan': '左/右让',
+    },
+    {
+        'name': '右舷追越',
+        'id': 5,
+        'deg': (112.5, 180),
+        'dist': (4, 7),
+        'plan': '左/右让',
+    },
+    {
+        'name': '左舷小角度交叉会遇',
+        'id': 6,
+        'deg': (247.5, 292.5),
+        'dist': (8, 14),
+        'plan': '直航',
+    },
+    {
+        'name': '左舷大角度交叉会遇',
+        'id': 7,
+        'deg': (292.5, 354),
+        'dist': (8, 14),
+        'plan': '直航',
+    },
+    {
+        'name': '左舷被追越',
+        'id': 8,
+        'deg': (112.5, 180),
+        'dist': (4, 7),
+        'plan': '左/右让',
+    },
+    {
+        'name': '右舷被追越',
+        'id': 9,
+        'deg': (180, 247.5),
+        'dist': (4, 7),
+        'plan': '左/右让',
+},
+]
+
+def get_rel_course_north(v_x_o, v_y_o, v_x_t, v_y_t):
+    dvx = v_x_t - v_x_o
+    dvy = v_y_t - v_y_o
+    course = math.degrees(math.atan2(dvx, dvy))
+    if course < 0.0:
+        course += 360.0
+
+    return course
+
+
+def calc_rel_spd_cog(osog, ocog, tsog, tcog):
+    # 正北分解速度的x和y
+    v_x_o = osog * math.sin(math.radians(ocog))
+    v_y_o = osog * math.cos(math.radians(ocog))
+    v_x_t = tsog * math.sin(math.radians(tcog))
+    v_y_t = tsog * math.cos(math.radians(tcog))
+
+    # 计算相对本船的速度
+    v_x_rel = v_x_t - v_x_o
+    v_y_rel = v_y_t - v_y_o
+    rel_spd = math.sqrt(v_x_rel*v_x_rel + v_y_rel*v_y_rel)
+
+    # 得到相对本船的相对速度方向
+    rel_course = get_rel_course_north(v_x_o, v_y_o, v_x_t, v_y_t)
+    return rel_spd, rel_course
+
+def calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog):
+    # 计算2个位置的相对距离和相对方位
+    # 得到的结果是(tlat, tlon)点在(olat, olon)的brg方位上
+    dist, brg = georef.DistanceBearingMercator(tlat, tlon, olat, olon)
+
+    # 正北分解速度的x和y
+    v_x_o = osog * math.sin(math.radians(ocog))
+    v_y_o = osog * math.cos(math.radians(ocog))
+    v_x_t = tsog * math.sin(math.radians(tcog))
+    v_y_t = tsog * math.cos(math.radians(tcog))
+
+    # 计算相对本船的速度
+    v_x_rel = v_x_t - v_x_o
+    v_y_rel = v_y_t - v_y_o
+    rel_spd = math.sqrt(v_x_rel*v_x_rel + v_y_rel*v_y_rel)
+
+    # 得到相对本船的相对速度方向
+    rel_course = get_rel_course_north(v_x_o, v_y_o, v_x_t, v_y_t)
+
+    # ???
+    delta = rel_course - brg - 180.0
+    # if delta < 0.0:
+    #     delta = delta + 360.0
+    # if delta > 180.0:
+    #     delta = delta - 180.0
+    TCPA = 99999.0
+    if rel_spd > 0.001:
+        TCPA = dist * math.cos(math.radians(delta)) / rel_spd * 60.0
+
+    DCPA = abs(dist * math.sin(math.radians(delta)))
+
+    return TCPA, DCPA
+
+def calc_CPA_array(olat, olon, tlat, tlon, osog, tsog, ocog, tcog):
+    # calc_CPA的数组版本, 参数按numpy规则广播, 逐元素结果与calc_CPA一致
+    dist, brg = georef.DistanceBearingMercator_array(tlat, tlon, olat, olon)
+    return _calc_CPA_by_dist_brg(dist, brg, osog, tsog, ocog, tcog)
+
+
+def calc_CPA_matrix(lats, lons, sogs, cogs):
+    # 一次计算场景中所有船舶两两之间的TCPA和DCPA
+    # 通常第0个为本船, 其余为目标船
+    # 结果[i, j]等于calc_CPA(以i为本船, j为目标船)
+    # 对角线上相对速度为0, TCPA为99999.0
+    lats = np.asarray(lats, dtype=float).ravel()
+    lons = np.asarray(lons, dtype=float).ravel()
+    sogs = np.asarray(sogs, dtype=float).ravel()
+    cogs = np.asarray(cogs, dtype=float).ravel()
+    # calc_CPA中距离方位是从目标船(tlat, tlon)到本船计算的, 所以需要转置
+    dist, brg = georef.DistanceBearingMercatorMatrix(lats, lons)
+    return _calc_CPA_by_dist_brg(
+        dist.T, brg.T, sogs[:, None], sogs[None, :],
+        cogs[:, None], cogs[None, :])
+
+
+def calc_CPA_batch(lats, lons, sogs, cogs):
+    # calc_CPA_matrix的批量版本, 参数为(N, S)的数组(N个场景, 每个场景S条船),
+    # 结果为(N, S, S), [k, i, j]等于第k个场景中calc_CPA(以i为本船, j为目标船).
+    # 船数不足S的场景用NaN补齐, 对应的结果为NaN
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    sogs = np.asarray(sogs, dtype=float)
+    cogs = np.asarray(cogs, dtype=float)
+    # 每条船的墨卡托纵坐标只计算一次
+    ys = georef.mercator_y_array(lats)
+    dist, brg = georef.DistanceBearingMercator_y(
+        lats[:, None, :], lons[:, None, :], lats[:, :, None], lons[:, :, None],
+        ys[:, None, :], ys[:, :, None])
+    return _calc_CPA_by_dist_brg(
+        dist, brg, sogs[:, :, None], sogs[:, None, :],
+        cogs[:, :, None], cogs[:, None, :])
+
+
+def _calc_CPA_by_dist_brg(dist, brg, osog, tsog, ocog, tcog):
+    # 正北分解速度的x和y
+    ocog = np.radians(ocog)
+    tcog = np.radians(tcog)
+    v_x_rel = tsog * np.sin(tcog) - osog * np.sin(ocog)
+    v_y_rel = tsog * np.cos(tcog) - osog * np.cos(ocog)
+    rel_spd = np.sqrt(v_x_rel*v_x_rel + v_y_rel*v_y_rel)
+
+    # 得到相对本船的相对速度方向
+    rel_course = np.degrees(np.arctan2(v_x_rel, v_y_rel))
+    rel_course = np.where(rel_course < 0.0, rel_course + 360.0, rel_course)
+
+    delta = np.radians(rel_course - brg - 180.0)
+    moving = rel_spd > 0.001
+    TCPA = np.where(
+        moving, dist * np.cos(delta) / np.where(moving, rel_spd, 1.0) * 60.0,
+        99999.0)
+    DCPA = np.abs(dist * np.sin(delta))
+
+    return TCPA, DCPA
+
+
+def mod360(d):
+    v = math.fmod(d, 360)
+    if v < 0.0:
+        v += 360.0
+    return v
+
+
+def scenario_seed(master_seed, index):
+    # 由主种子和场景序号得到该场景的种子, 与生成顺序、进程数无关
+    digest = hashlib.sha256(('%s:%d' % (master_seed, index)).encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def make_rng(seed=None):
+    # seed为None时使用全局random模块
+    if seed is None:
+        return random
+    return random.Random(seed)
+
+
+def fmt2f(*v):
+    for i in v:
+        print('%.2f' % i)
+
+
+OSOG_MIN = 10.0
+OSOG_MAX = 20.0
+TSOG_MIN = 10.0
+TSOG_MAX = 20.0
+
+
+def gen_oship(lat, lon, sog_min, sog_max, rng=random):
+    sog = rng.randint(round(sog_min*10), round(sog_max*10))*0.1
+    cog = rng.randint(0, 3599)*0.1
+    return {
+        'lat': lat,
+        'lon': lon,
+        'sog': sog,
+        'cog': cog,
+    }
+
+
+def gen_tship(oship, relbrgMin, relbrgMax, distMin, distMax, sogMin, sogMax,
+              rng=random):
+    if relbrgMax < relbrgMin:
+        relbrgMax += 360
+    olat = oship['lat']
+    olon = oship['lon']
+    osog = oship['sog']
+    ocog = oship['cog']
+
+    dist = rng.randint(round(distMin*10), round(distMax*10))*0.1
+    relbrg = rng.randint(round(relbrgMin*10), round(relbrgMax*10))*0.1
+    relbrg = mod360(relbrg)
+    tsog = rng.randint(round(sogMin*10), round(sogMax*10))*0.1
+    tcog = mod360(ocog + relbrg + 180.0)
+
+    rel_spd, rel_cog = calc_rel_spd_cog(tsog, tcog, osog, ocog)
+
+    brg = rel_cog
+    tlat, tlon = georef.ll_gc_ll(olat, olon, brg, dist)
+    TCPA, DCPA = calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog)
+
+    rel_spd, rel_cog = calc_rel_spd_cog(osog, ocog, tsog, tcog)
+
+    return {
+        'olat': olat,
+        'olon': olon,
+        'tlat': tlat,
+        'tlon': tlon,
+        'osog': osog,
+        'ocog': ocog,
+        'tsog': tsog,
+        'tcog': tcog,
+        'dist': dist,
+        'brg': brg,
+        'relbrg': relbrg,
+        'rel_cog': rel_cog,
+        'rel_spd': rel_spd,
+        'TCPA': TCPA,
+        'DCPA': DCPA,
+    }
+
+
+def gen_tship_no_danger(oship, relbrgMin, relbrgMax,
+                        distMin, distMax, sogMin, sogMax, rng=random):
+    if relbrgMax < relbrgMin:
+        relbrgMax += 360
+    olat = oship['lat']
+    olon = oship['lon']
+    osog = oship['sog']
+    ocog = oship['cog']
+
+    dist = rng.randint(round(distMin*10), round(distMax*10))*0.1
+    relbrg = rng.randint(round(relbrgMin*10), round(relbrgMax*10))*0.1
+    relbrg = mod360(relbrg)
+    tsog = rng.randint(round(sogMin*10), round(sogMax*10))*0.1
+    tcog = mod360(ocog + relbrg + 180.0)
+
+    rel_spd, rel_cog = calc_rel_spd_cog(tsog, tcog, osog, ocog)
+
+    brg = mod360(rel_cog + rng.randint(150, 3450) * 0.1)
+    # brg = mod360(rel_cog + random.randint(135, 225))
+    tlat, tlon = georef.ll_gc_ll(olat, olon, brg, dist)
+    TCPA, DCPA = calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog)
+
+    if TCPA >= 0.0 and DCPA <= 2.0:
+        # 还有危险
+        # 直接使TCPA小于0
+        brg = mod360(rel_cog + 180)
+        tlat, tlon = georef.ll_gc_ll(olat, olon, brg, dist)
+        TCPA, DCPA = calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog)
+
+    rel_spd, rel_cog = calc_rel_spd_cog(osog, ocog, tsog, tcog)
+
+    return {
+        'olat': olat,
+        'olon': olon,
+        'tlat': tlat,
+        'tlon': tlon,
+        'osog': osog,
+        'ocog': ocog,
+        'tsog': tsog,
+        'tcog': tcog,
+        'dist': dist,
+        'brg': brg,
+        'relbrg': relbrg,
+        'rel_cog': rel_cog,
+        'rel_spd': rel_spd,
+        'TCPA': TCPA,
+        'DCPA': DCPA,
+    }
+
+
+def gen_tship_check(oship, tships, rel_brg_min, rel_brg_max,
+                    dist_min, dist_max, sog_min, sog_max, rng=random):
+    tship = gen_tship(oship, rel_brg_min, rel_brg_max,
+                      dist_min, dist_max, sog_min, sog_max, rng)
+    for t in tships:
+        TCPA, DCPA = calc_CPA(
+            tship['tlat'], tship['tlon'], t['tlat'], t['tlon'],
+            tship['tsog'], t['tsog'], tship['tcog'], t['tcog'])
+        if TCPA >= 0.0 and DCPA <= 2.0:
+            return None
+    return tship
+
+
+def gen_tship_check_no_danger(oship, tships, rel_brg_min, rel_brg_max,
+                              dist_min, dist_max, sog_min, sog_max,
+                              rng=random):
+    tship = gen_tship_no_danger(oship, rel_brg_min, rel_brg_max,
+                                dist_min, dist_max, sog_min, sog_max, rng)
+    for t in tships:
+        TCPA, DCPA = calc_CPA(
+            tship['tlat'], tship['tlon'], t['tlat'], t['tlon'],
+            tship['tsog'], t['tsog'], tship['tcog'], t['tcog'])
+        if TCPA >= 0.0 and DCPA <= 2.0:
+            return None
+    return tship
+
+
+def calc_delta_windows(dist, rel_spd, tcpa_max, dcpa_max):
+    """
+    计算目标船方位偏角delta的危险范围和非危险范围, 返回(danger, nodanger)两个IntervalSet
+
+    TCPA的计算公式:
+    delta = rel_course - brg - 180.0
+    TCPA = dist * math.cos(math.radians(delta)) / rel_spd * 60.0
+    delta = acos(TCPA/dist*rel_spd/60.0)
+    TCPA在[0, tcpa_max]内时delta在[cosdeg0, 90]
+    DCPA的计算公式:
+    DCPA = dist * math.sin(math.radians(delta))
+    delta = asin(DCPA / dist)
+    DCPA不大于dcpa_max时delta在[0, sindeg1]或[180-sindeg1, 180], 后者TCPA<0
+    危险范围为两者的交集, 非危险范围为[0, 180]中的其余部分
+    """
+    # acos参数范围[-1,1], 值范围[180, 0], 单调递减
+    cosdeg0 = math.degrees(math.acos(min(tcpa_max / dist * rel_spd / 60.0, 1.0)))
+    # asin参数范围[-1,1], 值范围[-90, 90], 单调递增
+    sindeg1 = math.degrees(math.asin(min(dcpa_max / dist, 1.0)))
+
+    danger = IntervalSet([(cosdeg0, 90.0)]) & IntervalSet([(0.0, sindeg1)])
+    nodanger = danger.complement(0.0, 180.0)
+    return danger, nodanger
+
+
+def delta_window(targ, ot, is_first):
+    """
+    按本船与目标船的关系ot选择delta的取值范围
+    至少一条危险目标船时(ot==3), 第一条目标船必定是危险的
+    """
+    if ot == 1:
+        return targ['nodanger']
+    if ot == 2 or (ot == 3 and is_first):
+        return targ['danger']
+    return targ['danger'] | targ['nodanger']
+
+
+def make_tship_arg_is_ok(targ, ot):
+    """make_tship_arg的结果能否用于ot条件"""
+    if targ['danger'] and targ['nodanger']:
+        return True
+    if not targ['danger'] and ot == 1:
+        return True
+    if not targ['nodanger'] and ot == 2:
+        return True
+    return ot == 4
+
+
+def make_tship_arg_detail(oship, relbrg, dist, tsog):
+    olat = oship['lat']
+    olon = oship['lon']
+    osog = oship['sog']
+    ocog = oship['cog']
+
+    tcog = mod360(ocog + relbrg + 180.0)
+
+    rel_spd, rel_cog = calc_rel_spd_cog(tsog, tcog, osog, ocog)
+
+    # 修正：正确计算相对方位（Bt）
+    # Bt = 目标船真方位 - 本船船首向
+    # 目标船真方位就是rel_cog（相对航向）
+    relbrg_corrected = mod360(rel_cog - ocog)
+
+    danger_rngs, nodanger_rngs = calc_delta_windows(dist, rel_spd, 30.0, 2.0)
+
+    danger_rngs = IntervalSet.point(0.0)
+    rel_spd, rel_cog = calc_rel_spd_cog(osog, ocog, tsog, tcog)
+
+    return {
+        'olat': olat,
+        'olon': olon,
+        # 'tlat': tlat,
+        # 'tlon': tlon,
+        'osog': osog,
+        'ocog': ocog,
+        'tsog': tsog,
+        'tcog': tcog,
+        'dist': dist,
+        # 'brg': brg,
+        'relbrg': relbrg_corrected,  # 使用修正后的相对方位
+        'rel_cog': rel_cog,
+        'rel_spd': rel_spd,
+        'danger': danger_rngs,
+        'nodanger': nodanger_rngs
+    }
+
+
+def make_tship_arg(oship, relbrgMin, relbrgMax,
+                   distMin, distMax, sogMin, sogMax, rng=random):
+    if relbrgMax < relbrgMin:
+        relbrgMax += 360
+    dist = rng.randint(round(distMin*10), round(distMax*10))*0.1
+    relbrg = rng.randint(round(relbrgMin*10), round(relbrgMax*10))*0.1
+    tsog = rng.randint(round(sogMin*10), round(sogMax*10))*0.1
+    return make_tship_arg_at(oship, relbrg, dist, tsog)
+
+
+def make_tship_arg_at(oship, relbrg, dist, tsog):
+    """make_tship_arg取到(relbrg, dist, tsog)时的结果"""
+    olat = oship['lat']
+    olon = oship['lon']
+    osog = oship['sog']
+    ocog = oship['cog']
+
+    relbrg = mod360(relbrg)
+    tcog = mod360(ocog + relbrg + 180.0)
+
+    rel_spd, rel_cog = calc_rel_spd_cog(tsog, tcog, osog, ocog)
+
+    # 修正：正确计算相对方位（Bt）
+    # Bt = 目标船真方位 - 本船船首向
+    # 目标船真方位就是rel_cog（相对航向）
+    relbrg_corrected = mod360(rel_cog - ocog)
+
+    danger_rngs, nodanger_rngs = calc_delta_windows(dist, rel_spd, SAFE_TCPA, SAFE_DCPA)
+
+    rel_spd, rel_cog = calc_rel_spd_cog(osog, ocog, tsog, tcog)
+
+    return {
+        'olat': olat,
+        'olon': olon,
+        # 'tlat': tlat,
+        # 'tlon': tlon,
+        'osog': osog,
+        'ocog': ocog,
+        'tsog': tsog,
+        'tcog': tcog,
+        'dist': dist,
+        # 'brg': brg,
+        'relbrg': relbrg_corrected,  # 使用修正后的相对方位
+        'rel_cog': rel_cog,
+        'rel_spd': rel_spd,
+        'danger': danger_rngs,
+        'nodanger': nodanger_rngs
+    }
+
+
+def make_tship_by_arg(tship_arg, delta):
+    olat = tship_arg['olat']
+    olon = tship_arg['olon']
+    osog = tship_arg['osog']
+    ocog = tship_arg['ocog']
+    tsog = tship_arg['tsog']
+    tcog = tship_arg['tcog']
+    dist = tship_arg['dist']
+    rel_cog = tship_arg['rel_cog']
+    brg = (rel_cog-180.0) + delta
+    brg = mod360(brg)
+    tlat, tlon = georef.ll_gc_ll(olat, olon, brg, dist)
+    TCPA, DCPA = calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog)
+    tship = {k: v for k, v in tship_arg.items()}
+    tship['tlat'] = tlat
+    tship['tlon'] = tlon
+    tship['brg'] = brg
+    tship['TCPA'] = TCPA
+    tship['DCPA'] = DCPA
+    return tship
+
+
+def make_tship_dist_is_ok(tship0, tship1):
+    lat0 = tship0['tlat']
+    lon0 = tship0['tlon']
+    lat1 = tship1['tlat']
+    lon1 = tship1['tlon']
+    dist, brg = georef.DistanceBearingMercator(lat0, lon0, lat1, lon1)
+    if dist < 0.5:
+        return False
+    return True
+
+
+def make_tship_is_safe_tt(tship0, tship1):
+    lat0 = tship0['tlat']
+    lon0 = tship0['tlon']
+    sog0 = tship0['tsog']
+    cog0 = tship0['tcog']
+    lat1 = tship1['tlat']
+    lon1 = tship1['tlon']
+    sog1 = tship1['tsog']
+    cog1 = tship1['tcog']
+    TCPA, DCPA = calc_CPA(lat0, lon0, lat1, lon1, sog0, sog1, cog0, cog1)
+    if TCPA < 0.0:
+        return True
+    # if TCPA > 30.0 or DCPA > 2.0:
+    # if TCPA > SAFE_TCPA or DCPA > SAFE_DCPA:
+    # if TCPA > SAFE_TCPA:
+    if DCPA > TT_DCPA:
+        return True
+    return False
+
+
+def make_tship_check_tt(tships, tt):
+    size = len(tships)
+    if size <= 1:
+        return True
+    danger_list = []
+    for i in range(size):
+        tship0 = tships[i]
+        for j in range(i+1, size):
+            tship1 = tships[j]
+            # 距离太近
+            if not make_tship_dist_is_ok(tship0, tship1):
+                return False
+            is_safe = make_tship_is_safe_tt(tship0, tship1)
+            if tt == 2 and is_safe:
+                return False
+            if tt == 1 and not is_safe:
+                return False
+            danger_list.append(1 if not is_safe else 0)
+    sum_danger = sum(danger_list)
+    if tt == 1 and sum_danger == 0:
+        return True
+    if tt == 2 and sum_danger == len(danger_list):
+        return True
+    if tt == 3 and sum_danger > 0:
+        return True
+    if tt == 4:
+        return True
+    return False
+
+
+def make_tship_pair_check(tship0, tship1, tt):
+    """
+    检查两条目标船之间是否满足tt条件, 返回(不满足的条件, 是否有危险), 满足时不满足的条件为None
+    与make_tship_check_tt中对每一对目标船的判断相同, tt==3的"至少1对有危险"需要在全部放置后检查
+    """
+    # 距离太近
+    if not make_tship_dist_is_ok(tship0, tship1):
+        return 'dist', False
+    if tt == 4:
+        return None, False
+    is_safe = make_tship_is_safe_tt(tship0, tship1)
+    if tt == 2 and is_safe:
+        return 'tt', False
+    if tt == 1 and not is_safe:
+        return 'tt', True
+    return None, not is_safe
+
+class TTChecker:
+    """
+    增量检查目标船之间的tt条件
+
+    push只检查新目标船与已放置的目标船, 并累计有危险的对数; pop撤销最后一次push.
+    放置顺序相同时, push全部成功且satisfied()为真, 等价于make_tship_check_tt返回True
+    """
+
+    def __init__(self, tt):
+        self.tt = tt
+        self.tships = []
+        self.dangers = []
+        self.danger_count = 0
+        # 各条件导致push失败的次数, 生成失败时用于说明原因
+        self.rejects = Counter()
+
+    def push(self, tship):
+        danger = 0
+        for placed in self.tships:
+            failed, is_danger = make_tship_pair_check(placed, tship, self.tt)
+            if failed:
+                self.rejects[failed] += 1
+                return False
+            danger += is_danger
+        self.tships.append(tship)
+        self.dangers.append(danger)
+        self.danger_count += danger
+        return True
+
+    def pop(self):
+        self.danger_count -= self.dangers.pop()
+        return self.tships.pop()
+
+    def satisfied(self):
+        # tt为1, 2时每一对都已在push中检查过
+        if len(self.tships) <= 1:
+            return True
+        if self.tt == 3:
+            return self.danger_count > 0
+        return True
+
+    def binding_constraint(self):
+        """导致失败次数最多的条件, 没有失败记录时为'tt'"""
+        if not self.rejects:
+            return 'tt'
+        return self.rejects.most_common(1)[0][0]
+
+# ot:
+# 1:本船和所有目标船没有危险
+# 2:本船和所有目标船有危险
+# 3:本船至少和1条目标船有危险
+# 4: 随机
+# tt:
+# 1:所有目标船之间都没有危险
+# 2:所有目标船之间都有危险
+# 3:所有目标船之间,至少1对有危险
+# 4: 随机
+def make_tship(oship, tships_condition, ot, tt, rng=random, budget=None):
+    """
+    按条件依次生成目标船, 返回目标船列表, 失败时返回GenFailure
+    budget为SearchBudget, 每次生成参数和放置目标船都算一次尝试
+    """
+    budget = default_budget(budget)
+    tship_args = []
+    tship_windows = []
+    for idx, cond in enumerate(tships_condition):
+        relbrg_min = cond['relbrg_min']
+        relbrg_max = cond['relbrg_max']
+        dist_min = cond['dist_min']
+        dist_max = cond['dist_max']
+        sog_min = cond['sog_min']
+        sog_max = cond['sog_max']
+        # nodanger总是包含(90, 180], ot为2, 3时要求danger不为空,
+        # 只在可能有危险的网格点中取值, 不再随机取值后重试
+        table = None
+        if ot in (2, 3):
+            table = danger_table(oship['sog'], cond, SAFE_TCPA, SAFE_DCPA)
+            if not table:
+                return GenFailure('infeasible', 'ot', idx)
+        targ = None
+        while True:
+            if not budget.spend():
+                return budget.failure('ot', idx)
+            if table is None:
+                targ = make_tship_arg(oship, relbrg_min, relbrg_max,
+                                      dist_min, dist_max, sog_min, sog_max, rng)
+            else:
+                # 表中边界上的点可能因浮点误差不可行, 仍然检查
+                targ = make_tship_arg_at(oship, *table.sample(rng))
+            if make_tship_arg_is_ok(targ, ot):
+                break
+
+        tship_args.append(targ)
+        tship_windows.append(delta_window(targ, ot, idx == 0))
+
+    # 与make_tship_check_tt(tships + [tship], tt)相同, 已放置的目标船之间不再重复检查
+    checker = TTChecker(tt)
+    fails = [0] * len(tship_args)
+    # 每条目标船的delta依次从取值范围中产生, 回溯到前一条时继续前一条的候选,
+    # 重新进入后一条时前面的目标船已经改变, 重新产生它的全部候选
+    tship_deltas = [None] * len(tship_args)
+    idx = 0
+    while True:
+        targ = tship_args[idx]
+        if tship_deltas[idx] is None:
+            tship_deltas[idx] = tship_windows[idx].candidates(rng)
+        for delta in tship_deltas[idx]:
+            if not budget.spend():
+                return budget.failure(checker.binding_constraint(), idx)
+            tship = make_tship_by_arg(targ, delta)
+            if not checker.push(tship):
+                continue
+            if checker.satisfied():
+                idx = idx + 1
+                break
+            checker.pop()
+        else:
+            # 没有满足条件的delta
+            fails[idx] += 1
+            tship_deltas[idx] = None
+            if checker.tships:
+                checker.pop()
+            idx = idx - 1
+        if idx >= len(tship_args):
+            break
+        if idx < 0:
+            return GenFailure('exhausted', checker.binding_constraint(),
+                              fails.index(max(fails)))
+
+    return checker.tships
+
+
+def make_tship_one_detail(oship, idx, relbrg, dist, sog, ot, tt, rng=random):
+    """
+    按给定的参数生成第idx条目标船, 返回只有一条目标船的列表, 失败时返回GenFailure
+    只有一条目标船, tt条件总是满足
+    """
+    # 参数固定时make_tship_arg_detail的结果也是固定的, 不满足ot条件时重试也不会满足
+    targ = make_tship_arg_detail(oship, relbrg, dist, sog)
+    if not make_tship_arg_is_ok(targ, ot):
+        return GenFailure('infeasible', 'ot', idx)
+    window = delta_window(targ, ot, idx == 0)
+    if not window:
+        return GenFailure('infeasible', 'ot', idx)
+    return [make_tship_by_arg(targ, window.sample(rng))]
+
+
+class Ship:
+
+    def __init__(self):
+        self.lat = None
+        self.lon = None
+        self.sog = 0.0
+        self.cog = 0.0
+
+    def calc_CPA(self, other):
+        TCPA, DCPA = calc_CPA(self.lat, self.lon, other.lat, other.lon, self.sog, other.sog, self.cog, other.cog)
+        self.TCPA = TCPA
+        self.DCPA = DCPA
+        return TCPA, DCPA
+
+
+class TShipArgCache:
+    """
+    同一本船的make_tship_arg_detail结果及其delta取值范围的LRU缓存
+
+    按(relbrg, dist, sog)索引, 最多保留maxsize条. 回溯搜索中内层目标船的参数
+    会随外层候选反复生成, 使用缓存后只计算一次. 缓存的结果不能修改
+    """
+
+    def __init__(self, oship, maxsize=1024):
+        self.oship = oship
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+
+    def _entry(self, relbrg, dist, sog):
+        key = (relbrg, dist, sog)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self._cache.move_to_end(key)
+            return entry
+        entry = (make_tship_arg_detail(self.oship, relbrg, dist, sog), {})
+        self._cache[key] = entry
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return entry
+
+    def get(self, relbrg, dist, sog):
+        return self._entry(relbrg, dist, sog)[0]
+
+    def get_window(self, relbrg, dist, sog, ot, is_first):
+        """返回(targ, delta_window(targ, ot, is_first))"""
+        targ, windows = self._entry(relbrg, dist, sog)
+        key = (ot, bool(is_first))
+        window = windows.get(key)
+        if window is None:
+            window = windows[key] = delta_window(targ, ot, is_first)
+        return targ, window
+
+
+class MakeTShip:
+    def __init__(self, oship, cond, rng=random, cache=None): # relbrg_min, relbrg_max, dist_min, dist_max, sog_min, sog_max):
+        self.oship = oship
+        self.rng = rng
+        if cache is None:
+            cache = TShipArgCache(oship)
+        self.cache = cache
+        relbrg_min = cond['relbrg_min']
+        relbrg_max = cond['relbrg_max']
+        dist_min = cond['dist_min']
+        dist_max = cond['dist_max']
+        sog_min = cond['sog_min']
+        sog_max = cond['sog_max']
+        self.relbrg_min = relbrg_min
+        self.relbrg_max = relbrg_max
+        self.dist_min = dist_min
+        self.dist_max = dist_max
+        self.sog_min = sog_min
+        self.sog_max = sog_max
+        step = round((relbrg_max*10 - relbrg_min*10) // 10)
+        # 处理step为0的情况
+        if step == 0:
+            step = 1
+        self.relbrg_list = [val*0.1 for val in range(round(relbrg_min*10), round(relbrg_max*10)+step, step)]
+        step = round((dist_max*10 - dist_min*10) // 10)
+        # 处理step为0的情况
+        if step == 0:
+            step = 1
+        self.dist_list = [val*0.1 for val in range(round(dist_min*10), round(dist_max*10)+step, step)]
+        step = round((sog_max*10 - sog_min*10) // 10)
+        # 处理step为0的情况
+        if step == 0:
+            step = 1
+        self.sog_list = [val*0.1 for val in range(round(sog_min*10), round(sog_max*10)+step, step)]
+
+        # self.relbrg_list = [val*0.5 for val in range(round(relbrg_min*10)//5, round(relbrg_max*10)//5+1)]
+        # self.dist_list = [val*0.5 for val in range(round(dist_min*10)//5, round(dist_max*10)//5+1)]
+        # self.sog_list = [val*0.5 for val in range(round(sog_min*10)//5, round(sog_max*10)//5+1)]
+        self.rng.shuffle(self.relbrg_list)
+        self.rng.shuffle(self.dist_list)
+        self.rng.shuffle(self.sog_list)
+        self.relbrg_list = self.relbrg_list[:3]
+        self.dist_list = self.dist_list[:3]
+        self.sog_list = self.sog_list[:3]
+        # self.relbrg_list = self.relbrg_list[:min(len(self.relbrg_list)//2, 20)]
+        # self.dist_list = self.dist_list[:len(self.dist_list)//2]
+        # self.sog_list = self.sog_list[:len(self.sog_list)//2]
+
+    def get(self):
+        for relbrg in self.relbrg_list:
+            for dist in self.dist_list:
+                for sog in self.sog_list:
+                    yield relbrg, dist, sog
+
+    def get_windows(self, ot, is_first):
+        for key in self.get():
+            targ = self.cache.get(*key)
+            if not targ['danger'] and ot == 2:
+                continue
+            if not targ['danger'] and ot == 3 and is_first == True:
+                continue
+            if not targ['nodanger'] and ot == 1:
+                continue
+            yield self.cache.get_window(*key, ot, is_first)
+
+    def get_arg(self, ot, is_first):
+        for targ, window in self.get_windows(ot, is_first):
+            self.arg = targ
+            self.window = window
+            for delta in window.candidates(self.rng):
+                yield targ, delta
+
+    def domain_size(self, ot, is_first):
+        """get_arg产生的候选数量, 用于确定搜索顺序"""
+        return sum(window.count() for targ, window in self.get_windows(ot, is_first))
+
+
+def make_tship_detail(oship, tships_condition, ot, tt, rng=random, budget=None):
+    """
+    回溯搜索满足ot, tt条件的目标船, 目标船数量不限
+
+    候选最少的目标船先放置, 每放置一条就检查它与已放置的目标船之间的条件,
+    不满足时立即尝试下一个候选, 候选用完后回到上一条目标船.
+    第1条目标船(ot==3时必须有危险)仍然是tships_condition中的第1个.
+    返回的目标船顺序与tships_condition相同, 没有找到或超出budget的限制时返回GenFailure
+    """
+    budget = default_budget(budget)
+    # 所有目标船共用同一个本船的参数缓存
+    cache = TShipArgCache(oship)
+    mtship_list = [MakeTShip(oship, cond, rng, cache) for cond in tships_condition]
+    num = len(mtship_list)
+    if num == 0:
+        return []
+    domain_sizes = [mtship.domain_size(ot, i == 0) for i, mtship in enumerate(mtship_list)]
+    if 0 in domain_sizes:
+        # 没有任何参数满足ot条件
+        return GenFailure('infeasible', 'ot', domain_sizes.index(0))
+    order = sorted(range(num), key=lambda i: (domain_sizes[i], i))
+
+    checker = TTChecker(tt)
+    fails = [0] * num
+    args_iter = [None] * num
+    depth = 0
+    args_iter[0] = mtship_list[order[0]].get_arg(ot, order[0] == 0)
+    while depth >= 0:
+        for targ, delta in args_iter[depth]:
+            if not budget.spend():
+                return budget.failure(checker.binding_constraint(), order[depth])
+            tship = make_tship_by_arg(targ, delta)
+            if not checker.push(tship):
+                continue
+            if depth + 1 < num:
+                depth += 1
+                args_iter[depth] = mtship_list[order[depth]].get_arg(
+                    ot, order[depth] == 0)
+                break
+            if checker.satisfied():
+                tships = [None] * num
+                for idx, placed in zip(order, checker.tships):
+                    tships[idx] = placed
+                return tships
+            checker.pop()
+        else:
+            # 没有满足条件的候选, 回到上一条目标船
+            fails[order[depth]] += 1
+            depth -= 1
+            if depth >= 0:
+                checker.pop()
+    return GenFailure('exhausted', checker.binding_constraint(), fails.index(max(fails)))
+
+
+def gen_situation2(args, rng=None):
+    lat = args['lat']
+    lon = args['lon']
+    target_num = args['target_num']
+    osog_min = args['osog_min']
+    osog_max = args['osog_max']
+    tsog_min = args['tsog_min']
+    tsog_max = args['tsog_max']
+    dists = args['dist']
+    rel_brgs = args['rel_brg']
+    Slist = args['S']
+    if rng is None:
+        rng = make_rng(args.get('seed'))
+
+    oship = gen_oship(lat, lon, osog_min, osog_max, rng)
+    d_tsog = (tsog_max-tsog_min)/target_num
+
+    tships = []
+    for i in range(target_num):
+        dist_min = dists[i][0]
+        dist_max = dists[i][1]
+        rel_brg_min = rel_brgs[i][0]
+        rel_brg_max = rel_brgs[i][1]
+        if rel_brg_max < rel_brg_min:
+            rel_brg_max += 360
+        now_tsog_min = tsog_max-d_tsog*(i+1)
+        now_tsog_max = tsog_max-d_tsog*i
+        count = 0
+        cnt = True
+        S = Slist[i]
+        while cnt:
+            count += 1
+            if count >= 10:
+                # 随机次数太多次了
+                # print('STEP')
+                return None
+            else:
+                if S[0] != 4:
+                    tship = gen_tship_check(
+                        oship, tships, rel_brg_min, rel_brg_max,
+                        dist_min, dist_max, now_tsog_min, now_tsog_max, rng)
+                else:
+                    tship = gen_tship_check_no_danger(
+                        oship, tships, rel_brg_min, rel_brg_max,
+                        dist_min, dist_max, now_tsog_min, now_tsog_max, rng)
+            if tship:
+                tships.append(tship)
+                break
+    print(tships)
+    return tships
+
+
+def tship_conditions(args):
+    """由场景参数得到make_tship/make_tship_detail的tships_condition"""
+    target_num = args['target_num']
+    tsog_min = args['tsog_min']
+    tsog_max = args['tsog_max']
+    dists = args['dist']
+    rel_brgs = args['rel_brg']
+    d_tsog = (tsog_max-tsog_min)/target_num
+
+    cond_list = []
+    for i in range(target_num):
+        dist_min = dists[i][0]
+        dist_max = dists[i][1]
+        rel_brg_min = rel_brgs[i][0]
+        rel_brg_max = rel_brgs[i][1]
+        if rel_brg_max < rel_brg_min:
+            rel_brg_max += 360
+        now_tsog_min = tsog_max-d_tsog*(i+1)
+        now_tsog_max = tsog_max-d_tsog*i
+        cond_list.append({
+            'relbrg_min': rel_brg_min,
+            'relbrg_max': rel_brg_max,
+            'dist_min': dist_min,
+            'dist_max': dist_max,
+            'sog_min': now_tsog_min,
+            'sog_max': now_tsog_max
+        })
+    return cond_list
+
+
+def gen_situation3(args, rng=None, budget=None):
+    lat = args['lat']
+    lon = args['lon']
+    osog_min = args['osog_min']
+    osog_max = args['osog_max']
+    ot = args.get('ot', 2)
+    tt = args.get('tt', 4)
+    # Slist = args['S']
+    if rng is None:
+        rng = make_rng(args.get('seed'))
+
+    oship = gen_oship(lat, lon, osog_min, osog_max, rng)
+    cond_list = tship_conditions(args)
+    tships = make_tship_detail(oship, cond_list, ot, tt, rng, budget)
+    print(tships)
+    return tships
+
+
+def find_m(id):
+    for obj in meeting_situation_table:
+        if obj['id'] == id:
+            return obj
+    return None
+
+
+def read_csv(filename):
+    title = []
+    datas = []
+    try:
+        f = open(filename, 'r')
+        text = f.read()
+        f.close()
+        lines = text.split('\n')
+        title = lines[0].split(',')
+        lines = lines[1:]
+        for line in lines:
+            if line:
+                datas.append(line.split(','))
+    except:
+        pass
+
+    return title, datas
+
+
+def init_csv_data(data_dir='./data'):
+    # 原地更新各列表, 使 from scenario_core import * 导入的名字同样生效
+    filename = data_dir + '/visibility.csv'
+    title, datas = read_csv(filename)
+    if datas:
+        visibility_list[:] = [(int(d[0]), d[1]) for d in datas]
+
+    filename = data_dir + '/stage.csv'
+    title, datas = read_csv(filename)
+    if datas:
+        stage_list[:] = [(int(d[0]), d[1], float(d[2]), float(d[3]))
+                         for d in datas]
+
+    filename = data_dir + '/ownship_behavior.csv'
+    title, datas = read_csv(filename)
+    if datas:
+        ownship_behavior_list[:] = [(int(d[0]), d[1]) for d in datas]
+
+    filename = data_dir + '/meeting_situation.csv'
+    title, datas = read_csv(filename)
+    if datas:
+        meeting_situation_list[:] = [(int(d[0]), d[1],
+                                      (float(d[2]), float(d[3])),
+                                      (float(d[4]), float(d[5])), int(d[6]))
+                                     for d in datas]
+
+    filename = data_dir + '/target_behavior.csv'
+    title, datas = read_csv(filename)
+    if datas:
+        target_behavior_list[:] = [(int(d[0]), d[1])for d in datas]
+
+    filename = data_dir + '/speed.csv'
+    title, datas = read_csv(filename)
+    if datas:
+        speed_list[:] = [(int(d[0]), d[1], float(d[2]), float(d[3]))
+                         for d in datas]
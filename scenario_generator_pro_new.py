@@ -0,0 +1,482 @@
+"""
+海上船舶会遇场景生成器 - 专业版核心算法 (无GUI)
+
+generate_scenario及其使用的gen_*函数, 不依赖PyQt5.
+会遇类型等配置在第一次生成时才从./data读取, 也可以提前调用load_config()指定目录.
+"""
+
+import csv
+import json
+import math
+import random
+from datetime import datetime
+
+import georef
+from scenario_core import mod360, get_rel_course_north, calc_rel_spd_cog, calc_CPA
+from scenario_core import make_rng, scenario_seed
+
+# 安全参数常量
+SAFE_TCPA = 30.0  # 安全TCPA阈值(秒)
+SAFE_DCPA = 2.0   # 安全DCPA阈值(海里)
+TT_DCPA = 1.0     # 目标DCPA
+DANGER_TCPA = 30.0  # 有碰撞危险的目标船TCPA上限(分钟)
+DANGER_DCPA = 0.5   # 有碰撞危险的目标船DCPA上限(海里)
+# calc_CPA使用椭球墨卡托距离, 与ll_gc_ll的大圆距离略有差异, 解析计算抽样范围时按此放宽
+DIST_MARGIN = 1.01
+
+# 配置数据, 由load_config()原地填充
+meeting_situations = []
+speed_ranges = []
+stages = []
+
+
+def load_csv_config(filename):
+    """从CSV文件加载配置数据，支持多种编码"""
+    encodings = ['gbk', 'gb2312', 'utf-8', 'utf-8-sig', 'cp936']
+
+    for encoding in encodings:
+        try:
+            with open(filename, 'r', encoding=encoding) as f:
+                reader = csv.reader(f)
+                next(reader)  # 跳过标题行
+                data = list(reader)
+                data = [row for row in data if row and any(row)]
+                if data:
+                    return data
+        except Exception as e:
+            continue
+
+    print(f"警告：无法读取文件 {filename}")
+    return []
+
+
+def load_config(data_dir='./data', config_file='config.json'):
+    """加载config.json和会遇类型、速度、阶段配置"""
+    global TT_DCPA
+
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            conf = json.load(f)
+            TT_DCPA = conf.get('tt_DCPA', 1.0)
+    except:
+        pass
+
+    speed_data = load_csv_config(data_dir + '/speed.csv')
+    stage_data = load_csv_config(data_dir + '/stage.csv')
+    meeting_situation_data = load_csv_config(data_dir + '/meeting_situation.csv')
+
+    # 解析会遇类型配置
+    meeting_situations.clear()
+    for row in meeting_situation_data:
+        if len(row) >= 7:
+            try:
+                meeting_situations.append({
+                    'id': int(row[0]),
+                    'name': row[1],
+                    'rel_brg_min': float(row[2]),
+                    'rel_brg_max': float(row[3]),
+                    'dist_min': float(row[4]),
+                    'dist_max': float(row[5]),
+                    'behavior': int(row[6])
+                })
+            except Exception as e:
+                print(f"解析会遇类型配置出错: {row}, 错误: {e}")
+                continue
+
+    # 解析速度配置
+    speed_ranges.clear()
+    for row in speed_data:
+        if len(row) >= 4:
+            speed_ranges.append({
+                'id': int(row[0]),
+                'name': row[1],
+                'min': float(row[2]),
+                'max': float(row[3])
+            })
+
+    # 解析阶段配置
+    stages.clear()
+    for row in stage_data:
+        if len(row) >= 4:
+            stages.append({
+                'id': int(row[0]),
+                'name': row[1],
+                'dist_min': float(row[2]),
+                'dist_max': float(row[3])
+            })
+
+    # 检查配置加载
+    if not meeting_situations:
+        print("警告：未能加载任何会遇类型配置！")
+    if not stages:
+        print("警告：未能加载任何阶段配置！")
+
+
+def gen_oship(lat, lon, sog_min, sog_max, rng=random):
+    """生成本船数据"""
+    sog = rng.uniform(sog_min, sog_max)
+    cog = rng.uniform(0, 360)
+    return {
+        'lat': lat,
+        'lon': lon,
+        'sog': sog,
+        'cog': cog,
+    }
+
+
+def _sample_intervals(intervals, rng):
+    """在若干闭区间的并集上均匀取值, 区间长度都为0时在各端点中随机选择"""
+    total = sum(hi - lo for lo, hi in intervals)
+    if total <= 0.0:
+        return rng.choice(intervals)[0]
+    x = rng.uniform(0.0, total)
+    for lo, hi in intervals:
+        if x <= hi - lo:
+            return lo + x
+        x -= hi - lo
+    return intervals[-1][1]
+
+
+def _cos_relbrg_min(osog, tsog, rel_spd_min):
+    """
+    相对速度不小于rel_spd_min时cos(relbrg)的下限, 大于1表示任何相对方位都不满足
+
+    tcog = ocog + relbrg + 180时, rel_spd^2 = osog^2 + tsog^2 + 2*osog*tsog*cos(relbrg)
+    """
+    need = rel_spd_min * rel_spd_min - osog * osog - tsog * tsog
+    prod = 2.0 * osog * tsog
+    if prod <= 0.0:
+        return -1.0 if need <= 0.0 else 2.0
+    return need / prod
+
+
+def _relbrg_ranges(rel_brg_min, rel_brg_max):
+    """会遇类型的相对方位范围, 以[0, 360]内的闭区间列表表示"""
+    if rel_brg_max < rel_brg_min:
+        # 跨越0度，如354-6度
+        return [(rel_brg_min, 360.0), (0.0, rel_brg_max)]
+    return [(rel_brg_min, rel_brg_max)]
+
+
+def _danger_relbrg_intervals(osog, rel_brg_min, rel_brg_max, sog_min, sog_max,
+                             rel_spd_min):
+    """
+    会遇类型的相对方位范围中, 存在目标船速度使相对速度不小于rel_spd_min的部分
+
+    rel_spd是tsog的凸函数, 最大值在sog_min或sog_max处取得, 因此可行的相对方位为
+    |relbrg| <= theta. 返回[0, 360]内的闭区间列表, 为空表示该会遇类型不可能有碰撞危险
+    """
+    c = min(_cos_relbrg_min(osog, sog_min, rel_spd_min),
+            _cos_relbrg_min(osog, sog_max, rel_spd_min))
+    if c > 1.0:
+        return []
+    theta = math.degrees(math.acos(max(c, -1.0)))
+
+    feasible = [(0.0, theta), (360.0 - theta, 360.0)]
+
+    intervals = []
+    for lo, hi in _relbrg_ranges(rel_brg_min, rel_brg_max):
+        for flo, fhi in feasible:
+            a, b = max(lo, flo), min(hi, fhi)
+            if a <= b:
+                intervals.append((a, b))
+    return intervals
+
+
+def _danger_tsog_intervals(osog, cos_relbrg, sog_min, sog_max, rel_spd_min):
+    """
+    给定相对方位的余弦时, 使相对速度不小于rel_spd_min的目标船速度区间
+
+    rel_spd^2 >= rel_spd_min^2 是关于tsog的二次不等式, 不可行的部分为两根之间的开区间
+    """
+    b = osog * cos_relbrg
+    disc = rel_spd_min * rel_spd_min - osog * osog * (1.0 - cos_relbrg * cos_relbrg)
+    if disc <= 0.0:
+        return [(sog_min, sog_max)]
+    root = math.sqrt(disc)
+    r1, r2 = -b - root, -b + root
+    intervals = []
+    if sog_min <= r1:
+        intervals.append((sog_min, min(sog_max, r1)))
+    if r2 <= sog_max:
+        intervals.append((max(sog_min, r2), sog_max))
+    return intervals
+
+
+def _danger_sampling_box(osog, meeting_config, sog_min, sog_max):
+    """
+    包含全部有碰撞危险组合的(relbrg, tsog, dist)抽样范围
+
+    返回(relbrg区间列表, tsog区间列表, dist上限), 不可能有碰撞危险时返回None.
+    calc_CPA的距离比解析计算略大, 用DIST_MARGIN放宽各个范围, 保证不会漏掉可行组合.
+    """
+    dist_min = meeting_config['dist_min']
+    dist_max = meeting_config['dist_max']
+
+    # 距离取dist_min时所需的最小相对速度
+    rel_spd_min = max(dist_min * 60.0 / DANGER_TCPA / DIST_MARGIN, 0.001)
+    relbrg_intervals = _danger_relbrg_intervals(
+        osog, meeting_config['rel_brg_min'], meeting_config['rel_brg_max'],
+        sog_min, sog_max, rel_spd_min)
+    if not relbrg_intervals:
+        return None
+
+    # 相对速度随cos(relbrg)增大, 取各区间中最接近正前方的端点,
+    # 该方位上tsog和dist的可行范围包含所有相对方位上的可行范围
+    cos_best = -1.0
+    for lo, hi in relbrg_intervals:
+        cos_best = max(cos_best, math.cos(math.radians(lo if hi <= 180.0 else hi)))
+    tsog_intervals = _danger_tsog_intervals(osog, cos_best, sog_min, sog_max,
+                                            rel_spd_min)
+    if not tsog_intervals:
+        return None
+
+    # rel_spd是tsog的凸函数, 最大值在sog_min或sog_max处取得
+    rel_spd_max = math.sqrt(max(osog * osog + t * t + 2.0 * osog * t * cos_best
+                                for t in (sog_min, sog_max)))
+    dist_hi = max(dist_min, min(dist_max, rel_spd_max * DANGER_TCPA / 60.0
+                                * DIST_MARGIN))
+    return relbrg_intervals, tsog_intervals, dist_hi
+
+
+def gen_tship(oship, meeting_config, sog_min, sog_max, max_attempts=100,
+              rng=random):
+    """
+    生成有碰撞危险的目标船 - 完全参考main.py第343-556行逻辑
+
+    核心思路（参考main.py）：
+    1. 随机确定相对方位relbrg（从配置表）
+    2. 随机确定距离dist和目标船速度tsog
+    3. 计算初始航向：tcog = ocog + relbrg + 180
+    4. 计算相对运动方向rel_cog
+    5. 使用delta=0，计算目标船真实方位：brg = rel_cog - 180
+    6. 根据brg和dist确定目标船位置
+
+    目标船位于相对运动线上, DCPA约为0, TCPA = dist / rel_spd * 60,
+    所以TCPA <= DANGER_TCPA 等价于 rel_spd >= dist * 60 / DANGER_TCPA.
+    第一次在配置范围内均匀取值; 不满足条件时改在_danger_sampling_box给出的范围内
+    均匀取值. 两个范围都包含全部可行组合, 通过calc_CPA检查的结果在可行范围内均匀分布,
+    与只在配置范围内拒绝抽样相同, 只是无效抽样更少.
+    会遇类型在给定速度范围内不可能有碰撞危险时直接返回None.
+    """
+    olat = oship['lat']
+    olon = oship['lon']
+    osog = oship['sog']
+    ocog = oship['cog']
+
+    # 配置范围, 大多数情况下第一次抽样即满足条件, 不必计算可行范围
+    relbrg_intervals = _relbrg_ranges(meeting_config['rel_brg_min'],
+                                      meeting_config['rel_brg_max'])
+    tsog_intervals = [(sog_min, sog_max)]
+    dist_min = meeting_config['dist_min']
+    dist_hi = meeting_config['dist_max']
+
+    for attempt in range(max_attempts):
+        if attempt == 1:
+            # 第一次抽样失败, 缩小到解析可行范围
+            box = _danger_sampling_box(osog, meeting_config, sog_min, sog_max)
+            if box is None:
+                return None
+            relbrg_intervals, tsog_intervals, dist_hi = box
+
+        # 1. 随机确定相对方位、目标船速度和距离
+        relbrg = mod360(_sample_intervals(relbrg_intervals, rng))
+        tsog = _sample_intervals(tsog_intervals, rng)
+        dist = rng.uniform(dist_min, dist_hi)
+
+        # 2. 计算目标船航向（参考main.py第238行）
+        tcog = mod360(ocog + relbrg + 180.0)
+
+        # 3. 计算相对运动方向（参考main.py第240行，注意参数顺序！）
+        rel_spd_temp, rel_cog = calc_rel_spd_cog(tsog, tcog, osog, ocog)
+
+        if rel_spd_temp < 0.001:
+            continue
+
+        # 4. TCPA明显超出上限的组合不再计算位置
+        if dist * 60.0 / rel_spd_temp > DANGER_TCPA * DIST_MARGIN:
+            continue
+
+        # 5. 目标船方位 = 相对运动方向（参考main.py第242行）
+        brg = rel_cog
+
+        # 6. 根据brg和dist计算目标船位置（参考main.py第243行）
+        tlat, tlon = georef.ll_gc_ll(olat, olon, brg, dist)
+
+        # 7. 计算TCPA和DCPA（参考main.py第244行）
+        TCPA, DCPA = calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog)
+
+        # 8. 检查是否满足碰撞危险条件
+        if TCPA >= 0 and TCPA <= DANGER_TCPA and DCPA <= DANGER_DCPA:
+            # 9. 重新计算相对运动参数（参考main.py第246行，正确的参数顺序）
+            rel_spd, rel_cog_final = calc_rel_spd_cog(osog, ocog, tsog, tcog)
+
+            # 10. 返回结果（参考main.py第248-264行）
+            # 注意：返回的brg是rel_cog（第242行），dist是输入的dist（第257行）
+            # 不要重新计算真实方位！
+            return {
+                'olat': olat,
+                'olon': olon,
+                'tlat': tlat,
+                'tlon': tlon,
+                'osog': osog,
+                'ocog': ocog,
+                'tsog': tsog,
+                'tcog': tcog,
+                'dist': dist,
+                'brg': brg,
+                'relbrg': relbrg,
+                'rel_cog': rel_cog_final,
+                'rel_spd': rel_spd,
+                'TCPA': TCPA,
+                'DCPA': DCPA,
+                'meeting_type': meeting_config['name']
+            }
+
+    # 如果所有尝试都失败，返回None
+    return None
+
+
+def gen_tship_no_danger(oship, meeting_config, sog_min, sog_max, rng=random):
+    """
+    生成无碰撞危险的目标船
+    """
+    olat = oship['lat']
+    olon = oship['lon']
+    osog = oship['sog']
+    ocog = oship['cog']
+
+    rel_brg_min = meeting_config['rel_brg_min']
+    rel_brg_max = meeting_config['rel_brg_max']
+    dist_min = meeting_config['dist_min']
+    dist_max = meeting_config['dist_max']
+
+    if rel_brg_max < rel_brg_min:
+        if rng.random() < 0.5:
+            relbrg = rng.uniform(rel_brg_min, 360.0)
+        else:
+            relbrg = rng.uniform(0.0, rel_brg_max)
+    else:
+        relbrg = rng.uniform(rel_brg_min, rel_brg_max)
+    relbrg = mod360(relbrg)
+    dist = rng.uniform(dist_min, dist_max)
+    tsog = rng.uniform(sog_min, sog_max)
+
+    tcog = mod360(ocog + relbrg + 180.0)
+    rel_spd, rel_cog = calc_rel_spd_cog(osog, ocog, tsog, tcog)
+
+    # 使用较大的delta值使DCPA较大
+    delta = rng.uniform(90, 180) * rng.choice([-1, 1])
+
+    brg = mod360((rel_cog - 180.0) + delta)
+    tlat, tlon = georef.ll_gc_ll(olat, olon, brg, dist)
+
+    TCPA, DCPA = calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog)
+    real_dist, real_brg = georef.DistanceBearingMercator(olat, olon, tlat, tlon)
+
+    return {
+        'olat': olat,
+        'olon': olon,
+        'tlat': tlat,
+        'tlon': tlon,
+        'osog': osog,
+        'ocog': ocog,
+        'tsog': tsog,
+        'tcog': tcog,
+        'dist': real_dist,
+        'brg': real_brg,
+        'relbrg': relbrg,
+        'rel_cog': rel_cog,
+        'rel_spd': rel_spd,
+        'TCPA': TCPA,
+        'DCPA': DCPA,
+        'meeting_type': meeting_config['name'],
+        'delta': delta
+    }
+
+
+def generate_scenario(target_num, osog_min=10.0, osog_max=20.0,
+                     tsog_min=10.0, tsog_max=20.0,
+                     lat=31.0, lon=123.0,
+                     meeting_type_counts=None, seed=None):
+    """
+    生成完整场景
+
+    Args:
+        target_num: 目标船数量
+        osog_min/max: 本船速度范围
+        tsog_min/max: 目标船速度范围
+        lat/lon: 初始位置
+        meeting_type_counts: 指定各会遇类型数量的字典 {meeting_type_id: count}
+        seed: 随机种子, 相同的种子和参数生成相同的场景; 为None时使用全局random
+    """
+    if not meeting_situations:
+        load_config()
+
+    rng = make_rng(seed)
+    oship = gen_oship(lat, lon, osog_min, osog_max, rng)
+
+    target_configs = []
+
+    if meeting_type_counts:
+        for meeting_id, count in meeting_type_counts.items():
+            meeting_config = next((m for m in meeting_situations if m['id'] == meeting_id), None)
+            if meeting_config:
+                target_configs.extend([meeting_config] * count)
+    else:
+        available_types = meeting_situations.copy()
+        rng.shuffle(available_types)
+
+        for i in range(target_num):
+            if i < len(available_types):
+                target_configs.append(available_types[i])
+            else:
+                target_configs.append(rng.choice(meeting_situations))
+
+    targets = []
+    for i, config in enumerate(target_configs[:target_num]):
+        max_attempts = 100
+        for attempt in range(max_attempts):
+            if config['name'] == '没有危险':
+                target = gen_tship_no_danger(oship, config, tsog_min, tsog_max, rng)
+            else:
+                target = gen_tship(oship, config, tsog_min, tsog_max, rng=rng)
+
+            if target is None:
+                continue
+
+            valid = True
+            for existing in targets:
+                dist_between = georef.DistGreatCircle(
+                    target['tlat'], target['tlon'],
+                    existing['tlat'], existing['tlon']
+                )
+                if dist_between < 1.0:
+                    valid = False
+                    break
+
+            if valid:
+                target['id'] = i + 1
+                targets.append(target)
+                break
+
+        if len(targets) <= i:
+            return None
+
+    return {
+        'ownship': oship,
+        'targets': targets,
+        'seed': seed,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+# CSV导出的表头, 与load_from_csv读取的列名一致
+CSV_HEADERS = [
+    "场景ID", "时间戳", "目标船数", "本船纬度", "本船经度",
+    "本船SOG(节)", "本船COG(度)", "目标船ID", "会遇类型",
+    "目标船纬度", "目标船经度", "目标船SOG(节)", "目标船COG(度)",
+    "距离(海里)", "方位(度)", "TCPA(分钟)", "DCPA(海里)",
+    "相对速度(节)", "相对航向(度)", "危险状态", "随机种子"
+]
+
@@ -18,393 +18,53 @@ from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 import sys
 import math
+import bisect
+import multiprocessing
 import random
-import csv
-import json
-from datetime import datetime
-import georef
-
-# 安全参数常量
-SAFE_TCPA = 30.0  # 安全TCPA阈值(秒)
-SAFE_DCPA = 2.0   # 安全DCPA阈值(海里)
-TT_DCPA = 1.0     # 目标DCPA
-
-# 加载配置
-try:
-    with open('config.json', 'r', encoding='utf-8') as f:
-        conf = json.load(f)
-        TT_DCPA = conf.get('tt_DCPA', 1.0)
-except:
-    pass
-
-
-def load_csv_config(filename):
-    """从CSV文件加载配置数据，支持多种编码"""
-    encodings = ['gbk', 'gb2312', 'utf-8', 'utf-8-sig', 'cp936']
-
-    for encoding in encodings:
-        try:
-            with open(filename, 'r', encoding=encoding) as f:
-                reader = csv.reader(f)
-                next(reader)  # 跳过标题行
-                data = list(reader)
-                data = [row for row in data if row and any(row)]
-                if data:
-                    return data
-        except Exception as e:
-            continue
+import time
+import traceback
+from collections import OrderedDict
 
-    print(f"警告：无法读取文件 {filename}")
-    return []
+from scenario_generator_pro_new import *
+import batch_generate
+from scenario_io import save_pro_csv, load_pro_csv, IndexedCSVScenarios
+from scenario_store import save_store, load_store
+from scenario_library import ScenarioLibrary
 
+# 场景库(列式二进制)文件的后缀
+STORE_SUFFIX = '.npz'
+# SQLite场景库文件的后缀
+LIBRARY_SUFFIX = '.db'
 
 # 加载配置文件
-speed_data = load_csv_config('./data/speed.csv')
-visibility_data = load_csv_config('./data/visibility.csv')
-stage_data = load_csv_config('./data/stage.csv')
-ownship_behavior_data = load_csv_config('./data/ownship_behavior.csv')
-target_behavior_data = load_csv_config('./data/target_behavior.csv')
-meeting_situation_data = load_csv_config('./data/meeting_situation.csv')
-
-# 解析会遇类型配置
-meeting_situations = []
-for row in meeting_situation_data:
-    if len(row) >= 7:
-        try:
-            meeting_situations.append({
-                'id': int(row[0]),
-                'name': row[1],
-                'rel_brg_min': float(row[2]),
-                'rel_brg_max': float(row[3]),
-                'dist_min': float(row[4]),
-                'dist_max': float(row[5]),
-                'behavior': int(row[6])
-            })
-        except Exception as e:
-            print(f"解析会遇类型配置出错: {row}, 错误: {e}")
-            continue
-
-# 解析速度配置
-speed_ranges = []
-for row in speed_data:
-    if len(row) >= 4:
-        speed_ranges.append({
-            'id': int(row[0]),
-            'name': row[1],
-            'min': float(row[2]),
-            'max': float(row[3])
-        })
-
-# 解析阶段配置
-stages = []
-for row in stage_data:
-    if len(row) >= 4:
-        stages.append({
-            'id': int(row[0]),
-            'name': row[1],
-            'dist_min': float(row[2]),
-            'dist_max': float(row[3])
-        })
-
-# 检查配置加载
-if not meeting_situations:
-    print("警告：未能加载任何会遇类型配置！")
-if not stages:
-    print("警告：未能加载任何阶段配置！")
-
-
-def mod360(deg):
-    """将角度归一化到[0, 360)范围"""
-    v = math.fmod(deg, 360)
-    if v < 0.0:
-        v += 360.0
-    return v
-
-
-def get_rel_course_north(v_x_o, v_y_o, v_x_t, v_y_t):
-    """计算相对航向（正北为0度）"""
-    dvx = v_x_t - v_x_o
-    dvy = v_y_t - v_y_o
-    course = math.degrees(math.atan2(dvx, dvy))
-    if course < 0.0:
-        course += 360.0
-    return course
-
-
-def calc_rel_spd_cog(osog, ocog, tsog, tcog):
-    """计算相对速度和相对航向"""
-    v_x_o = osog * math.sin(math.radians(ocog))
-    v_y_o = osog * math.cos(math.radians(ocog))
-    v_x_t = tsog * math.sin(math.radians(tcog))
-    v_y_t = tsog * math.cos(math.radians(tcog))
-
-    v_x_rel = v_x_t - v_x_o
-    v_y_rel = v_y_t - v_y_o
-    rel_spd = math.sqrt(v_x_rel**2 + v_y_rel**2)
-
-    rel_cog = get_rel_course_north(v_x_o, v_y_o, v_x_t, v_y_t)
-
-    return rel_spd, rel_cog
-
-
-def calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog):
-    """计算TCPA和DCPA"""
-    dist, brg = georef.DistanceBearingMercator(tlat, tlon, olat, olon)
-
-    v_x_o = osog * math.sin(math.radians(ocog))
-    v_y_o = osog * math.cos(math.radians(ocog))
-    v_x_t = tsog * math.sin(math.radians(tcog))
-    v_y_t = tsog * math.cos(math.radians(tcog))
-
-    v_x_rel = v_x_t - v_x_o
-    v_y_rel = v_y_t - v_y_o
-    rel_spd = math.sqrt(v_x_rel**2 + v_y_rel**2)
-
-    rel_course = get_rel_course_north(v_x_o, v_y_o, v_x_t, v_y_t)
-
-    delta = rel_course - brg - 180.0
-    TCPA = 99999.0
-    if rel_spd > 0.001:
-        TCPA = dist * math.cos(math.radians(delta)) / rel_spd * 60.0
-
-    DCPA = abs(dist * math.sin(math.radians(delta)))
-
-    return TCPA, DCPA
-
-
-def gen_oship(lat, lon, sog_min, sog_max):
-    """生成本船数据"""
-    sog = random.uniform(sog_min, sog_max)
-    cog = random.uniform(0, 360)
-    return {
-        'lat': lat,
-        'lon': lon,
-        'sog': sog,
-        'cog': cog,
-    }
-
-
-def gen_tship(oship, meeting_config, sog_min, sog_max, max_attempts=100):
-    """
-    生成有碰撞危险的目标船 - 完全参考main.py第343-556行逻辑
-
-    核心思路（参考main.py）：
-    1. 随机确定相对方位relbrg（从配置表）
-    2. 随机确定距离dist和目标船速度tsog
-    3. 计算初始航向：tcog = ocog + relbrg + 180
-    4. 计算相对运动方向rel_cog
-    5. 使用delta=0，计算目标船真实方位：brg = rel_cog - 180
-    6. 根据brg和dist确定目标船位置
-    """
-    olat = oship['lat']
-    olon = oship['lon']
-    osog = oship['sog']
-    ocog = oship['cog']
-
-    rel_brg_min = meeting_config['rel_brg_min']
-    rel_brg_max = meeting_config['rel_brg_max']
-    dist_min = meeting_config['dist_min']
-    dist_max = meeting_config['dist_max']
-
-    # 迭代尝试不同的参数组合
-    for attempt in range(max_attempts):
-        # 1. 随机确定相对方位（处理跨越0度的情况）
-        # 参考main.py第227-228行
-        if rel_brg_max < rel_brg_min:
-            # 跨越0度，如354-6度
-            if random.random() < 0.5:
-                relbrg = random.uniform(rel_brg_min, 360.0)
-            else:
-                relbrg = random.uniform(0.0, rel_brg_max)
-        else:
-            relbrg = random.uniform(rel_brg_min, rel_brg_max)
-        relbrg = mod360(relbrg)
-
-        # 2. 随机确定距离和目标船速度
-        # 参考main.py第234-237行
-        dist = random.uniform(dist_min, dist_max)
-        tsog = random.uniform(sog_min, sog_max)
-
-        # 3. 计算目标船航向（参考main.py第238行）
-        tcog = mod360(ocog + relbrg + 180.0)
-
-        # 4. 计算相对运动方向（参考main.py第240行，注意参数顺序！）
-        rel_spd_temp, rel_cog = calc_rel_spd_cog(tsog, tcog, osog, ocog)
-
-        if rel_spd_temp < 0.001:
-            continue
-
-        # 5. 目标船方位 = 相对运动方向（参考main.py第242行）
-        brg = rel_cog
-
-        # 6. 根据brg和dist计算目标船位置（参考main.py第243行）
-        tlat, tlon = georef.ll_gc_ll(olat, olon, brg, dist)
-
-        # 7. 计算TCPA和DCPA（参考main.py第244行）
-        TCPA, DCPA = calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog)
-
-        # 8. 检查是否满足碰撞危险条件
-        # DCPA范围：0-0.5海里（更严格的碰撞危险）
-        if TCPA >= 0 and TCPA <= 30.0 and DCPA <= 0.5:
-            # 9. 重新计算相对运动参数（参考main.py第246行，正确的参数顺序）
-            rel_spd, rel_cog_final = calc_rel_spd_cog(osog, ocog, tsog, tcog)
-
-            # 10. 返回结果（参考main.py第248-264行）
-            # 注意：返回的brg是rel_cog（第242行），dist是输入的dist（第257行）
-            # 不要重新计算真实方位！
-            return {
-                'olat': olat,
-                'olon': olon,
-                'tlat': tlat,
-                'tlon': tlon,
-                'osog': osog,
-                'ocog': ocog,
-                'tsog': tsog,
-                'tcog': tcog,
-                'dist': dist,
-                'brg': brg,
-                'relbrg': relbrg,
-                'rel_cog': rel_cog_final,
-                'rel_spd': rel_spd,
-                'TCPA': TCPA,
-                'DCPA': DCPA,
-                'meeting_type': meeting_config['name']
-            }
+load_config()
 
-    # 如果所有尝试都失败，返回None
-    return None
 
+def is_store_file(file_path):
+    return file_path.lower().endswith(STORE_SUFFIX)
 
-def gen_tship_no_danger(oship, meeting_config, sog_min, sog_max):
-    """
-    生成无碰撞危险的目标船
-    """
-    olat = oship['lat']
-    olon = oship['lon']
-    osog = oship['sog']
-    ocog = oship['cog']
-
-    rel_brg_min = meeting_config['rel_brg_min']
-    rel_brg_max = meeting_config['rel_brg_max']
-    dist_min = meeting_config['dist_min']
-    dist_max = meeting_config['dist_max']
-
-    if rel_brg_max < rel_brg_min:
-        if random.random() < 0.5:
-            relbrg = random.uniform(rel_brg_min, 360.0)
-        else:
-            relbrg = random.uniform(0.0, rel_brg_max)
-    else:
-        relbrg = random.uniform(rel_brg_min, rel_brg_max)
-    relbrg = mod360(relbrg)
-    dist = random.uniform(dist_min, dist_max)
-    tsog = random.uniform(sog_min, sog_max)
-
-    tcog = mod360(ocog + relbrg + 180.0)
-    rel_spd, rel_cog = calc_rel_spd_cog(osog, ocog, tsog, tcog)
-
-    # 使用较大的delta值使DCPA较大
-    delta = random.uniform(90, 180) * random.choice([-1, 1])
-
-    brg = mod360((rel_cog - 180.0) + delta)
-    tlat, tlon = georef.ll_gc_ll(olat, olon, brg, dist)
-
-    TCPA, DCPA = calc_CPA(olat, olon, tlat, tlon, osog, tsog, ocog, tcog)
-    real_dist, real_brg = georef.DistanceBearingMercator(olat, olon, tlat, tlon)
-
-    return {
-        'olat': olat,
-        'olon': olon,
-        'tlat': tlat,
-        'tlon': tlon,
-        'osog': osog,
-        'ocog': ocog,
-        'tsog': tsog,
-        'tcog': tcog,
-        'dist': real_dist,
-        'brg': real_brg,
-        'relbrg': relbrg,
-        'rel_cog': rel_cog,
-        'rel_spd': rel_spd,
-        'TCPA': TCPA,
-        'DCPA': DCPA,
-        'meeting_type': meeting_config['name'],
-        'delta': delta
-    }
-
-
-def generate_scenario(target_num, osog_min=10.0, osog_max=20.0,
-                     tsog_min=10.0, tsog_max=20.0,
-                     lat=31.0, lon=123.0,
-                     meeting_type_counts=None):
-    """
-    生成完整场景
-
-    Args:
-        target_num: 目标船数量
-        osog_min/max: 本船速度范围
-        tsog_min/max: 目标船速度范围
-        lat/lon: 初始位置
-        meeting_type_counts: 指定各会遇类型数量的字典 {meeting_type_id: count}
-    """
-    oship = gen_oship(lat, lon, osog_min, osog_max)
-
-    target_configs = []
-
-    if meeting_type_counts:
-        for meeting_id, count in meeting_type_counts.items():
-            meeting_config = next((m for m in meeting_situations if m['id'] == meeting_id), None)
-            if meeting_config:
-                target_configs.extend([meeting_config] * count)
-    else:
-        available_types = meeting_situations.copy()
-        random.shuffle(available_types)
-
-        for i in range(target_num):
-            if i < len(available_types):
-                target_configs.append(available_types[i])
-            else:
-                target_configs.append(random.choice(meeting_situations))
-
-    targets = []
-    for i, config in enumerate(target_configs[:target_num]):
-        max_attempts = 100
-        for attempt in range(max_attempts):
-            if config['name'] == '没有危险':
-                target = gen_tship_no_danger(oship, config, tsog_min, tsog_max)
-            else:
-                target = gen_tship(oship, config, tsog_min, tsog_max)
-
-            if target is None:
-                continue
 
-            valid = True
-            for existing in targets:
-                dist_between = georef.DistGreatCircle(
-                    target['tlat'], target['tlon'],
-                    existing['tlat'], existing['tlon']
-                )
-                if dist_between < 1.0:
-                    valid = False
-                    break
+def is_library_file(file_path):
+    return file_path.lower().endswith(LIBRARY_SUFFIX)
 
-            if valid:
-                target['id'] = i + 1
-                targets.append(target)
-                break
 
-        if len(targets) <= i:
-            return None
-
-    return {
-        'ownship': oship,
-        'targets': targets,
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    }
+class PolarPlotWidget(QWidget):
+    """
+    极坐标绘图控件
 
+    网格、船舶和图例分别预先绘制成透明图层(QPixmap)并按比例尺缓存.
+    图层以本船为原点, 覆盖可见区域并向四周多画一部分, 因此拖拽时只需
+    按偏移量贴图; 缩放时回到用过的比例尺也不必重新绘制.
+    """
 
-class PolarPlotWidget(QWidget):
-    """极坐标绘图控件"""
+    # 每类图层缓存的比例尺数量
+    LAYER_CACHE_SIZE = 4
+    # 图层在可见区域四周多画出的部分(占控件宽高的比例), 拖拽不超出时直接贴图
+    PAN_MARGIN = 0.25
+    # 图层超过这个像素数时不再缓存, 直接绘制
+    MAX_LAYER_PIXELS = 4096 * 4096
+    # 图例所在区域
+    LEGEND_RECT = QRectF(0, 0, 170, 130)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -416,9 +76,13 @@ class PolarPlotWidget(QWidget):
         self.offset_y = 0
         self.last_mouse_pos = None
         self.setMouseTracking(True)
+        self.grid_layers = OrderedDict()
+        self.ship_layers = OrderedDict()
+        self.legend_layer = None
 
     def set_scenario(self, scenario):
         self.scenario = scenario
+        self.ship_layers.clear()
         # 自动计算最大缩放：让6海里的圆填满画布
         # 留出边距：图例、标签等需要空间
         max_range = 6.5  # 6海里 + 0.5海里标签空间
@@ -461,18 +125,74 @@ class PolarPlotWidget(QWidget):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
 
-        center_x = self.width() / 2 + self.offset_x
-        center_y = self.height() / 2 + self.offset_y
+        center = QPointF(self.width() / 2 + self.offset_x,
+                         self.height() / 2 + self.offset_y)
+        dpr = self.devicePixelRatioF()
+        # 中心坐标的小数部分也作为键, 保证贴图位置落在整像素上
+        key = (round(self.scale, 6), dpr, center.x() % 1, center.y() % 1)
 
         painter.fillRect(self.rect(), QColor(240, 248, 255))
-        self.draw_polar_grid(painter, center_x, center_y)
-        self.draw_ownship(painter, center_x, center_y)
+        self.draw_layer(painter, center, self.view_layer(
+            self.grid_layers, key, center, self.draw_polar_grid))
+        self.draw_layer(painter, center, self.view_layer(
+            self.ship_layers, key, center, self.draw_ships))
+
+        if self.legend_layer is None or self.legend_layer[0] != dpr:
+            self.legend_layer = (dpr, self.render_layer(
+                lambda p, cx, cy: self.draw_legend(p), self.LEGEND_RECT))
+        self.draw_layer(painter, QPointF(0, 0), self.legend_layer[1])
+
+    def view_layer(self, cache, key, center, draw):
+        """取出覆盖当前可见区域的缓存图层, 没有时重新绘制"""
+        view = QRectF(self.rect()).translated(-center)
+        layer = cache.get(key)
+        if layer is not None and layer[0].contains(view):
+            cache.move_to_end(key)
+            return layer
+        mx = int(self.width() * self.PAN_MARGIN)
+        my = int(self.height() * self.PAN_MARGIN)
+        layer = cache[key] = self.render_layer(draw, view.adjusted(-mx, -my, mx, my))
+        if len(cache) > self.LAYER_CACHE_SIZE:
+            cache.popitem(last=False)
+        return layer
+
+    def render_layer(self, draw, rect):
+        """
+        把draw(painter, cx, cy)在rect范围内绘制的内容画到透明位图上, 返回(rect, 位图, draw)
 
-        for target in self.scenario['targets']:
-            self.draw_target(painter, center_x, center_y, target)
-            self.draw_relative_motion_line(painter, center_x, center_y, target)
+        rect是相对原点的坐标. 绘制时直接使用位图坐标而不是平移painter,
+        各draw函数中int()取整的结果才与直接画在控件上一致.
+        rect太大时不生成位图, 位图为None, 绘制时直接调用draw.
+        """
+        dpr = self.devicePixelRatioF()
+        width = math.ceil(rect.width() * dpr)
+        height = math.ceil(rect.height() * dpr)
+        if width * height > self.MAX_LAYER_PIXELS:
+            return rect, None, draw
+
+        pixmap = QPixmap(width, height)
+        pixmap.setDevicePixelRatio(dpr)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        draw(painter, -rect.x(), -rect.y())
+        painter.end()
+        return rect, pixmap, draw
+
+    def draw_layer(self, painter, origin, layer):
+        rect, pixmap, draw = layer
+        if pixmap is not None:
+            painter.drawPixmap(origin + rect.topLeft(), pixmap)
+            return
+        painter.save()
+        draw(painter, origin.x(), origin.y())
+        painter.restore()
 
-        self.draw_legend(painter)
+    def draw_ships(self, painter, cx, cy):
+        self.draw_ownship(painter, cx, cy)
+        for target in self.scenario['targets']:
+            self.draw_target(painter, cx, cy, target)
+            self.draw_relative_motion_line(painter, cx, cy, target)
 
     def draw_polar_grid(self, painter, cx, cy):
         """绘制极坐标网格 - 量程6海里"""
@@ -693,6 +413,238 @@ class PolarPlotWidget(QWidget):
         painter.drawText(legend_x + 25, y_offset, "相对运动线")
 
 
+# 场景表格的列: (表头, 取值函数, 显示格式)
+TABLE_COLUMNS = [
+    ("场景ID", lambda s, t: s['id'], "{}"),
+    ("时间戳", lambda s, t: s['timestamp'], "{}"),
+    ("目标船数", lambda s, t: len(s['targets']), "{}"),
+    ("本船纬度", lambda s, t: s['ownship']['lat'], "{:.6f}"),
+    ("本船经度", lambda s, t: s['ownship']['lon'], "{:.6f}"),
+    ("本船SOG", lambda s, t: s['ownship']['sog'], "{:.2f}"),
+    ("本船COG", lambda s, t: s['ownship']['cog'], "{:.2f}"),
+    ("目标船ID", lambda s, t: t['id'], "{}"),
+    ("会遇类型", lambda s, t: t['meeting_type'], "{}"),
+    ("目标船纬度", lambda s, t: t['tlat'], "{:.6f}"),
+    ("目标船经度", lambda s, t: t['tlon'], "{:.6f}"),
+    ("目标船SOG", lambda s, t: t['tsog'], "{:.2f}"),
+    ("目标船COG", lambda s, t: t['tcog'], "{:.2f}"),
+    ("TCPA(min)", lambda s, t: t['TCPA'], "{:.2f}"),
+    ("DCPA(NM)", lambda s, t: t['DCPA'], "{:.2f}"),
+]
+
+
+class ScenarioRows:
+    """
+    把场景列表展开成每条目标船一行, row(i)返回(scenario, target)
+
+    ScenarioTableModel只使用len()、row(i)和按顺序遍历(场景, 目标船), 其他数据源
+    提供这些方法即可显示在表格中
+    """
+
+    def __init__(self, scenarios=()):
+        self.scenarios = []
+        self._offsets = []  # 每个场景第一行的行号
+        self._count = 0
+        self.extend(scenarios)
+
+    def extend(self, scenarios):
+        for scenario in scenarios:
+            if not scenario['targets']:
+                continue
+            self.scenarios.append(scenario)
+            self._offsets.append(self._count)
+            self._count += len(scenario['targets'])
+
+    def __len__(self):
+        return self._count
+
+    def row(self, i):
+        k = bisect.bisect_right(self._offsets, i) - 1
+        scenario = self.scenarios[k]
+        return scenario, scenario['targets'][i - self._offsets[k]]
+
+    def __iter__(self):
+        for scenario in self.scenarios:
+            for target in scenario['targets']:
+                yield scenario, target
+
+
+class ScenarioTableModel(QAbstractTableModel):
+    """场景表格模型, 只在显示时格式化单元格, Qt.UserRole返回用于排序的原始值"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.source = ScenarioRows()
+        self._order = None  # 排序后的行号, None表示原始顺序
+
+    def set_source(self, source):
+        self.beginResetModel()
+        self.source = source
+        self._order = None
+        self.endResetModel()
+
+    def set_scenarios(self, scenarios):
+        self.set_source(ScenarioRows(scenarios))
+
+    def append_scenarios(self, scenarios):
+        first = len(self.source)
+        count = sum(len(s['targets']) for s in scenarios)
+        if count == 0:
+            return
+        self.beginInsertRows(QModelIndex(), first, first + count - 1)
+        self.source.extend(scenarios)
+        if self._order is not None:
+            self._order.extend(range(first, first + count))
+        self.endInsertRows()
+
+    def source_row(self, row):
+        """表格中的行对应的数据源行号"""
+        if self._order is not None:
+            return self._order[row]
+        return row
+
+    def row_data(self, row):
+        return self.source.row(self.source_row(row))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.source)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(TABLE_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return TABLE_COLUMNS[section][0]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role not in (Qt.DisplayRole, Qt.UserRole) or not index.isValid():
+            return None
+        scenario, target = self.row_data(index.row())
+        header, getter, fmt = TABLE_COLUMNS[index.column()]
+        value = getter(scenario, target)
+        if role == Qt.UserRole:
+            return value
+        return fmt.format(value)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        getter = TABLE_COLUMNS[column][1]
+        # 顺序遍历取出所有值, 按需读取的数据源逐行row(i)很慢
+        keys = [getter(scenario, target) for scenario, target in self.source]
+
+        self.beginResetModel()
+        self._order = sorted(range(len(keys)), key=keys.__getitem__,
+                             reverse=(order == Qt.DescendingOrder))
+        self.endResetModel()
+
+
+class ScenarioProxyModel(QSortFilterProxyModel):
+    """
+    表格的排序和筛选, 只在设置了筛选条件时放在表格和ScenarioTableModel之间
+
+    排序交给ScenarioTableModel用Python完成, 筛选结果按数据源的行号缓存, 排序后不需要重新筛选.
+    两者都不经过data(), 行数很多时也很快
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._filter_text = ''
+        self._filter_column = -1
+        self._accepted = None
+        self._accepted_source = None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column >= 0:
+            self.sourceModel().sort(column, order)
+
+    def set_filter(self, text, column=-1):
+        """筛选任一列(column为-1)或指定列中包含text的行, 不区分大小写"""
+        self._filter_text = text.strip().lower()
+        self._filter_column = column
+        self._accepted = None
+        # invalidateFilter逐段删除/插入行, 筛选掉的行分散时很慢, 重建映射更快
+        self.invalidate()
+
+    def _row_matches(self, scenario, target):
+        if self._filter_column < 0:
+            columns = TABLE_COLUMNS
+        else:
+            columns = TABLE_COLUMNS[self._filter_column:self._filter_column + 1]
+        return any(self._filter_text in fmt.format(getter(scenario, target)).lower()
+                   for header, getter, fmt in columns)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self._filter_text:
+            return True
+        model = self.sourceModel()
+        source = model.source
+        if self._accepted is None or self._accepted_source is not source:
+            self._accepted = bytearray()
+            self._accepted_source = source
+        i = model.source_row(source_row)
+        if i >= len(self._accepted):
+            # 第一次筛选时顺序遍历全部行, 之后只检查追加的行
+            if self._accepted:
+                rows = (source.row(j) for j in range(len(self._accepted), len(source)))
+            else:
+                rows = iter(source)
+            self._accepted.extend(self._row_matches(*row) for row in rows)
+        return bool(self._accepted[i])
+
+
+class GenerateWorker(QThread):
+    """
+    后台生成场景的线程, 通过batch_generate.iter_scenarios使用进程池并行生成
+
+    生成的场景每隔一段时间成批通过scenarios_ready发出, 避免逐个更新界面.
+    requestInterruption()后在收到下一个结果时停止, 同时终止进程池.
+    进程池用spawn方式启动, 避免在多线程的界面进程中fork
+    """
+
+    scenarios_ready = pyqtSignal(list)
+    progress = pyqtSignal(int, int)
+    error = pyqtSignal(str)
+
+    # 少量场景时进程池的启动时间比生成还长, 直接在线程中生成
+    SERIAL_LIMIT = 50
+    EMIT_INTERVAL = 0.1
+
+    def __init__(self, count, kwargs, master_seed=None, parent=None):
+        super().__init__(parent)
+        self.count = count
+        self.kwargs = kwargs
+        self.master_seed = master_seed
+
+    def run(self):
+        workers = 1 if self.count < self.SERIAL_LIMIT else None
+        batch = []
+        done = 0
+        last_emit = time.monotonic()
+        results = batch_generate.iter_scenarios(
+            self.count, workers, chunksize=4, master_seed=self.master_seed,
+            context='spawn', **self.kwargs)
+        try:
+            for index, scenario in results:
+                if self.isInterruptionRequested():
+                    break
+                done += 1
+                if scenario:
+                    batch.append(scenario)
+                now = time.monotonic()
+                if now - last_emit >= self.EMIT_INTERVAL:
+                    self.scenarios_ready.emit(batch)
+                    self.progress.emit(done, self.count)
+                    batch = []
+                    last_emit = now
+        except Exception as e:
+            self.error.emit(f"生成场景时出错: {str(e)}\n\n详细信息:\n{traceback.format_exc()}")
+        finally:
+            results.close()
+        if batch:
+            self.scenarios_ready.emit(batch)
+        self.progress.emit(done, self.count)
+
+
 class ScenarioGeneratorMainWindow(QMainWindow):
     """场景生成器主窗口"""
 
@@ -700,6 +652,8 @@ class ScenarioGeneratorMainWindow(QMainWindow):
         super().__init__()
         self.current_scenarios = []
         self.current_file_path = None
+        self.worker = None
+        self.generation_canceled = False
         self.init_ui()
 
     def init_ui(self):
@@ -910,18 +864,46 @@ class ScenarioGeneratorMainWindow(QMainWindow):
         return panel
 
     def create_table_widget(self):
-        table = QTableWidget()
-        table.setColumnCount(15)
-        table.setHorizontalHeaderLabels([
-            "场景ID", "时间戳", "目标船数", "本船纬度", "本船经度",
-            "本船SOG", "本船COG", "目标船ID", "会遇类型",
-            "目标船纬度", "目标船经度", "目标船SOG", "目标船COG",
-            "TCPA(min)", "DCPA(NM)"
-        ])
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("筛选:"))
+        self.filter_column_combo = QComboBox()
+        self.filter_column_combo.addItem("全部列")
+        self.filter_column_combo.addItems([col[0] for col in TABLE_COLUMNS])
+        self.filter_column_combo.currentIndexChanged.connect(self.on_filter_changed)
+        filter_layout.addWidget(self.filter_column_combo)
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("输入文字筛选表格")
+        self.filter_edit.setClearButtonEnabled(True)
+        # 输入停止一段时间后再筛选, 避免每输入一个字都重新筛选全部行
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(300)
+        self.filter_timer.timeout.connect(self.on_filter_changed)
+        self.filter_edit.textChanged.connect(self.filter_timer.start)
+        filter_layout.addWidget(self.filter_edit)
+        layout.addLayout(filter_layout)
+
+        self.table_model = ScenarioTableModel(self)
+        # 代理模型只在筛选时使用: 重置模型时代理会对每一行调用filterAcceptsRow,
+        # 百万行要一秒多
+        self.table_proxy = ScenarioProxyModel(self)
+
+        table = QTableView()
+        self.table_view = table
+        self.set_table_model(self.table_model)
+        table.setSortingEnabled(True)
+        table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
         table.horizontalHeader().setStretchLastSection(True)
-        table.setSelectionBehavior(QTableWidget.SelectRows)
-        table.itemSelectionChanged.connect(self.on_table_selection_changed)
-        return table
+        # 列宽只根据前面的部分行计算, 行高固定, 行数很多时也不需要逐行计算
+        table.horizontalHeader().setResizeContentsPrecision(100)
+        table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        table.setSelectionBehavior(QTableView.SelectRows)
+        layout.addWidget(table)
+        return widget
 
     def create_preview_widget(self):
         widget = QWidget()
@@ -999,6 +981,8 @@ class ScenarioGeneratorMainWindow(QMainWindow):
         help_menu.addAction(manual_action)
 
     def generate_scenarios(self):
+        if self.worker is not None:
+            return
         try:
             ship_count = self.ship_count_combo.currentIndex() + 2
             scenario_count = self.scenario_count_spin.value()
@@ -1028,83 +1012,121 @@ class ScenarioGeneratorMainWindow(QMainWindow):
                 if total_specified == 0:
                     meeting_type_counts = None
 
-            self.current_scenarios = []
-            progress = QProgressDialog("正在生成场景...", "取消", 0, scenario_count, self)
-            progress.setWindowModality(Qt.WindowModal)
-
-            success_count = 0
-            for i in range(scenario_count):
-                if progress.wasCanceled():
-                    break
-
-                progress.setValue(i)
-                QApplication.processEvents()
-
-                scenario = generate_scenario(
-                    ship_count - 1,
-                    osog_min, osog_max,
-                    tsog_min, tsog_max,
-                    lat, lon,
-                    meeting_type_counts
-                )
-
-                if scenario:
-                    scenario['id'] = i + 1
-                    self.current_scenarios.append(scenario)
-                    success_count += 1
-
-            progress.setValue(scenario_count)
-
-            self.update_table()
+            kwargs = {
+                'target_num': ship_count - 1,
+                'osog_min': osog_min,
+                'osog_max': osog_max,
+                'tsog_min': tsog_min,
+                'tsog_max': tsog_max,
+                'lat': lat,
+                'lon': lon,
+                'meeting_type_counts': meeting_type_counts,
+            }
+            self.master_seed = random.SystemRandom().getrandbits(32)
 
-            self.statusBar().showMessage(f"成功生成 {success_count}/{scenario_count} 个场景")
-            QMessageBox.information(self, "完成", f"成功生成 {success_count} 个场景")
+            self.current_scenarios = []
+            self.table_model.set_scenarios([])
+            self.gen_button.setEnabled(False)
+            self.generation_canceled = False
+
+            self.progress_dialog = QProgressDialog("正在生成场景...", "取消", 0, scenario_count, self)
+            self.progress_dialog.setWindowModality(Qt.WindowModal)
+            self.progress_dialog.setMinimumDuration(0)
+            self.progress_dialog.canceled.connect(self.stop_generation)
+
+            self.worker = GenerateWorker(scenario_count, kwargs, self.master_seed, self)
+            self.worker.scenarios_ready.connect(self.on_scenarios_ready)
+            self.worker.progress.connect(self.on_generate_progress)
+            self.worker.error.connect(lambda msg: QMessageBox.critical(self, "错误", msg))
+            self.worker.finished.connect(self.on_generate_finished)
+            self.worker.start()
 
         except Exception as e:
-            import traceback
             error_msg = f"生成场景时出错: {str(e)}\n\n详细信息:\n{traceback.format_exc()}"
             print(error_msg)
             QMessageBox.critical(self, "错误", error_msg)
 
-    def update_table(self):
-        self.table_widget.setRowCount(0)
+    def stop_generation(self):
+        if self.worker is not None:
+            # 线程结束后isInterruptionRequested()总是返回False, 取消状态另外记录
+            self.generation_canceled = True
+            self.worker.requestInterruption()
+
+    def on_scenarios_ready(self, scenarios):
+        self.current_scenarios.extend(scenarios)
+        self.table_model.append_scenarios(scenarios)
+        # 没有选中场景时预览最新生成的场景
+        if not self.table_view.selectionModel().hasSelection():
+            self.polar_plot.set_scenario(scenarios[-1])
+            self.update_info_panel(scenarios[-1])
+
+    def on_generate_progress(self, done, total):
+        if self.worker is None:
+            return
+        self.statusBar().showMessage(f"正在生成 {done}/{total}")
+        # 模态的QProgressDialog在setValue中会处理事件, 可能在这里执行on_generate_finished
+        self.progress_dialog.setValue(done)
+
+    def on_generate_finished(self):
+        canceled = self.generation_canceled
+        scenario_count = self.worker.count
+        self.worker.deleteLater()
+        self.worker = None
+        self.progress_dialog.canceled.disconnect(self.stop_generation)
+        self.progress_dialog.close()
+        self.gen_button.setEnabled(True)
+
+        # 进程池按完成顺序返回结果, 结束后按场景ID排序
+        self.current_scenarios.sort(key=lambda s: s['id'])
+        self.update_table()
+
+        success_count = len(self.current_scenarios)
+        status = "已取消, " if canceled else ""
+        self.statusBar().showMessage(
+            f"{status}成功生成 {success_count}/{scenario_count} 个场景 (主随机种子: {self.master_seed})")
+        if not canceled:
+            QMessageBox.information(self, "完成", f"成功生成 {success_count} 个场景")
 
-        for scenario in self.current_scenarios:
-            ownship = scenario['ownship']
-            for target in scenario['targets']:
-                row = self.table_widget.rowCount()
-                self.table_widget.insertRow(row)
-
-                self.table_widget.setItem(row, 0, QTableWidgetItem(str(scenario['id'])))
-                self.table_widget.setItem(row, 1, QTableWidgetItem(scenario['timestamp']))
-                self.table_widget.setItem(row, 2, QTableWidgetItem(str(len(scenario['targets']))))
-                self.table_widget.setItem(row, 3, QTableWidgetItem(f"{ownship['lat']:.6f}"))
-                self.table_widget.setItem(row, 4, QTableWidgetItem(f"{ownship['lon']:.6f}"))
-                self.table_widget.setItem(row, 5, QTableWidgetItem(f"{ownship['sog']:.2f}"))
-                self.table_widget.setItem(row, 6, QTableWidgetItem(f"{ownship['cog']:.2f}"))
-                self.table_widget.setItem(row, 7, QTableWidgetItem(str(target['id'])))
-                self.table_widget.setItem(row, 8, QTableWidgetItem(target['meeting_type']))
-                self.table_widget.setItem(row, 9, QTableWidgetItem(f"{target['tlat']:.6f}"))
-                self.table_widget.setItem(row, 10, QTableWidgetItem(f"{target['tlon']:.6f}"))
-                self.table_widget.setItem(row, 11, QTableWidgetItem(f"{target['tsog']:.2f}"))
-                self.table_widget.setItem(row, 12, QTableWidgetItem(f"{target['tcog']:.2f}"))
-                self.table_widget.setItem(row, 13, QTableWidgetItem(f"{target['TCPA']:.2f}"))
-                self.table_widget.setItem(row, 14, QTableWidgetItem(f"{target['DCPA']:.2f}"))
-
-        self.table_widget.resizeColumnsToContents()
+    def update_table(self, source=None):
+        """显示current_scenarios, 或者直接显示提供len()/row(i)的数据源"""
+        if source is None:
+            self.table_model.set_scenarios(self.current_scenarios)
+        else:
+            self.table_model.set_source(source)
+        self.table_view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table_view.resizeColumnsToContents()
+
+    def set_table_model(self, model):
+        if self.table_view.model() is model:
+            return
+        self.table_view.setModel(model)
+        self.table_view.selectionModel().selectionChanged.connect(
+            self.on_table_selection_changed)
+
+    def on_filter_changed(self):
+        text = self.filter_edit.text()
+        proxy = self.table_proxy
+        proxy.set_filter(text, self.filter_column_combo.currentIndex() - 1)
+        if text.strip():
+            if proxy.sourceModel() is not self.table_model:
+                proxy.setSourceModel(self.table_model)
+            self.set_table_model(proxy)
+        else:
+            self.set_table_model(self.table_model)
+            proxy.setSourceModel(None)
 
     def on_table_selection_changed(self):
-        selected_rows = self.table_widget.selectedIndexes()
+        selected_rows = self.table_view.selectionModel().selectedRows()
         if not selected_rows:
             return
 
-        row = selected_rows[0].row()
-        scenario_id = int(self.table_widget.item(row, 0).text())
-
-        scenario = next((s for s in self.current_scenarios if s['id'] == scenario_id), None)
-        if scenario:
-            self.polar_plot.set_scenario(scenario)
-            self.update_info_panel(scenario)
+        index = selected_rows[0]
+        if self.table_view.model() is self.table_proxy:
+            index = self.table_proxy.mapToSource(index)
+        row = index.row()
+        scenario, target = self.table_model.row_data(row)
+        self.polar_plot.set_scenario(scenario)
+        self.update_info_panel(scenario)
 
     def update_info_panel(self, scenario):
         ownship = scenario['ownship']
@@ -1157,7 +1179,7 @@ class ScenarioGeneratorMainWindow(QMainWindow):
 
     def save_file(self):
         if self.current_file_path:
-            self.save_to_csv(self.current_file_path)
+            self.save_scenarios(self.current_file_path)
         else:
             self.save_file_as()
 
@@ -1166,54 +1188,31 @@ class ScenarioGeneratorMainWindow(QMainWindow):
             QMessageBox.warning(self, "警告", "没有可保存的场景数据")
             return
 
-        file_path, _ = QFileDialog.getSaveFileName(
-            self, "保存场景数据", "", "CSV文件 (*.csv)"
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "保存场景数据", "",
+            f"CSV文件 (*.csv);;场景库 (*{STORE_SUFFIX});;SQLite场景库(追加) (*{LIBRARY_SUFFIX})"
         )
 
         if file_path:
-            self.save_to_csv(file_path)
-            self.current_file_path = file_path
-
-    def save_to_csv(self, file_path):
+            if STORE_SUFFIX in selected_filter and not is_store_file(file_path):
+                file_path += STORE_SUFFIX
+            if LIBRARY_SUFFIX in selected_filter and not is_library_file(file_path):
+                file_path += LIBRARY_SUFFIX
+            self.save_scenarios(file_path)
+            # 加入SQLite场景库不改变当前文件, 之后的"保存"不会重复加入
+            if not is_library_file(file_path):
+                self.current_file_path = file_path
+
+    def save_scenarios(self, file_path):
+        """按文件后缀保存为CSV或场景库, .db文件把场景加入SQLite场景库"""
         try:
-            with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-
-                writer.writerow([
-                    "场景ID", "时间戳", "目标船数", "本船纬度", "本船经度",
-                    "本船SOG(节)", "本船COG(度)", "目标船ID", "会遇类型",
-                    "目标船纬度", "目标船经度", "目标船SOG(节)", "目标船COG(度)",
-                    "距离(海里)", "方位(度)", "TCPA(分钟)", "DCPA(海里)",
-                    "相对速度(节)", "相对航向(度)", "危险状态"
-                ])
-
-                for scenario in self.current_scenarios:
-                    ownship = scenario['ownship']
-                    for target in scenario['targets']:
-                        danger = "危险" if (target['TCPA'] >= 0 and target['DCPA'] <= SAFE_DCPA) else "安全"
-
-                        writer.writerow([
-                            scenario['id'],
-                            scenario['timestamp'],
-                            len(scenario['targets']),
-                            f"{ownship['lat']:.6f}",
-                            f"{ownship['lon']:.6f}",
-                            f"{ownship['sog']:.2f}",
-                            f"{ownship['cog']:.2f}",
-                            target['id'],
-                            target['meeting_type'],
-                            f"{target['tlat']:.6f}",
-                            f"{target['tlon']:.6f}",
-                            f"{target['tsog']:.2f}",
-                            f"{target['tcog']:.2f}",
-                            f"{target['dist']:.2f}",
-                            f"{target['brg']:.2f}",
-                            f"{target['TCPA']:.2f}",
-                            f"{target['DCPA']:.2f}",
-                            f"{target['rel_spd']:.2f}",
-                            f"{target['rel_cog']:.2f}",
-                            danger
-                        ])
+            if is_store_file(file_path):
+                save_store(file_path, self.current_scenarios)
+            elif is_library_file(file_path):
+                with ScenarioLibrary(file_path) as lib:
+                    lib.add(self.current_scenarios)
+            else:
+                save_pro_csv(file_path, self.current_scenarios)
 
             self.statusBar().showMessage(f"文件已保存: {file_path}")
             QMessageBox.information(self, "成功", f"场景数据已保存到:\n{file_path}")
@@ -1223,61 +1222,44 @@ class ScenarioGeneratorMainWindow(QMainWindow):
 
     def open_file(self):
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "打开场景数据", "", "CSV文件 (*.csv)"
+            self, "打开场景数据", "",
+            f"场景文件 (*.csv *{STORE_SUFFIX});;CSV文件 (*.csv);;场景库 (*{STORE_SUFFIX})"
         )
 
         if file_path:
-            self.load_from_csv(file_path)
+            self.wait_generation()
+            if is_store_file(file_path):
+                self.load_from_store(file_path)
+            else:
+                self.load_from_csv(file_path)
             self.current_file_path = file_path
 
+    def load_from_store(self, file_path):
+        """打开场景库, 各列内存映射, 表格按需从中读取行"""
+        try:
+            store = load_store(file_path)
+            self.current_scenarios = store
+            self.update_table(store.rows)
+
+            self.statusBar().showMessage(
+                f"已加载 {len(store)} 个场景 ({store.target_count} 条目标船)")
+            QMessageBox.information(self, "成功", f"已从文件加载 {len(store)} 个场景")
+
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"加载文件时出错: {str(e)}")
+
     def load_from_csv(self, file_path):
         try:
-            self.current_scenarios = []
-            scenarios_dict = {}
-
-            with open(file_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-
-                for row in reader:
-                    scenario_id = int(row['场景ID'])
-
-                    if scenario_id not in scenarios_dict:
-                        scenarios_dict[scenario_id] = {
-                            'id': scenario_id,
-                            'timestamp': row['时间戳'],
-                            'ownship': {
-                                'lat': float(row['本船纬度']),
-                                'lon': float(row['本船经度']),
-                                'sog': float(row['本船SOG(节)']),
-                                'cog': float(row['本船COG(度)'])
-                            },
-                            'targets': []
-                        }
-
-                    target = {
-                        'id': int(row['目标船ID']),
-                        'meeting_type': row['会遇类型'],
-                        'tlat': float(row['目标船纬度']),
-                        'tlon': float(row['目标船经度']),
-                        'tsog': float(row['目标船SOG(节)']),
-                        'tcog': float(row['目标船COG(度)']),
-                        'dist': float(row['距离(海里)']),
-                        'brg': float(row['方位(度)']),
-                        'TCPA': float(row['TCPA(分钟)']),
-                        'DCPA': float(row['DCPA(海里)']),
-                        'rel_spd': float(row['相对速度(节)']),
-                        'rel_cog': float(row['相对航向(度)'])
-                    }
-
-                    target['olat'] = scenarios_dict[scenario_id]['ownship']['lat']
-                    target['olon'] = scenarios_dict[scenario_id]['ownship']['lon']
-                    target['osog'] = scenarios_dict[scenario_id]['ownship']['sog']
-                    target['ocog'] = scenarios_dict[scenario_id]['ownship']['cog']
-
-                    scenarios_dict[scenario_id]['targets'].append(target)
-
-            self.current_scenarios = list(scenarios_dict.values())
-            self.update_table()
+            try:
+                # 只建立索引, 场景在表格显示或选中时才解析
+                scenarios = IndexedCSVScenarios(file_path)
+                source = scenarios.rows
+            except ValueError:
+                # 不是本程序导出的格式, 整个读入
+                scenarios = load_pro_csv(file_path)
+                source = None
+            self.current_scenarios = scenarios
+            self.update_table(source)
 
             self.statusBar().showMessage(f"已加载 {len(self.current_scenarios)} 个场景")
             QMessageBox.information(self, "成功", f"已从文件加载 {len(self.current_scenarios)} 个场景")
@@ -1285,7 +1267,19 @@ class ScenarioGeneratorMainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"加载文件时出错: {str(e)}")
 
+    def wait_generation(self):
+        """取消正在进行的生成并等待线程结束"""
+        if self.worker is not None:
+            self.stop_generation()
+            self.worker.wait()
+            QApplication.sendPostedEvents()
+
+    def closeEvent(self, event):
+        self.wait_generation()
+        super().closeEvent(event)
+
     def new_file(self):
+        self.wait_generation()
         if self.current_scenarios:
             reply = QMessageBox.question(
                 self, "确认", "当前有未保存的数据，是否继续？",
@@ -1296,7 +1290,7 @@ class ScenarioGeneratorMainWindow(QMainWindow):
 
         self.current_scenarios = []
         self.current_file_path = None
-        self.table_widget.setRowCount(0)
+        self.table_model.set_scenarios([])
         self.polar_plot.set_scenario(None)
         self.ownship_info_text.clear()
         self.target_info_text.clear()
@@ -1328,6 +1322,7 @@ class ScenarioGeneratorMainWindow(QMainWindow):
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
 
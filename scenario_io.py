@@ -0,0 +1,575 @@
+"""
+场景数据的CSV/XML/SCE/NTO导出和CSV读取
+
+main.py的单场景CSV/XML/SCE/NTO格式和专业版的多场景CSV格式. 场景可以来自生成器,
+逐行格式化后分批写入文件, 内存占用与场景数量无关, 也可以追加到已有文件.
+每行的数值格式化用一个预先拼好的%格式串一次完成, 输出与原来逐字段
+str()/f-string拼接的结果完全相同.
+
+读取专业版CSV时IndexedCSVScenarios只扫描一遍文件建立场景的字节偏移索引,
+场景在访问时才解析, 打开很大的文件也很快.
+"""
+
+import csv
+import functools
+import io
+import itertools
+import json
+import locale
+import os
+import re
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+
+from scenario_generator_pro_new import CSV_HEADERS, SAFE_DCPA
+from scenario_store import SCENARIO_CACHE_SIZE, TargetRows
+
+# 每次写入文件的行数
+WRITE_BATCH = 4096
+# 文件缓冲区大小(字节)
+BUFFER_SIZE = 1 << 20
+# 建立索引时每次扫描的字节数
+INDEX_BLOCK = 1 << 26
+# 场景ID最多的位数
+ID_DIGITS = 18
+
+MAIN_CSV_HEADERS = [
+    'VSOMT',
+    'visibility',
+    'stage',
+    'ownship_behavior',
+    'meeting_situation',
+    'target_behavior',
+    'ownship_lat(dmm)',
+    'ownship_lon(dmm)',
+    'ownship_lat(ddd)',
+    'ownship_lon(ddd)',
+    'target_lat(dmm)',
+    'target_lon(dmm)',
+    'target_lat(ddd)',
+    'target_lon(ddd)',
+    'ownship_sog(KN)',
+    'ownship_cog(deg)',
+    'target_sog(KN)',
+    'target_cog(deg)',
+    'distance(NM)',
+    'relative_bearing(deg)',
+    'DCPA(KN)',
+    'TCPA(min)',
+]
+
+# VSOMT由5个代码直接拼接, 其余字段用逗号分隔, 与原save_to_csv的str()输出相同
+_MAIN_LINE = '%s%s%s%s%s,' + ','.join(['%s'] * 21) + '\n'
+# 相对方位只保留数值部分, 去掉括号内的注释
+_NUMBER_RE = re.compile(r'(\d+\.?\d*)')
+
+# 与csv.writer的默认输出相同: 数值按界面显示精度格式化, 行尾为\r\n.
+# 场景ID到本船COG每个场景只格式化一次
+_PRO_HEAD = '%s,%s,%d,%.6f,%.6f,%.2f,%.2f,'
+_PRO_TARGET = '%s,%s,%.6f,%.6f,%.2f,%.2f,%.2f,%.2f,%.2f,%.2f,%.2f,%.2f,%s,%s\r\n'
+_CSV_SPECIAL = re.compile(r'[,"\r\n]')
+
+# 与xml.dom.minidom的writexml(addindent='\t', newl='\n')输出相同
+_XML_HEAD = '<?xml version="1.0" encoding="utf8"?>\n'
+_XML_TARGET = (
+    '\t<target%s>\n'
+    '\t\t<VSOMT>%s%s%s%s%s</VSOMT>\n'
+    '\t\t<visibility>%s</visibility>\n'
+    '\t\t<stage>%s</stage>\n'
+    '\t\t<ownship_behavior>%s</ownship_behavior>\n'
+    '\t\t<meeting_situation>%s</meeting_situation>\n'
+    '\t\t<target_behavior>%s</target_behavior>\n'
+    '\t\t<ownship_lat>%s</ownship_lat>\n'
+    '\t\t<ownship_lon>%s</ownship_lon>\n'
+    '\t\t<ownship_lat_raw>%s</ownship_lat_raw>\n'
+    '\t\t<ownship_lon_raw>%s</ownship_lon_raw>\n'
+    '\t\t<target_lat>%s</target_lat>\n'
+    '\t\t<target_lon>%s</target_lon>\n'
+    '\t\t<target_lat_raw>%s</target_lat_raw>\n'
+    '\t\t<target_lon_raw>%s</target_lon_raw>\n'
+    '\t\t<ownship_sog>%.2f</ownship_sog>\n'
+    '\t\t<ownship_cog>%.2f</ownship_cog>\n'
+    '\t\t<target_sog>%.2f</target_sog>\n'
+    '\t\t<target_cog>%.2f</target_cog>\n'
+    '\t\t<distance>%.2f</distance>\n'
+    '\t\t<relative_bearing>%.2f</relative_bearing>\n'
+    '\t\t<DCPA>%.2f</DCPA>\n'
+    '\t\t<TCPA>%.2f</TCPA>\n'
+    '\t</target>\n'
+)
+
+
+def to_dmm(ddd):
+    d = int(ddd)
+    m = (ddd-d)*60.0
+    return '%d°%.3f′' % (d, m)
+
+
+@functools.lru_cache(maxsize=4096)
+def csv_field(value):
+    """按csv.writer的QUOTE_MINIMAL规则转换一个字段"""
+    s = str(value)
+    if _CSV_SPECIAL.search(s):
+        return '"%s"' % s.replace('"', '""')
+    return s
+
+
+def xml_text(value):
+    """与minidom相同的文本转义"""
+    return (str(value).replace('&', '&amp;').replace('<', '&lt;')
+            .replace('"', '&quot;').replace('>', '&gt;'))
+
+
+def main_xml_targets(scene, tag_scene=False):
+    """main.py的XML格式: 场景的每条目标船一个<target>元素, tag_scene时带上scene属性"""
+    attr = ' scene="%s"' % xml_text(scene['name']) if tag_scene else ''
+    V = scene['V']
+    visibility = xml_text(V[1])
+    for i, tgt in enumerate(scene['target']):
+        S, O, M, T = scene['S'][i], scene['O'][i], scene['M'][i], scene['T'][i]
+        yield _XML_TARGET % (
+            attr, xml_text(V[0]), xml_text(S[0]), xml_text(O[0]), xml_text(M[0]), xml_text(T[0]),
+            visibility, xml_text(S[1]), xml_text(O[1]), xml_text(M[1]), xml_text(T[1]),
+            tgt['olat'], tgt['olon'], to_dmm(tgt['olat']), to_dmm(tgt['olon']),
+            tgt['tlat'], tgt['tlon'], to_dmm(tgt['tlat']), to_dmm(tgt['tlon']),
+            tgt['osog'], tgt['ocog'], tgt['tsog'], tgt['tcog'],
+            tgt['dist'], tgt['relbrg'], tgt['DCPA'], tgt['TCPA'])
+
+
+def save_main_xml(filepath, scenes, tag_scene=False):
+    """
+    把main.py的场景(可以是生成器)逐个元素写入XML文件, 返回<target>的个数
+
+    只有一个场景时输出与原来用minidom生成的文件完全相同. 多个场景写入同一个
+    文件时用tag_scene=True在每个<target>上记录场景名称.
+    """
+    elements = itertools.chain.from_iterable(
+        main_xml_targets(scene, tag_scene) for scene in scenes)
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'w', encoding='utf8', buffering=BUFFER_SIZE) as f:
+        f.write(_XML_HEAD)
+        first = next(elements, None)
+        if first is None:
+            f.write('<autocollison/>\n')
+            count = 0
+        else:
+            f.write('<autocollison>\n')
+            count = _write_batched(f, itertools.chain([first], elements))
+            f.write('</autocollison>\n')
+    os.replace(tmp_path, filepath)
+    return count
+
+
+def main_csv_lines(scene):
+    """main.py格式: 场景的每条目标船一行"""
+    V = scene['V']
+    for i, tgt in enumerate(scene['target']):
+        S, O, M, T = scene['S'][i], scene['O'][i], scene['M'][i], scene['T'][i]
+        yield _MAIN_LINE % (
+            V[0], S[0], O[0], M[0], T[0],
+            V[1], S[1], O[1], M[1], T[1],
+            to_dmm(tgt['olat']), to_dmm(tgt['olon']), tgt['olat'], tgt['olon'],
+            to_dmm(tgt['tlat']), to_dmm(tgt['tlon']), tgt['tlat'], tgt['tlon'],
+            tgt['osog'], tgt['ocog'], tgt['tsog'], tgt['tcog'], tgt['dist'],
+            _NUMBER_RE.search(str(tgt['relbrg'])).group(1),
+            tgt['DCPA'], tgt['TCPA'])
+
+
+def sce_text(scene, envinfo):
+    """main.py的SCE格式, envinfo为SCEEnvInfoDlg输入的环境信息"""
+    lines = ['env,%s,%.1f,%03d,%.1f,%03d,%.1f,%03d,%d,\n' %
+             (scene['name'], envinfo['wind_speed'], envinfo['wind_dir'],
+              envinfo['current_speed'], envinfo['current_dir'],
+              envinfo['wave_height'], envinfo['wave_dir'],
+              envinfo['rain_snow'])]
+    tgt_list = scene['target']
+    tgt0 = tgt_list[0]
+    lines.append("AIS,111111111,-2,%.8f,%.8f,%.1f,%.1f,0,\n" %
+                 (tgt0['olon'], tgt0['olat'], tgt0['ocog'], tgt0['osog']))
+    for i, tgt in enumerate(tgt_list):
+        mmsi = 0
+        for j in range(9):
+            mmsi += pow(10.0, j) * (i + 2)
+        lines.append("AIS,%d,-1,%.8f,%.8f,%.1f,%.1f,0,\n" %
+                     (mmsi, tgt['tlon'], tgt['tlat'], tgt['tcog'], tgt['tsog']))
+    return ''.join(lines)
+
+
+def nto_text(scene):
+    """main.py的NTO格式(JSON)"""
+    ship_name = 'Bulk carrier 2 (Dis.76800t) bl.'
+    tgt_list = scene['target']
+    tgt0 = tgt_list[0]
+    obj_list = [{
+        'key': ship_name,
+        'name': 'OS 1',
+        'pos': {
+            'lat': tgt0['olat'],
+            'lon': tgt0['olon'],
+            'heading': tgt0['ocog']
+        },
+        'initial_speed': {
+            'longitudinal': tgt0['osog'] * 1852 / 3600,
+            'lateral': 0.0
+        },
+        'mode': 'own'
+    }]
+    for i, tgt in enumerate(tgt_list):
+        obj_list.append({
+            'key': ship_name,
+            'name': 'Tgt %d' % (i+1),
+            'pos': {
+                'lat': tgt['tlat'],
+                'lon': tgt['tlon'],
+                'heading': tgt['tcog']
+            },
+            'initial_speed': {
+                'longitudinal': tgt['tsog'] * 1852 / 3600,
+                'lateral': 0.0
+            },
+            'mode': '3dof'
+        })
+    nto = {'general': {'area': 'Open Sea'}, 'objects': obj_list}
+    return json.dumps(nto, indent='\t')
+
+
+def main_csv_text(scene):
+    """单个场景的完整CSV文件内容, 与save_main_csv的输出相同"""
+    header = ','.join(csv_field(h) for h in MAIN_CSV_HEADERS)
+    return header + '\n' + ''.join(main_csv_lines(scene))
+
+
+def main_xml_text(scene):
+    """单个场景的完整XML文件内容, 与save_main_xml的输出相同"""
+    targets = ''.join(main_xml_targets(scene))
+    if not targets:
+        return _XML_HEAD + '<autocollison/>\n'
+    return _XML_HEAD + '<autocollison>\n' + targets + '</autocollison>\n'
+
+
+def pro_csv_lines(scenario):
+    """专业版格式: 场景的每条目标船一行"""
+    ownship = scenario['ownship']
+    targets = scenario['targets']
+    head = _PRO_HEAD % (
+        csv_field(scenario['id']), csv_field(scenario['timestamp']), len(targets),
+        ownship['lat'], ownship['lon'], ownship['sog'], ownship['cog'])
+    seed = '' if scenario.get('seed') is None else csv_field(scenario['seed'])
+    for target in targets:
+        danger = "危险" if (target['TCPA'] >= 0 and target['DCPA'] <= SAFE_DCPA) else "安全"
+        yield head + _PRO_TARGET % (
+            csv_field(target['id']), csv_field(target['meeting_type']),
+            target['tlat'], target['tlon'], target['tsog'], target['tcog'],
+            target['dist'], target['brg'], target['TCPA'], target['DCPA'],
+            target['rel_spd'], target['rel_cog'], danger, seed)
+
+
+def _write_batched(f, chunks):
+    """把字符串逐批拼接后写入f, 返回个数"""
+    count = 0
+    chunks = iter(chunks)
+    while True:
+        batch = list(itertools.islice(chunks, WRITE_BATCH))
+        if not batch:
+            return count
+        f.write(''.join(batch))
+        count += len(batch)
+
+
+def write_csv(filepath, headers, lines, append=False, newline=None):
+    """
+    把lines逐批写入CSV文件, 返回写入的行数(不含表头)
+
+    lines中每一行已经带有行尾, newline与open()的参数相同.
+    append为True且文件已有内容时追加到末尾, 不再写表头; 已有的表头与
+    headers不同时抛出ValueError, 避免把不同格式的数据写进同一个文件.
+    不追加时先写入临时文件再替换, lines可以来自正在按需读取的同一个文件.
+    """
+    header = ','.join(csv_field(h) for h in headers)
+    append = append and os.path.exists(filepath) and os.path.getsize(filepath) > 0
+    if append:
+        with open(filepath, 'r', encoding='utf-8-sig', newline=newline) as f:
+            existing = f.readline().rstrip('\r\n')
+        if existing != header:
+            raise ValueError('%s 的表头与导出格式不一致, 不能追加' % filepath)
+
+    out_path = filepath if append else filepath + '.tmp'
+    with open(out_path, 'a' if append else 'w', encoding='utf-8-sig',
+              newline=newline, buffering=BUFFER_SIZE) as f:
+        if not append:
+            # 行尾与数据行保持一致
+            f.write(header + ('\r\n' if newline == '' else '\n'))
+        count = _write_batched(f, lines)
+    if not append:
+        os.replace(out_path, filepath)
+    return count
+
+
+def save_main_csv(filepath, scenes, append=False):
+    """把main.py的场景(可以是生成器)写入CSV文件, 返回目标船行数"""
+    lines = itertools.chain.from_iterable(map(main_csv_lines, scenes))
+    return write_csv(filepath, MAIN_CSV_HEADERS, lines, append)
+
+
+def save_pro_csv(filepath, scenarios, append=False):
+    """把专业版场景(可以是生成器)写入CSV文件, 返回目标船行数"""
+    lines = itertools.chain.from_iterable(map(pro_csv_lines, scenarios))
+    return write_csv(filepath, CSV_HEADERS, lines, append, newline='')
+
+
+# 批量导出的格式: 后缀 -> (文件编码, 生成文件内容的函数(scene, envinfo)).
+# 编码与单个导出时open()使用的相同, SCE沿用系统默认编码
+SCENE_FORMATS = OrderedDict([
+    ('csv', ('utf-8-sig', lambda scene, envinfo: main_csv_text(scene))),
+    ('xml', ('utf8', lambda scene, envinfo: main_xml_text(scene))),
+    ('sce', (None, sce_text)),
+    ('nto', ('utf8', lambda scene, envinfo: nto_text(scene))),
+])
+# 文件名中不能使用的字符
+_UNSAFE_NAME = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def scene_file_names(scenes):
+    """场景的文件名(不含后缀), 去掉不能使用的字符, 重名时依次加上_2, _3..."""
+    names = []
+    used = set()
+    for scene in scenes:
+        base = _UNSAFE_NAME.sub('_', str(scene['name'])).strip(' .') or 'scene'
+        name = base
+        n = 1
+        while name.lower() in used:
+            n += 1
+            name = '%s_%d' % (base, n)
+        used.add(name.lower())
+        names.append(name)
+    return names
+
+
+def scene_file_bytes(fmt, scene, envinfo=None):
+    """单个场景导出为fmt格式的文件内容, 换行与文本模式open()写入的相同"""
+    encoding, text = SCENE_FORMATS[fmt]
+    if encoding is None:
+        encoding = locale.getpreferredencoding(False)
+    data = text(scene, envinfo)
+    if os.linesep != '\n':
+        data = data.replace('\n', os.linesep)
+    return data.encode(encoding)
+
+
+def export_scenes(target, scenes, formats, envinfo=None, as_zip=False):
+    """
+    把每个场景按formats中的各个格式分别导出为一个文件, 每导出一个场景产出一次已完成的个数
+
+    as_zip为False时target为目录(不存在时创建), 文件直接写入目录; 否则target为
+    zip文件, 整个导出过程只打开一次, 先写入临时文件, 全部完成后再替换, 中途
+    出错或关闭生成器(取消)时删除临时文件. 导出SCE时需要envinfo.
+    """
+    scenes = list(scenes)
+    names = scene_file_names(scenes)
+    if not as_zip:
+        os.makedirs(target, exist_ok=True)
+        for done, (name, scene) in enumerate(zip(names, scenes), 1):
+            for fmt in formats:
+                with open(os.path.join(target, '%s.%s' % (name, fmt)), 'wb') as f:
+                    f.write(scene_file_bytes(fmt, scene, envinfo))
+            yield done
+        return
+
+    tmp_path = target + '.tmp'
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for done, (name, scene) in enumerate(zip(names, scenes), 1):
+                for fmt in formats:
+                    zf.writestr('%s.%s' % (name, fmt), scene_file_bytes(fmt, scene, envinfo))
+                yield done
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def pro_scenario_from_row(row):
+    """由专业版CSV的一行(csv.DictReader的字典)得到场景字典, 不含目标船"""
+    return {
+        'id': int(row['场景ID']),
+        'timestamp': row['时间戳'],
+        'ownship': {
+            'lat': float(row['本船纬度']),
+            'lon': float(row['本船经度']),
+            'sog': float(row['本船SOG(节)']),
+            'cog': float(row['本船COG(度)'])
+        },
+        'targets': [],
+        'seed': int(row['随机种子']) if row.get('随机种子') else None
+    }
+
+
+def pro_target_from_row(row, ownship):
+    """由专业版CSV的一行得到目标船字典"""
+    return {
+        'id': int(row['目标船ID']),
+        'meeting_type': row['会遇类型'],
+        'tlat': float(row['目标船纬度']),
+        'tlon': float(row['目标船经度']),
+        'tsog': float(row['目标船SOG(节)']),
+        'tcog': float(row['目标船COG(度)']),
+        'dist': float(row['距离(海里)']),
+        'brg': float(row['方位(度)']),
+        'TCPA': float(row['TCPA(分钟)']),
+        'DCPA': float(row['DCPA(海里)']),
+        'rel_spd': float(row['相对速度(节)']),
+        'rel_cog': float(row['相对航向(度)']),
+        'olat': ownship['lat'],
+        'olon': ownship['lon'],
+        'osog': ownship['sog'],
+        'ocog': ownship['cog'],
+    }
+
+
+def load_pro_csv(filepath):
+    """读入整个专业版CSV文件, 同一场景ID的行合并为一个场景"""
+    scenarios = {}
+    with open(filepath, 'r', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            scenario_id = int(row['场景ID'])
+            scenario = scenarios.get(scenario_id)
+            if scenario is None:
+                scenario = scenarios[scenario_id] = pro_scenario_from_row(row)
+            scenario['targets'].append(pro_target_from_row(row, scenario['ownship']))
+    return list(scenarios.values())
+
+
+def _parse_ids(buf, starts):
+    """
+    各行开头的十进制整数(场景ID), 逐位向量化解析
+
+    buf为整个文件的uint8数组, starts为各行的起始偏移. 有的行不是以数字开头
+    或者数字后面不是逗号时抛出ValueError.
+    """
+    last = len(buf) - 1
+    ids = np.zeros(len(starts), dtype=np.int64)
+    active = np.ones(len(starts), dtype=bool)  # 还在读数字的行
+    for k in range(ID_DIGITS + 1):
+        c = buf[np.minimum(starts + k, last)]
+        digit = c - np.uint8(ord('0'))  # 非数字字符回绕为大于9的值
+        is_digit = active & (digit <= 9)
+        ended = active & ~is_digit
+        if (k == 0 and ended.any()) or np.any(c[ended] != ord(',')):
+            raise ValueError('场景ID格式不正确')
+        if not is_digit.any():
+            return ids
+        ids = np.where(is_digit, ids * 10 + digit, ids)
+        active = is_digit
+    raise ValueError('场景ID格式不正确')
+
+
+class IndexedCSVScenarios:
+    """
+    按需读取的专业版CSV文件
+
+    打开时只用numpy扫描一遍文件, 找出每一行的起始位置和场景ID, 记录每个场景
+    (场景ID相同的连续若干行)的字节范围和行号, 不解析其他字段. 访问store[k]时
+    才读取并解析该场景, 最近访问的场景会缓存. 与ScenarioStore一样, 是场景字典的
+    只读序列, rows是按目标船逐行访问的视图.
+
+    只支持本程序导出的格式(表头与CSV_HEADERS相同, 场景ID为整数), 否则抛出
+    ValueError, 可以改用load_pro_csv整个读入.
+    """
+
+    def __init__(self, filepath):
+        self.path = filepath
+        buf = np.memmap(filepath, dtype=np.uint8, mode='r') if os.path.getsize(filepath) else \
+            np.zeros(0, dtype=np.uint8)
+        data_start = self._check_header(buf)
+
+        offsets = []     # 每个场景第一行的字节偏移
+        row_starts = []  # 每个场景第一行的行号
+        ids = []
+        rows = 0
+        prev_id = None
+        line_start = data_start  # 当前尚未结束的一行的起始偏移
+        size = len(buf)
+        for lo in range(data_start, size, INDEX_BLOCK):
+            hi = min(lo + INDEX_BLOCK, size)
+            ends = np.flatnonzero(buf[lo:hi] == ord('\n')) + lo
+            if hi == size and ends[-1:].tolist() != [size - 1]:
+                ends = np.append(ends, size)  # 最后一行没有换行符
+            if len(ends) == 0:
+                continue
+            starts = np.concatenate(([line_start], ends[:-1] + 1))
+            line_start = int(ends[-1]) + 1
+            # 跳过空行
+            lengths = ends - starts
+            blank = (lengths == 0) | ((lengths == 1) & (buf[np.minimum(starts, size - 1)] == ord('\r')))
+            starts = starts[~blank]
+            if len(starts) == 0:
+                continue
+            line_ids = _parse_ids(buf, starts)
+            first = np.flatnonzero(line_ids[1:] != line_ids[:-1]) + 1
+            if prev_id != int(line_ids[0]):
+                first = np.concatenate(([0], first))
+            offsets.extend(starts[first].tolist())
+            row_starts.extend((first + rows).tolist())
+            ids.extend(line_ids[first].tolist())
+            rows += len(starts)
+            prev_id = int(line_ids[-1])
+
+        self.offsets = np.array(offsets + [size], dtype=np.int64)
+        self.target_start = np.array(row_starts + [rows], dtype=np.int64)
+        self.ids = np.array(ids, dtype=np.int64)
+        self.target_count = rows
+        self.rows = TargetRows(self, self.target_start)
+        self._cache = OrderedDict()
+
+    @staticmethod
+    def _check_header(buf):
+        """检查表头, 返回第一行数据的偏移"""
+        ends = np.flatnonzero(buf[:65536] == ord('\n'))
+        end = int(ends[0]) + 1 if len(ends) else len(buf)
+        header = bytes(buf[:end]).decode('utf-8-sig').rstrip('\r\n')
+        if header != ','.join(csv_field(h) for h in CSV_HEADERS):
+            raise ValueError('表头与专业版CSV格式不同')
+        return end
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError('scenario index out of range')
+        scenario = self._cache.get(k)
+        if scenario is None:
+            with open(self.path, 'rb') as f:
+                f.seek(int(self.offsets[k]))
+                data = f.read(int(self.offsets[k + 1] - self.offsets[k]))
+            scenario = self._cache[k] = self._parse(io.StringIO(data.decode('utf-8'), newline=''))
+            if len(self._cache) > SCENARIO_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(k)
+        return scenario
+
+    def __iter__(self):
+        """顺序读取全部场景"""
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            f.seek(int(self.offsets[0]))
+            reader = (dict(zip(CSV_HEADERS, row)) for row in csv.reader(f) if row)
+            counts = np.diff(self.target_start).tolist()
+            for count in counts:
+                yield self._scenario(itertools.islice(reader, count))
+
+    def _parse(self, text):
+        return self._scenario(dict(zip(CSV_HEADERS, row)) for row in csv.reader(text) if row)
+
+    @staticmethod
+    def _scenario(rows):
+        scenario = None
+        for row in rows:
+            if scenario is None:
+                scenario = pro_scenario_from_row(row)
+            scenario['targets'].append(pro_target_from_row(row, scenario['ownship']))
+        return scenario
@@ -0,0 +1,312 @@
+"""
+SQLite场景库
+
+专业版生成的场景长期保存在一个SQLite数据库中, 可以不断追加, 并按会遇类型、
+TCPA、DCPA、目标船数量、随机种子等条件快速查询, 不需要重新生成.
+
+两张表:
+- scenarios(每个场景一行, 含本船数据): scenario(库内编号, 主键), id(生成时的场景ID),
+  timestamp, seed, lat, lon, sog, cog, target_count
+- targets(每条目标船一行): scenario, target_id, meeting_type, tlat, tlon, tsog, tcog,
+  dist, brg, TCPA, DCPA, rel_spd, rel_cog
+
+查询得到的场景字典与generate_scenario的格式相同, 可以直接用save_pro_csv/save_store
+导出或在界面中显示.
+
+示例:
+    with ScenarioLibrary('library.db') as lib:
+        lib.add(scenarios)
+        found = lib.query(meeting_type=['右舷小角度交叉会遇', '左舷小角度交叉会遇'],
+                          tcpa=(10, 20), dcpa=(None, 0.3), limit=100)
+
+命令行查询并导出:
+    python scenario_library.py library.db --meeting 交叉 --tcpa 10 20 --dcpa 0 0.3 -o crossing.csv
+"""
+
+import argparse
+import itertools
+import sqlite3
+import sys
+
+from scenario_io import save_pro_csv
+from scenario_store import save_store
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenarios (
+    scenario INTEGER PRIMARY KEY,
+    id INTEGER NOT NULL,
+    timestamp TEXT,
+    seed INTEGER,
+    lat REAL, lon REAL, sog REAL, cog REAL,
+    target_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS targets (
+    scenario INTEGER NOT NULL REFERENCES scenarios(scenario),
+    target_id INTEGER NOT NULL,
+    meeting_type TEXT NOT NULL,
+    tlat REAL, tlon REAL, tsog REAL, tcog REAL,
+    dist REAL, brg REAL, TCPA REAL, DCPA REAL, rel_spd REAL, rel_cog REAL
+);
+"""
+# 查询用的索引, 大批量加入时先删除, 加入完成后重新建立
+INDEXES = """
+CREATE INDEX IF NOT EXISTS targets_scenario ON targets(scenario);
+CREATE INDEX IF NOT EXISTS targets_meeting_tcpa ON targets(meeting_type, TCPA);
+CREATE INDEX IF NOT EXISTS targets_tcpa ON targets(TCPA);
+CREATE INDEX IF NOT EXISTS targets_dcpa ON targets(DCPA);
+CREATE INDEX IF NOT EXISTS scenarios_target_count ON scenarios(target_count);
+CREATE INDEX IF NOT EXISTS scenarios_seed ON scenarios(seed);
+"""
+_INDEX_NAMES = ['targets_scenario', 'targets_meeting_tcpa', 'targets_tcpa', 'targets_dcpa',
+                'scenarios_target_count', 'scenarios_seed']
+
+_OWNSHIP_FIELDS = ['lat', 'lon', 'sog', 'cog']
+_TARGET_FIELDS = ['tlat', 'tlon', 'tsog', 'tcog', 'dist', 'brg',
+                  'TCPA', 'DCPA', 'rel_spd', 'rel_cog']
+_INSERT_SCENARIO = 'INSERT INTO scenarios VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+_INSERT_TARGET = 'INSERT INTO targets VALUES (%s)' % ', '.join(['?'] * 13)
+
+# 每个事务插入的场景数
+COMMIT_SCENARIOS = 50000
+# SQLite页缓存(KB), 边插入边更新索引时缓存越大越快
+CACHE_KB = 65536
+# 按编号读取场景时每条SQL的编号个数, 不超过SQLite的参数个数限制
+FETCH_CHUNK = 500
+
+
+def _to_sql_seed(seed):
+    """场景种子为64位无符号整数, SQLite的INTEGER是有符号的, 按补码保存"""
+    if seed is None:
+        return None
+    return seed - (1 << 64) if seed >= 1 << 63 else seed
+
+
+def _from_sql_seed(value):
+    if value is None:
+        return None
+    return value + (1 << 64) if value < 0 else value
+
+
+def _range_condition(column, bounds, params):
+    """bounds为(最小值, 最大值), 包含边界, None表示不限"""
+    if bounds is None:
+        return []
+    lo, hi = bounds
+    conds = []
+    if lo is not None:
+        conds.append('%s >= ?' % column)
+        params.append(lo)
+    if hi is not None:
+        conds.append('%s <= ?' % column)
+        params.append(hi)
+    return conds
+
+
+class ScenarioLibrary:
+    """SQLite场景库, 文件不存在时创建"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA cache_size=-%d' % CACHE_KB)
+        self.conn.executescript(SCHEMA + INDEXES)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM scenarios').fetchone()[0]
+
+    def add(self, scenarios):
+        """
+        把场景(可以是生成器)加入场景库, 返回(场景数, 目标船数)
+
+        每COMMIT_SCENARIOS个场景提交一次事务, 中途出错时只丢失当前事务中的场景.
+        向空的或较小的库中加入超过一个事务的场景时, 先删除索引, 全部加入后再
+        重新建立, 比逐行更新索引快约3倍.
+        """
+        scenarios = iter(scenarios)
+        batch = list(itertools.islice(scenarios, COMMIT_SCENARIOS))
+        bulk = len(batch) == COMMIT_SCENARIOS and len(self) <= COMMIT_SCENARIOS
+        if bulk:
+            for name in _INDEX_NAMES:
+                self.conn.execute('DROP INDEX IF EXISTS %s' % name)
+        scenario_count = target_count = 0
+        try:
+            while batch:
+                n, m = self._insert(batch)
+                scenario_count += n
+                target_count += m
+                batch = list(itertools.islice(scenarios, COMMIT_SCENARIOS))
+        finally:
+            if bulk:
+                self.conn.executescript(INDEXES)
+        return scenario_count, target_count
+
+    def _insert(self, batch):
+        """在一个事务中插入一批场景"""
+        conn = self.conn
+        with conn:
+            # 库内编号在同一个写事务中分配
+            conn.execute('BEGIN IMMEDIATE')
+            next_key = conn.execute(
+                'SELECT COALESCE(MAX(scenario), 0) + 1 FROM scenarios').fetchone()[0]
+            scenario_rows = []
+            target_rows = []
+            for key, scenario in enumerate(batch, next_key):
+                ownship = scenario['ownship']
+                targets = scenario['targets']
+                scenario_rows.append(
+                    (key, scenario['id'], scenario['timestamp'],
+                     _to_sql_seed(scenario.get('seed')))
+                    + tuple(ownship[name] for name in _OWNSHIP_FIELDS)
+                    + (len(targets),))
+                for target in targets:
+                    target_rows.append(
+                        (key, target['id'], target['meeting_type'])
+                        + tuple(target[name] for name in _TARGET_FIELDS))
+            conn.executemany(_INSERT_SCENARIO, scenario_rows)
+            conn.executemany(_INSERT_TARGET, target_rows)
+        return len(scenario_rows), len(target_rows)
+
+    def meeting_types(self):
+        """库中出现过的会遇类型名称"""
+        return [row[0] for row in self.conn.execute(
+            'SELECT DISTINCT meeting_type FROM targets ORDER BY meeting_type')]
+
+    def find(self, meeting_type=None, tcpa=None, dcpa=None, target_count=None,
+             seed=None, limit=None):
+        """
+        查询符合条件的场景, 返回库内编号列表(按加入顺序)
+
+        meeting_type为会遇类型名称或名称列表, tcpa/dcpa/target_count为(最小值, 最大值),
+        包含边界, None表示不限. 会遇类型、TCPA、DCPA的条件需要由同一条目标船满足.
+        """
+        params = []
+        conds = _range_condition('target_count', target_count, params)
+        if seed is not None:
+            conds.append('seed = ?')
+            params.append(_to_sql_seed(seed))
+
+        target_params = []
+        target_conds = []
+        if meeting_type is not None:
+            names = [meeting_type] if isinstance(meeting_type, str) else list(meeting_type)
+            if not names:
+                return []
+            target_conds.append('meeting_type IN (%s)' % ', '.join(['?'] * len(names)))
+            target_params.extend(names)
+        target_conds += _range_condition('TCPA', tcpa, target_params)
+        target_conds += _range_condition('DCPA', dcpa, target_params)
+        if target_conds:
+            if limit is None:
+                # 先由索引找出全部符合条件的目标船
+                conds.append('scenario IN (SELECT scenario FROM targets WHERE %s)' %
+                             ' AND '.join(target_conds))
+            else:
+                # 按编号顺序逐个检查, 找到limit个场景即停止
+                conds.append('EXISTS (SELECT 1 FROM targets WHERE '
+                             'targets.scenario = scenarios.scenario AND %s)' %
+                             ' AND '.join(target_conds))
+            params.extend(target_params)
+
+        sql = 'SELECT scenario FROM scenarios'
+        if conds:
+            sql += ' WHERE ' + ' AND '.join(conds)
+        sql += ' ORDER BY scenario'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [row[0] for row in self.conn.execute(sql, params)]
+
+    def get(self, keys):
+        """按库内编号读取场景字典, 顺序与keys相同, 不存在的编号跳过"""
+        return list(self.iter_scenarios(keys))
+
+    def iter_scenarios(self, keys):
+        """与get()相同, 但每次只读取FETCH_CHUNK个场景, 用于导出大量场景"""
+        keys = list(keys)
+        for lo in range(0, len(keys), FETCH_CHUNK):
+            yield from self._fetch(keys[lo:lo + FETCH_CHUNK])
+
+    def _fetch(self, keys):
+        marks = ', '.join(['?'] * len(keys))
+        scenarios = {}
+        for row in self.conn.execute(
+                'SELECT scenario, id, timestamp, seed, lat, lon, sog, cog '
+                'FROM scenarios WHERE scenario IN (%s)' % marks, keys):
+            scenarios[row[0]] = {
+                'id': row[1],
+                'timestamp': row[2],
+                'ownship': dict(zip(_OWNSHIP_FIELDS, row[4:8])),
+                'targets': [],
+                'seed': _from_sql_seed(row[3]),
+            }
+        for row in self.conn.execute(
+                'SELECT * FROM targets WHERE scenario IN (%s) ORDER BY rowid' % marks, keys):
+            scenario = scenarios[row[0]]
+            ownship = scenario['ownship']
+            target = dict(zip(_TARGET_FIELDS, row[3:]))
+            target['id'] = row[1]
+            target['meeting_type'] = row[2]
+            target['olat'] = ownship['lat']
+            target['olon'] = ownship['lon']
+            target['osog'] = ownship['sog']
+            target['ocog'] = ownship['cog']
+            scenario['targets'].append(target)
+        return [scenarios[key] for key in keys if key in scenarios]
+
+    def query(self, **conditions):
+        """查询并读取符合条件的场景字典, 参数与find()相同"""
+        return self.get(self.find(**conditions))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='从场景库查询场景')
+    parser.add_argument('library', help='场景库文件(.db)')
+    parser.add_argument('--meeting', action='append',
+                        help='会遇类型, 匹配名称中包含该文字的类型, 可重复')
+    parser.add_argument('--tcpa', type=float, nargs=2, metavar=('MIN', 'MAX'),
+                        help='TCPA范围(分钟)')
+    parser.add_argument('--dcpa', type=float, nargs=2, metavar=('MIN', 'MAX'),
+                        help='DCPA范围(海里)')
+    parser.add_argument('--targets', type=int, nargs=2, metavar=('MIN', 'MAX'),
+                        help='目标船数量范围')
+    parser.add_argument('--seed', type=int, help='场景的随机种子')
+    parser.add_argument('--limit', type=int, help='最多返回的场景数')
+    parser.add_argument('-o', '--output',
+                        help='导出到CSV文件, 以.npz结尾时保存为列式场景库; 不指定时只打印数量')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    with ScenarioLibrary(args.library) as lib:
+        meeting_type = None
+        if args.meeting:
+            meeting_type = [name for name in lib.meeting_types()
+                            if any(text in name for text in args.meeting)]
+            if not meeting_type:
+                print('场景库中没有匹配的会遇类型', file=sys.stderr)
+        keys = lib.find(meeting_type=meeting_type, tcpa=args.tcpa, dcpa=args.dcpa,
+                        target_count=args.targets, seed=args.seed, limit=args.limit)
+        print('找到 %d 个场景' % len(keys), file=sys.stderr)
+        if args.output:
+            if args.output.lower().endswith('.npz'):
+                save_store(args.output, lib.iter_scenarios(keys))
+            else:
+                save_pro_csv(args.output, lib.iter_scenarios(keys))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,300 @@
+"""
+场景库的列式二进制格式
+
+场景保存为未压缩的.npz文件, 每列是其中的一个.npy数组, 分为两张表:
+
+- 场景表(每个场景一行): id, timestamp, seed, has_seed, lat, lon, sog, cog,
+  target_start(第k个场景的目标船为目标船表的[target_start[k], target_start[k+1])行)
+- 目标船表(每条目标船一行): scenario(所属场景的行号), target_id, meeting_type,
+  tlat, tlon, tsog, tcog, dist, brg, TCPA, DCPA, rel_spd, rel_cog
+
+meeting_type是meeting_types(会遇类型名称数组)中的下标. 字段与专业版CSV相同.
+
+load_store()把各列直接映射为只读的内存映射数组, 不逐行解析, 打开百万条目标船的
+文件也只需要几毫秒. 分析时也可以直接用np.load(path)读取.
+
+示例:
+    store = load_store('scenarios.npz')
+    danger = store.columns['DCPA'] <= 0.5        # numpy分析
+    scenario = store[0]                           # 与generate_scenario相同的场景字典
+"""
+
+import array
+import os
+import struct
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+from numpy.lib import format as npy_format
+
+STORE_VERSION = 1
+
+# (列名, array.array类型码, numpy类型)
+SCENARIO_COLUMNS = [
+    ('id', 'q', np.int64),
+    ('seed', 'Q', np.uint64),
+    ('has_seed', 'B', np.bool_),
+    ('lat', 'd', np.float64),
+    ('lon', 'd', np.float64),
+    ('sog', 'd', np.float64),
+    ('cog', 'd', np.float64),
+]
+TARGET_COLUMNS = [
+    ('scenario', 'q', np.int64),
+    ('target_id', 'q', np.int64),
+    ('meeting_type', 'H', np.uint16),
+    ('tlat', 'd', np.float64),
+    ('tlon', 'd', np.float64),
+    ('tsog', 'd', np.float64),
+    ('tcog', 'd', np.float64),
+    ('dist', 'd', np.float64),
+    ('brg', 'd', np.float64),
+    ('TCPA', 'd', np.float64),
+    ('DCPA', 'd', np.float64),
+    ('rel_spd', 'd', np.float64),
+    ('rel_cog', 'd', np.float64),
+]
+# 目标船字典中直接来自目标船表的字段
+_TARGET_FLOATS = ['tlat', 'tlon', 'tsog', 'tcog', 'dist', 'brg',
+                  'TCPA', 'DCPA', 'rel_spd', 'rel_cog']
+
+# 按场景访问时缓存的场景数
+SCENARIO_CACHE_SIZE = 1024
+# 遍历全部场景时每次转换的场景数
+ITER_CHUNK = 4096
+
+
+def _parse_timestamps(timestamps):
+    """时间戳字符串转换为datetime64[s], 无法解析的为NaT"""
+    try:
+        return np.array(timestamps, dtype='datetime64[s]')
+    except ValueError:
+        result = np.empty(len(timestamps), dtype='datetime64[s]')
+        for i, ts in enumerate(timestamps):
+            try:
+                result[i] = np.datetime64(ts, 's')
+            except ValueError:
+                result[i] = np.datetime64('NaT')
+        return result
+
+
+def scenario_columns(scenarios):
+    """
+    把场景(可以是生成器)转换为列式场景库的各列, 不含版本号
+
+    ScenarioStore(scenario_columns(scenarios))得到内存中的场景库, 用于对CSV或
+    SQLite场景库中的场景做向量化分析.
+    """
+    scols = {name: array.array(code) for name, code, dtype in SCENARIO_COLUMNS}
+    tcols = {name: array.array(code) for name, code, dtype in TARGET_COLUMNS}
+    target_start = array.array('q', [0])
+    timestamps = []
+    meeting_codes = {}
+
+    for scenario in scenarios:
+        k = len(timestamps)
+        ownship = scenario['ownship']
+        seed = scenario.get('seed')
+        scols['id'].append(scenario['id'])
+        scols['seed'].append(0 if seed is None else seed)
+        scols['has_seed'].append(seed is not None)
+        scols['lat'].append(ownship['lat'])
+        scols['lon'].append(ownship['lon'])
+        scols['sog'].append(ownship['sog'])
+        scols['cog'].append(ownship['cog'])
+        timestamps.append(scenario['timestamp'])
+
+        for target in scenario['targets']:
+            name = target['meeting_type']
+            code = meeting_codes.setdefault(name, len(meeting_codes))
+            tcols['scenario'].append(k)
+            tcols['target_id'].append(target['id'])
+            tcols['meeting_type'].append(code)
+            for name in _TARGET_FLOATS:
+                tcols[name].append(target[name])
+        target_start.append(len(tcols['scenario']))
+
+    columns = {}
+    for name, code, dtype in SCENARIO_COLUMNS:
+        columns[name] = np.frombuffer(scols[name], dtype=dtype)
+    for name, code, dtype in TARGET_COLUMNS:
+        columns[name] = np.frombuffer(tcols[name], dtype=dtype)
+    columns['timestamp'] = _parse_timestamps(timestamps)
+    columns['target_start'] = np.frombuffer(target_start, dtype=np.int64)
+    columns['meeting_types'] = np.array(list(meeting_codes), dtype=str)
+    return columns
+
+
+def save_store(filepath, scenarios):
+    """
+    把场景(可以是生成器)保存为列式.npz文件, 返回(场景数, 目标船数)
+
+    先写入临时文件再替换, 覆盖当前已经打开(内存映射)的文件也是安全的.
+    """
+    columns = scenario_columns(scenarios)
+    columns['version'] = np.array(STORE_VERSION)
+
+    # np.savez会给没有.npz后缀的文件名加上后缀, 写入打开的文件则不会
+    tmp_path = filepath + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **columns)
+    os.replace(tmp_path, filepath)
+    return len(columns['id']), len(columns['scenario'])
+
+
+def _npz_members(filepath):
+    """
+    未压缩.npz文件中各数组的位置, 返回{名称: (数据偏移, dtype, shape, fortran_order)}
+
+    有压缩的成员时返回None.
+    """
+    members = {}
+    with open(filepath, 'rb') as f, zipfile.ZipFile(f) as zf:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                return None
+            # 本地文件头固定30字节, 之后是文件名和扩展字段
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack('<HH', f.read(4))
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = npy_format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = npy_format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = npy_format.read_array_header_2_0(f)
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            members[name] = (f.tell(), dtype, shape, fortran_order)
+    return members
+
+
+def load_store(filepath, mmap=True):
+    """
+    打开场景库文件, 返回ScenarioStore
+
+    mmap为True时各列为只读的内存映射数组, 不读入内存; 文件有压缩的成员时
+    (例如用np.savez_compressed另存过)退回到np.load读入全部数据.
+    """
+    members = _npz_members(filepath) if mmap else None
+    columns = {}
+    if members is None:
+        with np.load(filepath) as data:
+            columns = {name: data[name] for name in data.files}
+    else:
+        for name, (offset, dtype, shape, fortran_order) in members.items():
+            if dtype.hasobject:
+                raise ValueError('%s: 不支持包含对象的列 %s' % (filepath, name))
+            if int(np.prod(shape)) == 0:
+                columns[name] = np.empty(shape, dtype=dtype)
+            else:
+                columns[name] = np.memmap(filepath, dtype=dtype, mode='r', offset=offset,
+                                          shape=shape, order='F' if fortran_order else 'C')
+
+    version = int(columns.pop('version', 0))
+    if version != STORE_VERSION:
+        raise ValueError('%s: 不支持的场景库版本 %d' % (filepath, version))
+    return ScenarioStore(columns, filepath)
+
+
+class ScenarioStore:
+    """
+    列式场景库
+
+    columns是列名到数组的字典, 可以直接做向量化分析. 同时也是场景字典的只读序列:
+    len(store)为场景数, store[k]和遍历得到与generate_scenario/load_from_csv相同格式
+    的场景字典, 在访问时才从各列构造. rows是按目标船逐行访问的视图, 供场景表格使用.
+    """
+
+    def __init__(self, columns, path=None):
+        self.columns = columns
+        self.path = path
+        self.meeting_types = [str(name) for name in columns['meeting_types']]
+        self.target_start = columns['target_start']
+        self.target_count = int(self.target_start[-1])
+        self.rows = TargetRows(self, self.target_start)
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.target_start) - 1
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError('scenario index out of range')
+        scenario = self._cache.get(k)
+        if scenario is None:
+            scenario = self._cache[k] = self._build(k, k + 1)[0]
+            if len(self._cache) > SCENARIO_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(k)
+        return scenario
+
+    def __iter__(self):
+        for lo in range(0, len(self), ITER_CHUNK):
+            yield from self._build(lo, min(lo + ITER_CHUNK, len(self)))
+
+    def _build(self, lo, hi):
+        """构造第lo到hi-1个场景的字典, 各列整段转换为Python对象"""
+        c = self.columns
+        starts = self.target_start[lo:hi + 1].tolist()
+        t0, t1 = starts[0], starts[-1]
+        ids = c['id'][lo:hi].tolist()
+        seeds = c['seed'][lo:hi].tolist()
+        has_seed = c['has_seed'][lo:hi].tolist()
+        timestamps = ['' if ts == 'NaT' else ts.replace('T', ' ') for ts in
+                      np.datetime_as_string(c['timestamp'][lo:hi], unit='s').tolist()]
+        ownship = {name: c[name][lo:hi].tolist() for name in ('lat', 'lon', 'sog', 'cog')}
+        target_id = c['target_id'][t0:t1].tolist()
+        meeting = c['meeting_type'][t0:t1].tolist()
+        target = {name: c[name][t0:t1].tolist() for name in _TARGET_FLOATS}
+
+        scenarios = []
+        for i in range(hi - lo):
+            oship = {name: ownship[name][i] for name in ('lat', 'lon', 'sog', 'cog')}
+            targets = []
+            for j in range(starts[i] - t0, starts[i + 1] - t0):
+                t = {name: target[name][j] for name in _TARGET_FLOATS}
+                t['id'] = target_id[j]
+                t['meeting_type'] = self.meeting_types[meeting[j]]
+                t['olat'] = oship['lat']
+                t['olon'] = oship['lon']
+                t['osog'] = oship['sog']
+                t['ocog'] = oship['cog']
+                targets.append(t)
+            scenarios.append({
+                'id': ids[i],
+                'timestamp': timestamps[i],
+                'ownship': oship,
+                'targets': targets,
+                'seed': seeds[i] if has_seed[i] else None,
+            })
+        return scenarios
+
+
+class TargetRows:
+    """
+    按目标船逐行访问场景序列, 提供场景表格使用的len()和row(i)
+
+    target_start[k]为第k个场景第一条目标船的行号, 最后一项为总行数.
+    """
+
+    def __init__(self, scenarios, target_start):
+        self.scenarios = scenarios
+        self.target_start = target_start
+
+    def __len__(self):
+        return int(self.target_start[-1])
+
+    def row(self, i):
+        # 没有目标船的场景与下一个场景的起始行号相同, 取最后一个
+        k = int(np.searchsorted(self.target_start, i, side='right')) - 1
+        scenario = self.scenarios[k]
+        return scenario, scenario['targets'][i - int(self.target_start[k])]
+
+    def __iter__(self):
+        """按顺序产出(场景, 目标船), 比逐行row(i)快得多"""
+        for scenario in self.scenarios:
+            for target in scenario['targets']:
+                yield scenario, target
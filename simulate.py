@@ -0,0 +1,237 @@
+"""
+场景的轨迹推算
+
+生成的场景只是初始时刻的快照. simulate()让本船和所有目标船按各自的航速航向
+匀速航行minutes分钟, 每step分钟记录一次位置, 得到各船的轨迹和两两之间实际的
+最小距离及其出现的时刻, 用来检查场景是否真的会演变成预期的会遇局面.
+
+船舶用(N, S)的数组表示: N个场景, 每个场景S条船, 第0条为本船, 目标船较少的场景
+用NaN补齐. scenario_arrays/store_arrays/scene_arrays把专业版场景、列式场景库和
+main.py的场景转换为这种数组. 计算全部用numpy按场景分块进行, 一次可以推算十万个
+场景.
+
+两种推算方式:
+- 'gc': 沿初始航向的大圆航线(georef.ll_gc_ll_array), 距离用calc_CPA相同的
+  georef.DistanceBearingMercator计算
+- 'plane': 以本船初始位置为原点的局部平面, 直线匀速运动, 速度快得多,
+  结果与calc_CPA的相对运动模型一致
+
+示例:
+    lat, lon, sog, cog = store_arrays(load_store('scenarios.npz'))
+    result = simulate(lat, lon, sog, cog, minutes=30, step=0.5, tracks=False)
+    own_min = result.min_dist[:, 0, 1:]       # 本船与各目标船的最小距离
+"""
+
+import numpy as np
+
+import georef
+
+MODES = ('gc', 'plane')
+# 每次推算的场景数, 限制中间数组的大小
+SIM_CHUNK = 4096
+
+
+class SimResult:
+    """
+    simulate()的结果
+
+    times: 记录位置的时刻(分钟), 形状(T,)
+    lat, lon: 各船的轨迹, 形状(N, S, T); simulate(tracks=False)时为None
+    min_dist: 两船之间的最小距离(海里), 形状(N, S, S), 对称, 对角线为0,
+              有一条船不存在时为NaN. min_dist[:, 0, j]为本船与第j条船的最小距离
+    min_time: 最小距离出现的时刻(分钟), 形状与min_dist相同
+    """
+
+    def __init__(self, times, lat, lon, min_dist, min_time):
+        self.times = times
+        self.lat = lat
+        self.lon = lon
+        self.min_dist = min_dist
+        self.min_time = min_time
+
+
+def simulate(lat, lon, sog, cog, minutes, step=1.0, mode='gc', tracks=True):
+    """
+    推算各船minutes分钟内的轨迹, 返回SimResult
+
+    lat, lon, sog(节), cog(度)为(N, S)的数组, 第0条为本船, NaN表示不存在的船.
+    最小距离在距离最小的记录时刻附近按相对位置线性变化求出, 不受step的限制.
+    tracks为False时不保留轨迹, 只返回最小距离, 节省内存.
+    """
+    if mode not in MODES:
+        raise ValueError('mode must be one of %s' % ', '.join(MODES))
+    if step <= 0:
+        raise ValueError('step must be positive')
+    lat, lon, sog, cog = [np.atleast_2d(np.asarray(a, dtype=float))
+                          for a in (lat, lon, sog, cog)]
+    n, ships = lat.shape
+    times = np.arange(0.0, minutes + step * 0.5, step)
+
+    if tracks:
+        lat_out = np.empty((n, ships, len(times)))
+        lon_out = np.empty((n, ships, len(times)))
+    min_dist = np.empty((n, ships, ships))
+    min_time = np.empty((n, ships, ships))
+    advance = _advance_gc if mode == 'gc' else _advance_plane
+    for lo in range(0, n, SIM_CHUNK):
+        hi = min(lo + SIM_CHUNK, n)
+        tlat, tlon, rx, ry = advance(lat[lo:hi], lon[lo:hi], sog[lo:hi], cog[lo:hi], times)
+        if tracks:
+            lat_out[lo:hi] = tlat
+            lon_out[lo:hi] = tlon
+        exists = ~np.isnan(lat[lo:hi] + lon[lo:hi] + sog[lo:hi] + cog[lo:hi])
+        min_dist[lo:hi], min_time[lo:hi] = _min_separation(rx, ry, times, exists)
+
+    if not tracks:
+        lat_out = lon_out = None
+    return SimResult(times, lat_out, lon_out, min_dist, min_time)
+
+
+def _advance_gc(lat, lon, sog, cog, times):
+    """
+    大圆航线推算, 返回轨迹(n, S, T)和各对船(i < j)之间的相对位置(n, P, T)
+
+    相对位置为第j条船到第i条船的东向、北向分量(海里), 由DistanceBearingMercator
+    的距离和方位得到.
+    """
+    tlat, tlon = georef.ll_gc_ll_array(lat[:, :, None], lon[:, :, None],
+                                       cog[:, :, None], sog[:, :, None] * times / 60.0)
+    y = georef.mercator_y_array(tlat)
+    i, j = np.triu_indices(lat.shape[1], 1)
+    dist, brg = georef.DistanceBearingMercator_y(
+        tlat[:, i], tlon[:, i], tlat[:, j], tlon[:, j], y[:, i], y[:, j])
+    brg = np.radians(brg)
+    return tlat, tlon, dist * np.sin(brg), dist * np.cos(brg)
+
+
+def _advance_plane(lat, lon, sog, cog, times):
+    """以本船初始位置为原点的局部平面推算, 返回值与_advance_gc相同"""
+    lat0 = lat[:, :1]
+    lon0 = lon[:, :1]
+    coslat = np.cos(np.radians(lat0))
+    dlon = (lon - lon0 + 180.0) % 360.0 - 180.0
+    # 东向x, 北向y, 单位海里
+    x0 = dlon * 60.0 * coslat
+    y0 = (lat - lat0) * 60.0
+    c = np.radians(cog)
+    vx = sog * np.sin(c) / 60.0
+    vy = sog * np.cos(c) / 60.0
+    x = x0[:, :, None] + vx[:, :, None] * times
+    y = y0[:, :, None] + vy[:, :, None] * times
+
+    i, j = np.triu_indices(lat.shape[1], 1)
+    tlat = lat0[:, :, None] + y / 60.0
+    tlon = (lon0[:, :, None] + x / (60.0 * coslat[:, :, None]) + 180.0) % 360.0 - 180.0
+    return tlat, tlon, x[:, i] - x[:, j], y[:, i] - y[:, j]
+
+
+def _closest_on_segment(px, py, qx, qy):
+    """从p到q的线段上离原点最近的点, 返回(距离, 在线段上的比例)"""
+    ux = qx - px
+    uy = qy - py
+    uu = ux * ux + uy * uy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.clip(-(px * ux + py * uy) / uu, 0.0, 1.0)
+    s = np.where(uu > 0.0, s, 0.0)
+    return np.hypot(px + s * ux, py + s * uy), s
+
+
+def _min_separation(rx, ry, times, exists):
+    """
+    各对船的最小距离和时刻, 填入(n, S, S)的对称矩阵, exists为各船是否存在
+
+    先取距离最小的记录时刻k, 再假设相对位置在相邻两个时间步内线性变化, 在
+    [k-1, k]和[k, k+1]两段上求最近点. 局部平面方式中相对运动是直线, 结果是准确的.
+    """
+    n, ships = exists.shape
+    steps = len(times)
+    d2 = rx * rx + ry * ry
+    missing = np.isnan(d2).all(axis=2)
+    k = np.argmin(np.where(np.isnan(d2), np.inf, d2), axis=2)[:, :, None]
+
+    def at(a, idx):
+        return np.take_along_axis(a, idx, axis=2)[:, :, 0]
+
+    px, py = at(rx, k), at(ry, k)
+    prev = np.maximum(k - 1, 0)
+    after = np.minimum(k + 1, steps - 1)
+    d_prev, s_prev = _closest_on_segment(px, py, at(rx, prev), at(ry, prev))
+    d_after, s_after = _closest_on_segment(px, py, at(rx, after), at(ry, after))
+    k = k[:, :, 0]
+    t_prev = times[k] + s_prev * (times[prev[:, :, 0]] - times[k])
+    t_after = times[k] + s_after * (times[after[:, :, 0]] - times[k])
+    use_prev = d_prev < d_after
+    dmin = np.where(use_prev, d_prev, d_after)
+    tmin = np.where(use_prev, t_prev, t_after)
+    dmin[missing] = np.nan
+    tmin[missing] = np.nan
+
+    i, j = np.triu_indices(ships, 1)
+    diag = np.arange(ships)
+    min_dist = np.empty((n, ships, ships))
+    min_time = np.empty((n, ships, ships))
+    for out, value in ((min_dist, dmin), (min_time, tmin)):
+        out[:, i, j] = value
+        out[:, j, i] = value
+        out[:, diag, diag] = np.where(exists, 0.0, np.nan)
+    return min_dist, min_time
+
+
+def _pad(rows, width):
+    """不等长的行补齐NaN, 得到(len(rows), width)的数组"""
+    out = np.full((len(rows), width), np.nan)
+    for k, row in enumerate(rows):
+        out[k, :len(row)] = row
+    return out
+
+
+def scenario_arrays(scenarios):
+    """专业版场景字典的列表转换为simulate()的(lat, lon, sog, cog)数组"""
+    scenarios = list(scenarios)
+    width = 1 + max((len(s['targets']) for s in scenarios), default=0)
+    columns = []
+    for own_key, target_key in (('lat', 'tlat'), ('lon', 'tlon'),
+                                ('sog', 'tsog'), ('cog', 'tcog')):
+        columns.append(_pad([[s['ownship'][own_key]] + [t[target_key] for t in s['targets']]
+                             for s in scenarios], width))
+    return tuple(columns)
+
+
+def scene_arrays(scenes):
+    """main.py的场景(scene['target']中为目标船)转换为simulate()的数组"""
+    scenes = list(scenes)
+    width = 1 + max((len(s['target']) for s in scenes), default=0)
+    columns = []
+    for own_key, target_key in (('olat', 'tlat'), ('olon', 'tlon'),
+                                ('osog', 'tsog'), ('ocog', 'tcog')):
+        columns.append(_pad([[s['target'][0][own_key] if s['target'] else np.nan]
+                             + [t[target_key] for t in s['target']]
+                             for s in scenes], width))
+    return tuple(columns)
+
+
+def store_arrays(store, lo=0, hi=None):
+    """
+    列式场景库(scenario_store.ScenarioStore)直接由各列转换, 不构造场景字典
+
+    只转换第lo到hi-1个场景, 用于分块处理大的场景库.
+    """
+    c = store.columns
+    if hi is None:
+        hi = len(store)
+    starts = np.asarray(store.target_start[lo:hi + 1])
+    counts = np.diff(starts)
+    n = len(counts)
+    width = 1 + (int(counts.max()) if n else 0)
+    t0, t1 = (int(starts[0]), int(starts[-1])) if n else (0, 0)
+    # 每条目标船所属的场景(从0开始)和在场景中的位置(从1开始, 0为本船)
+    rows = np.asarray(c['scenario'][t0:t1]) - lo
+    slot = np.arange(t0, t1) - starts[rows] + 1
+    columns = []
+    for own_key, target_key in (('lat', 'tlat'), ('lon', 'tlon'),
+                                ('sog', 'tsog'), ('cog', 'tcog')):
+        out = np.full((n, width), np.nan)
+        out[:, 0] = c[own_key][lo:hi]
+        out[rows, slot] = c[target_key][t0:t1]
+        columns.append(out)
+    return tuple(columns)
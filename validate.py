@@ -0,0 +1,340 @@
+"""
+场景的批量复核
+
+导出和读入场景时都直接使用目标船中保存的TCPA/DCPA, 不再检查. 这里对保存的
+场景重新计算每一对船之间的CPA, 找出保存的数值有偏差或者危险关系已经不成立的
+目标船, 可以作为生成流程的检查步骤.
+
+计算按场景分块用numpy进行(scenario_core.calc_CPA_array/calc_CPA_batch), 不构造
+场景字典, 列式场景库每分钟可以复核数千万条目标船.
+
+专业版场景(CSV, .npz场景库, .db场景库):
+- TCPA/DCPA与重新计算的结果不一致
+- 危险状态与会遇类型不符: NO_DANGER_TYPE以外的会遇类型应当有碰撞危险(与
+  generate_scenario的DANGER_TCPA, DANGER_DCPA相同)
+- 与前面的目标船距离小于TARGET_SPACING
+
+main.py的场景(validate_scenes)按生成时的ot/tt条件检查本船与目标船、目标船之间
+的危险关系, 以及目标船之间的距离, 与make_tship_check_tt相同.
+
+判断危险关系时留出与TCPA/DCPA相同的容差, 只有超出容差仍然不符时才算不符,
+避免CSV中两位小数的舍入误差导致误报.
+
+命令行:
+    python validate.py scenarios.npz library.db scenarios.csv -o flagged.csv
+没有问题时返回0, 有问题时返回1, 文件无法读取时返回2.
+"""
+
+import argparse
+import itertools
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+import georef
+import scenario_core
+from scenario_core import calc_CPA_array, calc_CPA_batch
+from scenario_generator_pro_new import DANGER_TCPA, DANGER_DCPA
+from scenario_io import csv_field, load_pro_csv, write_csv
+from scenario_library import ScenarioLibrary
+from scenario_store import ScenarioStore, load_store, scenario_columns
+from simulate import scene_arrays, store_arrays
+
+# 问题的类型, 一条目标船可能同时有多个
+FLAG_TCPA = 1
+FLAG_DCPA = 2
+FLAG_OT = 4
+FLAG_TT = 8
+FLAG_DIST = 16
+FLAG_TEXT = OrderedDict([
+    (FLAG_TCPA, 'TCPA偏差'),
+    (FLAG_DCPA, 'DCPA偏差'),
+    (FLAG_OT, scenario_core.GenFailure.CONSTRAINT_TEXT['ot'] + '不符'),
+    (FLAG_TT, scenario_core.GenFailure.CONSTRAINT_TEXT['tt'] + '不符'),
+    (FLAG_DIST, '目标船之间距离太近'),
+])
+
+# 默认容差: 超过 绝对容差 + RTOL * |保存的值| 时认为有偏差
+TCPA_TOL = 0.05
+DCPA_TOL = 0.01
+RTOL = 1e-3
+# 专业版中没有碰撞危险的会遇类型
+NO_DANGER_TYPE = '没有危险'
+# 专业版目标船之间的最小距离(海里), 与generate_scenario相同
+TARGET_SPACING = 1.0
+# main.py场景中目标船之间的最小距离(海里), 与make_tship_dist_is_ok相同
+SCENE_SPACING = 0.5
+# 每次复核的场景数
+VALIDATE_CHUNK = 65536
+
+FLAGGED_HEADERS = ['场景ID', '目标船ID', '会遇类型', '保存的TCPA', '计算的TCPA',
+                   '保存的DCPA', '计算的DCPA', '问题']
+
+
+class ValidationReport:
+    """
+    复核结果, 各数组按目标船逐行排列
+
+    scenario: 每条目标船所属场景的序号
+    tcpa, dcpa: 重新计算的本船与目标船的TCPA(分钟)和DCPA(海里)
+    stored_tcpa, stored_dcpa: 保存的TCPA和DCPA
+    flags: FLAG_*的组合, 0表示没有问题
+    """
+
+    def __init__(self, scenario_count, scenario, tcpa, dcpa, stored_tcpa, stored_dcpa, flags):
+        self.scenario_count = scenario_count
+        self.scenario = scenario
+        self.tcpa = tcpa
+        self.dcpa = dcpa
+        self.stored_tcpa = stored_tcpa
+        self.stored_dcpa = stored_dcpa
+        self.flags = flags
+
+    def __len__(self):
+        return len(self.flags)
+
+    def __bool__(self):
+        """没有问题时为True"""
+        return not self.flags.any()
+
+    def flagged(self):
+        """有问题的目标船的行号"""
+        return np.flatnonzero(self.flags)
+
+    def flagged_scenarios(self):
+        """有问题的场景的序号"""
+        return np.unique(self.scenario[self.flags != 0])
+
+    def counts(self):
+        """各类问题的目标船数, {FLAG_*: 数量}"""
+        return OrderedDict((flag, int(np.count_nonzero(self.flags & flag)))
+                           for flag in FLAG_TEXT)
+
+    def max_drift(self):
+        """TCPA和DCPA的最大偏差"""
+        if not len(self):
+            return 0.0, 0.0
+        return (float(np.nanmax(np.abs(self.tcpa - self.stored_tcpa))),
+                float(np.nanmax(np.abs(self.dcpa - self.stored_dcpa))))
+
+
+def flag_text(flags):
+    return ', '.join(text for flag, text in FLAG_TEXT.items() if flags & flag)
+
+
+def _drifted(stored, value, tol, rtol):
+    # NaN(例如数据缺失)也算偏差
+    return ~(np.abs(value - stored) <= tol + rtol * np.abs(stored))
+
+
+def _danger(tcpa, dcpa, tcpa_max, dcpa_max, tcpa_tol, dcpa_tol):
+    """
+    TCPA在[0, tcpa_max]内且DCPA不大于dcpa_max时有危险, 返回(可能有危险, 肯定有危险)
+
+    前者把范围放宽容差, 后者收窄容差. 应当有危险却不是"可能有危险", 或者应当
+    没有危险却"肯定有危险"时才算不符.
+    """
+    maybe = (tcpa >= -tcpa_tol) & (tcpa <= tcpa_max + tcpa_tol) & (dcpa <= dcpa_max + dcpa_tol)
+    surely = (tcpa >= tcpa_tol) & (tcpa <= tcpa_max - tcpa_tol) & (dcpa <= dcpa_max - dcpa_tol)
+    return maybe, surely
+
+
+def validate_store(store, tcpa_tol=TCPA_TOL, dcpa_tol=DCPA_TOL, rtol=RTOL):
+    """复核列式场景库(scenario_store.ScenarioStore)中的专业版场景, 返回ValidationReport"""
+    c = store.columns
+    starts = np.asarray(store.target_start)
+    scenario = np.asarray(c['scenario'])
+    rows = len(scenario)
+    tcpa = np.empty(rows)
+    dcpa = np.empty(rows)
+    flags = np.zeros(rows, dtype=np.uint8)
+    danger_types = np.array([name != NO_DANGER_TYPE for name in store.meeting_types], dtype=bool)
+
+    for lo in range(0, len(store), VALIDATE_CHUNK):
+        hi = min(lo + VALIDATE_CHUNK, len(store))
+        t0, t1 = int(starts[lo]), int(starts[hi])
+        if t0 == t1:
+            continue
+        own = scenario[t0:t1]
+        stored_tcpa = np.asarray(c['TCPA'][t0:t1])
+        stored_dcpa = np.asarray(c['DCPA'][t0:t1])
+        T, D = calc_CPA_array(
+            np.asarray(c['lat'])[own], np.asarray(c['lon'])[own],
+            c['tlat'][t0:t1], c['tlon'][t0:t1],
+            np.asarray(c['sog'])[own], c['tsog'][t0:t1],
+            np.asarray(c['cog'])[own], c['tcog'][t0:t1])
+        f = flags[t0:t1]
+        f[_drifted(stored_tcpa, T, tcpa_tol, rtol)] |= FLAG_TCPA
+        f[_drifted(stored_dcpa, D, dcpa_tol, rtol)] |= FLAG_DCPA
+        expected = danger_types[np.asarray(c['meeting_type'][t0:t1])]
+        maybe, surely = _danger(T, D, DANGER_TCPA, DANGER_DCPA, tcpa_tol, dcpa_tol)
+        f[np.where(expected, ~maybe, surely)] |= FLAG_OT
+
+        # 目标船之间的距离, 与generate_scenario一样只检查后放置的目标船
+        lat, lon = store_arrays(store, lo, hi)[:2]
+        ships = lat.shape[1]
+        if ships > 2:
+            i, j = np.triu_indices(ships - 1, 1)
+            dist = georef.DistGreatCircle_array(lat[:, i + 1], lon[:, i + 1],
+                                                lat[:, j + 1], lon[:, j + 1])
+            close = np.zeros(lat.shape, dtype=bool)
+            for col in range(2, ships):
+                close[:, col] = (dist[:, j + 1 == col] < TARGET_SPACING - dcpa_tol).any(axis=1)
+            f[close[own - lo, np.arange(t0, t1) - starts[own] + 1]] |= FLAG_DIST
+        tcpa[t0:t1] = T
+        dcpa[t0:t1] = D
+
+    return ValidationReport(len(store), scenario, tcpa, dcpa,
+                            np.asarray(c['TCPA']), np.asarray(c['DCPA']), flags)
+
+
+def validate_scenarios(scenarios, **tolerances):
+    """复核专业版场景字典(可以是生成器), 参数与validate_store相同"""
+    return validate_store(ScenarioStore(scenario_columns(scenarios)), **tolerances)
+
+
+def validate_scenes(scenes, tcpa_tol=TCPA_TOL, dcpa_tol=DCPA_TOL, rtol=RTOL):
+    """
+    按生成时的ot/tt条件复核main.py的场景, 只复核已经生成(scene['ok'])的场景
+
+    本船与目标船的危险关系按SAFE_TCPA, SAFE_DCPA判断, 目标船之间按make_tship_is_safe_tt
+    和make_tship_dist_is_ok判断. ot/tt要求"至少一条(对)有危险"而没有时, 场景的所有
+    目标船都标记为不符.
+    """
+    scenes = [scene for scene in scenes if scene.get('ok') and scene.get('target')]
+    stored_tcpa = np.array([t['TCPA'] for scene in scenes for t in scene['target']], dtype=float)
+    stored_dcpa = np.array([t['DCPA'] for scene in scenes for t in scene['target']], dtype=float)
+    counts = np.array([len(scene['target']) for scene in scenes], dtype=np.int64)
+    scenario = np.repeat(np.arange(len(scenes)), counts)
+    slot = np.arange(len(scenario)) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+    if not scenes:
+        empty = np.empty(0)
+        return ValidationReport(0, scenario, empty, empty, empty, empty,
+                                np.zeros(0, dtype=np.uint8))
+
+    lat, lon, sog, cog = scene_arrays(scenes)
+    T, D = calc_CPA_batch(lat, lon, sog, cog)
+    tcpa = T[scenario, 0, slot]
+    dcpa = D[scenario, 0, slot]
+    flags = np.zeros(len(scenario), dtype=np.uint8)
+    flags[_drifted(stored_tcpa, tcpa, tcpa_tol, rtol)] |= FLAG_TCPA
+    flags[_drifted(stored_dcpa, dcpa, dcpa_tol, rtol)] |= FLAG_DCPA
+
+    n, ships = lat.shape
+    ot = np.array([scene['ot'] for scene in scenes])[:, None]
+    tt = np.array([scene['tt'] for scene in scenes])[:, None]
+    present = ~np.isnan(lat)
+    present[:, 0] = False
+
+    # 本船与目标船
+    maybe, surely = _danger(T[:, 0, :], D[:, 0, :], scenario_core.SAFE_TCPA,
+                            scenario_core.SAFE_DCPA, tcpa_tol, dcpa_tol)
+    none_danger = ~(maybe & present).any(axis=1, keepdims=True)
+    bad_ot = present & (((ot == 1) & surely) | ((ot == 2) & ~maybe)
+                        | ((ot == 3) & none_danger))
+
+    # 目标船之间, [i, j]为以i为本船、j为目标船的结果, 只检查i < j
+    bad_tt = np.zeros((n, ships), dtype=bool)
+    bad_dist = np.zeros((n, ships), dtype=bool)
+    pair_danger = np.zeros(n, dtype=bool)
+    for a in range(1, ships):
+        for b in range(a + 1, ships):
+            both = present[:, a] & present[:, b]
+            dist = georef.DistanceBearingMercator_array(
+                lat[:, a], lon[:, a], lat[:, b], lon[:, b])[0]
+            bad_dist[:, b] |= both & (dist < SCENE_SPACING - dcpa_tol)
+            # make_tship_is_safe_tt: TCPA < 0 或 DCPA > TT_DCPA 时安全
+            maybe, surely = _danger(T[:, a, b], D[:, a, b], np.inf, scenario_core.TT_DCPA,
+                                    tcpa_tol, dcpa_tol)
+            bad_tt[:, b] |= both & (((tt[:, 0] == 1) & surely) | ((tt[:, 0] == 2) & ~maybe))
+            pair_danger |= both & maybe
+    several = present.sum(axis=1) > 1
+    bad_tt |= present & ((tt == 3) & (several & ~pair_danger)[:, None])
+
+    flags[bad_ot[scenario, slot]] |= FLAG_OT
+    flags[bad_tt[scenario, slot]] |= FLAG_TT
+    flags[bad_dist[scenario, slot]] |= FLAG_DIST
+    return ValidationReport(len(scenes), scenario, tcpa, dcpa, stored_tcpa, stored_dcpa, flags)
+
+
+def load_for_validation(path):
+    """按后缀打开专业版场景文件: .npz为列式场景库, .db为SQLite场景库, 其余为CSV"""
+    lower = path.lower()
+    if lower.endswith('.npz'):
+        return load_store(path)
+    if lower.endswith('.db'):
+        with ScenarioLibrary(path) as lib:
+            return ScenarioStore(scenario_columns(lib.iter_scenarios(lib.find())))
+    return ScenarioStore(scenario_columns(load_pro_csv(path)))
+
+
+def flagged_lines(store, report):
+    """有问题的目标船, 每条一行, 用于写入CSV"""
+    c = store.columns
+    for row in report.flagged().tolist():
+        yield ','.join([
+            csv_field(int(c['id'][report.scenario[row]])),
+            csv_field(int(c['target_id'][row])),
+            csv_field(store.meeting_types[c['meeting_type'][row]]),
+            '%.2f' % report.stored_tcpa[row], '%.2f' % report.tcpa[row],
+            '%.2f' % report.stored_dcpa[row], '%.2f' % report.dcpa[row],
+            csv_field(flag_text(report.flags[row])),
+        ]) + '\r\n'
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='重新计算CPA, 复核保存的场景')
+    parser.add_argument('files', nargs='+',
+                        help='专业版场景文件: CSV, .npz场景库或.db场景库')
+    parser.add_argument('--tcpa-tol', type=float, default=TCPA_TOL,
+                        help='TCPA的绝对容差(分钟), 默认%g' % TCPA_TOL)
+    parser.add_argument('--dcpa-tol', type=float, default=DCPA_TOL,
+                        help='DCPA的绝对容差(海里), 默认%g' % DCPA_TOL)
+    parser.add_argument('--rtol', type=float, default=RTOL,
+                        help='相对容差, 默认%g' % RTOL)
+    parser.add_argument('--show', type=int, default=10,
+                        help='每个文件打印的有问题的目标船数, 默认10')
+    parser.add_argument('-o', '--output',
+                        help='把所有有问题的目标船写入CSV文件')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    tolerances = {'tcpa_tol': args.tcpa_tol, 'dcpa_tol': args.dcpa_tol, 'rtol': args.rtol}
+
+    lines = []
+    flagged = 0
+    for path in args.files:
+        try:
+            store = load_for_validation(path)
+        except (OSError, ValueError, KeyError) as e:
+            print('%s: 无法读取: %s' % (path, e), file=sys.stderr)
+            return 2
+        report = validate_store(store, **tolerances)
+        tcpa_drift, dcpa_drift = report.max_drift()
+        rows = report.flagged()
+        print('%s: %d 个场景, %d 条目标船, %d 条有问题(%d 个场景); '
+              '最大偏差 TCPA %.3f 分钟, DCPA %.3f 海里' %
+              (path, report.scenario_count, len(report), len(rows),
+               len(report.flagged_scenarios()), tcpa_drift, dcpa_drift))
+        for flag, count in report.counts().items():
+            if count:
+                print('  %s: %d' % (FLAG_TEXT[flag], count))
+        if args.output:
+            file_lines = list(flagged_lines(store, report))
+            lines.extend(file_lines)
+        else:
+            file_lines = itertools.islice(flagged_lines(store, report), args.show)
+        for line in itertools.islice(file_lines, args.show):
+            print('  ' + line.rstrip('\r\n'))
+        flagged += len(rows)
+
+    if args.output:
+        write_csv(args.output, FLAGGED_HEADERS, lines, newline='')
+    return 1 if flagged else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())